@@ -1,5 +1,12 @@
+import os
+from contextlib import nullcontext
 import streamlit as st
-from modules import remediation, biomass, diagnostics, genetics, mining
+from utils.page_registry import PAGES, load_page, import_report
+from utils.profiling import enable_timing_log, page_run, profile_run, timed
+
+# Structured (JSON lines) stage timings on stderr
+if os.environ.get("PHYTOSCOUT_TIMING_LOG"):
+    enable_timing_log()
 
 # Page Config
 st.set_page_config(
@@ -13,19 +20,29 @@ st.sidebar.title("🌱 PhytoScout")
 st.sidebar.markdown("*Science for Impact*")
 st.sidebar.markdown("---")
 
-page = st.sidebar.radio("Navigate", [
-    "Home", 
-    "Phytoremediation Tracker", 
-    "Biomass Predictor", 
-    "Deficiency Detective",
-    "🧬 Genetics Explorer",
-    "💰 Phytomining Economy"
-])
+# Page modules are imported lazily by the registry (see utils/page_registry.py)
+page = st.sidebar.radio("Navigate", ["Home", *PAGES])
 
 st.sidebar.markdown("---")
 st.sidebar.caption("Prototype built for Prof. Mark Aarts' Lab")
 st.sidebar.caption("v2.0.0 | Wageningen University")
 
+with st.sidebar.expander("⏱️ Startup Report"):
+    loaded = import_report()
+    if loaded:
+        for name, seconds in loaded.items():
+            st.caption(f"{name}: {seconds * 1000:.0f} ms import")
+    else:
+        st.caption("No page modules imported yet.")
+    st.caption("Run `python -m utils.page_registry` for a cold-start breakdown per page.")
+
+# Optional diagnostics panel: filled in after the page has rendered
+diagnostics_panel = st.sidebar.container() if st.sidebar.checkbox("🔧 Diagnostics Panel") else None
+profile_requested = st.query_params.get("profile") == "1"
+if diagnostics_panel is not None:
+    # A button is only True for the rerun it triggers: profiles exactly one request
+    profile_requested = diagnostics_panel.button("🔬 Profile this page once") or profile_requested
+
 if page == "Home":
     st.title("Welcome to PhytoScout 🌍")
     st.image("https://www.wur.nl/upload/f9829878-3617-48f8-9a3d-495c0244405a_WUR_Logo.png", width=200) # Placeholder WUR logo or generic
@@ -58,17 +75,24 @@ if page == "Home":
     
     st.info("👈 Select a module from the sidebar to begin.")
 
-elif page == "Phytoremediation Tracker":
-    remediation.render()
-
-elif page == "Biomass Predictor":
-    biomass.render()
-
-elif page == "Deficiency Detective":
-    diagnostics.render()
-
-elif page == "🧬 Genetics Explorer":
-    genetics.render()
+else:
+    with page_run(page) as run, (profile_run() if profile_requested else nullcontext()) as profile:
+        with timed("import_page"):
+            page_module = load_page(page)
+        with timed("render"):
+            page_module.render()
 
-elif page == "💰 Phytomining Economy":
-    mining.render()
+    if diagnostics_panel is not None:
+        diagnostics_panel.caption(f"**{page}** rendered in {run['total_ms']:.0f} ms")
+        diagnostics_panel.dataframe(
+            [{"stage": "· " * stage["depth"] + stage["stage"], "ms": stage["ms"]} for stage in run["stages"]],
+            hide_index=True, use_container_width=True)
+        if profile is not None and profile["profiler"] is None:
+            diagnostics_panel.info(profile["report"])
+        elif profile is not None:
+            if profile["profiler"] == "cProfile":
+                diagnostics_panel.warning("pyinstrument is not installed, so the deterministic cProfile fallback "
+                                          "was used: timings are inflated and only one session can profile at a "
+                                          "time. `pip install pyinstrument` enables the sampling profiler.")
+            with diagnostics_panel.expander(f"Profile ({profile['profiler']})"):
+                st.code(profile["report"], language=None)
@@ -0,0 +1,396 @@
+"""
+Benchmark suite for PhytoScout's computational hot paths.
+
+Every case runs in a fresh (spawned) process so peak memory is measured
+per case, records wall time, throughput and peak memory, writes the
+results to JSON and compares them with a stored baseline. The exit code
+is 1 when any case regresses beyond the configured threshold.
+
+    python -m benchmarks.run_benchmarks --quick          # small sizes only
+    python -m benchmarks.run_benchmarks                  # full suite (up to 100 MP)
+    python -m benchmarks.run_benchmarks --update-baseline
+
+Baselines are machine-specific: baseline.json records the host it was
+measured on, and on a different host (platform, architecture or CPU count)
+regressions are reported as warnings only. Regenerate it on the machine
+that runs the comparison.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_RESULTS = os.path.join(BENCH_DIR, "results", "latest.json")
+
+IMAGE_SIZES_MP = [1, 4, 16, 100]
+QUICK_IMAGE_SIZES_MP = [1, 4]
+IMAGE_FORMATS = {"jpeg": ".jpg", "png": ".png", "bmp": ".bmp", "tiff": ".tif"}
+IMAGE_SAVE_PARAMS = {"jpeg": {"quality": 90}, "tiff": {"compression": "tiff_adobe_deflate"}}
+REMEDIATION_WEEKS = [12, 52, 520, 5200]
+POPULATION_SIZES = [1_000, 100_000, 1_000_000, 5_000_000]
+QUICK_POPULATION_SIZES = [1_000, 100_000]
+PORTFOLIO_SIZES = [10_000, 1_000_000]
+RISK_DRAWS = [100_000, 1_000_000]
+TIMELAPSE_FRAMES = 120
+QUICK_TIMELAPSE_FRAMES = 30
+
+# ---------------------------------------------------------------------------
+# Case factories: run inside the benchmark process. Setup happens here
+# (untimed); the returned callable is what gets timed.
+# ---------------------------------------------------------------------------
+
+def bench_green_index(path, tiled=False, adaptive=False):
+    from utils.image_processing import (calculate_green_index, calculate_green_index_adaptive,
+                                        calculate_green_index_tiled)
+    # 100 MP test images exceed Pillow's default decompression-bomb warning
+    warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+    if tiled:
+        return lambda: calculate_green_index_tiled(path)
+    if adaptive:
+        return lambda: calculate_green_index_adaptive(path)
+    return lambda: calculate_green_index(path)
+
+def bench_vegetation_indices(path):
+    from utils.vegetation_indices import compute_indices
+    warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+    return lambda: compute_indices(path)
+
+def bench_tray_segmentation(path, mode):
+    from utils.tray_segmentation import segment_tray
+    warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+    return lambda: segment_tray(path, mode, 16, 24)
+
+def bench_timelapse(path, extract=False):
+    from utils.video_ingest import canopy_time_series
+    if not extract:
+        return lambda: canopy_time_series(path, max_pixels=None)
+
+    # Reference: dump every frame to PNG first, then analyse the stills
+    from utils.image_processing import calculate_green_index
+
+    def run():
+        with tempfile.TemporaryDirectory() as frame_dir, Image.open(path) as video:
+            for i in range(video.n_frames):
+                video.seek(i)
+                video.convert("RGB").save(os.path.join(frame_dir, f"{i:05d}.png"))
+            return [calculate_green_index(os.path.join(frame_dir, f))[0] for f in sorted(os.listdir(frame_dir))]
+    return run
+
+def bench_remediation(weeks):
+    from utils.mock_data import generate_remediation_data
+    return lambda: generate_remediation_data(800, weeks)
+
+def bench_remediation_scenarios(n_scenarios, weeks):
+    from utils.mock_data import simulate_remediation_scenarios
+    initial = np.linspace(100, 2000, n_scenarios)
+    decay = np.linspace(0.01, 0.1, n_scenarios)
+    return lambda: simulate_remediation_scenarios(initial, weeks, decay_rate=decay)
+
+def bench_population(population_size):
+    from utils.cnv_population import summarize_population
+    return lambda: summarize_population(population_size)
+
+def bench_mining_single(calls):
+    from utils.mining_economics import calculate_mining_economics
+
+    def run():
+        for _ in range(calls):
+            calculate_mining_economics(1.0, 10.0, 10000, 2.50)
+    return run
+
+def bench_mining_portfolio(n_parcels):
+    import pandas as pd
+    from utils.mining_economics import value_portfolio
+
+    rng = np.random.default_rng(0)
+    parcels = pd.DataFrame({
+        "parcel_id": np.arange(n_parcels),
+        "hectares": rng.uniform(0.5, 20, n_parcels),
+        "biomass_t_per_ha": rng.uniform(5, 15, n_parcels),
+        "metal": rng.choice(["Zinc (Zn)", "Nickel (Ni)"], n_parcels),
+        "concentration_mg_per_kg": rng.uniform(1000, 30000, n_parcels),
+    })
+    return lambda: value_portfolio(parcels)
+
+def bench_mining_risk(draws):
+    from utils.mining_risk import simulate_risk
+    return lambda: simulate_risk(1.0, 10.0, 10000, 18.0, years=3, draws=draws)
+
+FACTORIES = {f.__name__: f for f in [
+    bench_green_index, bench_vegetation_indices, bench_tray_segmentation, bench_timelapse, bench_remediation,
+    bench_remediation_scenarios, bench_population, bench_mining_single, bench_mining_portfolio, bench_mining_risk,
+]}
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+def _read_status_mb(field):
+    # Linux only: VmRSS (current) / VmHWM (peak) from /proc/self/status
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def _reset_peak_rss():
+    # Writing 5 to clear_refs resets VmHWM (Linux >= 4.0)
+    try:
+        with open("/proc/self/clear_refs", "w") as fh:
+            fh.write("5")
+        return True
+    except OSError:
+        return False
+
+def _measure(factory_name, kwargs, repeats):
+    """Runs one case in the current (fresh) process."""
+    fn = FACTORIES[factory_name](**kwargs)
+    fn()  # Warm-up: imports, page cache, allocator
+
+    # RSS covers native buffers (Pillow decode) that tracemalloc misses;
+    # tracemalloc is the fallback where the peak cannot be reset
+    track_rss = _reset_peak_rss() and _read_status_mb("VmRSS") is not None
+    rss_before = _read_status_mb("VmRSS") if track_rss else None
+    if not track_rss:
+        tracemalloc.start()
+
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+
+    if track_rss:
+        peak_mb = max(_read_status_mb("VmHWM") - rss_before, 0.0)
+    else:
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1024**2
+        tracemalloc.stop()
+
+    return {"wall_s": statistics.median(times), "wall_min_s": min(times), "peak_mb": peak_mb}
+
+def _image_shape(megapixels):
+    # 4:3 frame, as produced by the tray cameras
+    height = int((megapixels * 1e6 * 3 / 4) ** 0.5)
+    return height, int(megapixels * 1e6 / height)
+
+def _synthetic_plant_image(megapixels, seed=0):
+    # Soil-coloured background with green leaf discs and sensor noise, so
+    # compression ratios resemble real tray photos
+    height, width = _image_shape(megapixels)
+    rng = np.random.default_rng(seed)
+
+    img = np.empty((height, width, 3), dtype=np.uint8)
+    img[:] = (110, 85, 60)
+    yy, xx = np.ogrid[:height, :width]
+    for _ in range(40):
+        cy, cx = rng.integers(0, height), rng.integers(0, width)
+        radius = rng.integers(height // 30 + 1, height // 8 + 2)
+        leaf = (yy - cy) ** 2 + (xx - cx) ** 2 < radius ** 2
+        img[leaf] = (60, 140, 50)
+
+    for y in range(0, height, 1024):
+        band = img[y:y + 1024].astype(np.int16)
+        band += rng.integers(-12, 13, size=band.shape, dtype=np.int16)
+        img[y:y + 1024] = np.clip(band, 0, 255)
+    return img
+
+def build_cases(workdir, quick=False):
+    """
+    Returns the list of benchmark cases (name, factory, kwargs, units, unit name).
+    Test images are generated into `workdir` unless already present.
+    """
+    cases = []
+
+    for mp in QUICK_IMAGE_SIZES_MP if quick else IMAGE_SIZES_MP:
+        height, width = _image_shape(mp)
+        paths = {fmt: os.path.join(workdir, f"plant_{mp}mp{ext}") for fmt, ext in IMAGE_FORMATS.items()}
+
+        missing = [fmt for fmt, path in paths.items() if not os.path.exists(path)]
+        if missing:
+            image = Image.fromarray(_synthetic_plant_image(mp))
+            for fmt in missing:
+                image.save(paths[fmt], format=fmt.upper(), **IMAGE_SAVE_PARAMS.get(fmt, {}))
+
+        for fmt, path in paths.items():
+            cases.append((f"green_index/{fmt}/{mp}MP", "bench_green_index", {"path": path}, height * width, "px"))
+            cases.append((f"green_index_tiled/{fmt}/{mp}MP", "bench_green_index",
+                          {"path": path, "tiled": True}, height * width, "px"))
+            cases.append((f"green_index_adaptive/{fmt}/{mp}MP", "bench_green_index",
+                          {"path": path, "adaptive": True}, height * width, "px"))
+            cases.append((f"vegetation_indices/{fmt}/{mp}MP", "bench_vegetation_indices", {"path": path},
+                          height * width, "px"))
+        for mode in ("grid", "regions"):
+            cases.append((f"tray_segmentation/{mode}/{mp}MP", "bench_tray_segmentation",
+                          {"path": paths["jpeg"], "mode": mode}, height * width, "px"))
+
+    frames = QUICK_TIMELAPSE_FRAMES if quick else TIMELAPSE_FRAMES
+    video_path = os.path.join(workdir, f"timelapse_{frames}f.gif")
+    if not os.path.exists(video_path):
+        # A 0.3 MP frame drifting sideways, 0.5 s per frame
+        base = _synthetic_plant_image(0.3)
+        images = [Image.fromarray(np.roll(base, 4 * i, axis=1)) for i in range(frames)]
+        images[0].save(video_path, save_all=True, append_images=images[1:], duration=500)
+    for extract in (False, True):
+        cases.append((f"timelapse/{'extract_to_disk' if extract else 'streamed'}/{frames}f", "bench_timelapse",
+                      {"path": video_path, "extract": extract}, frames, "frames"))
+
+    for weeks in REMEDIATION_WEEKS:
+        cases.append((f"remediation/{weeks}w", "bench_remediation", {"weeks": weeks}, weeks, "weeks"))
+    cases.append(("remediation_scenarios/1000x52w", "bench_remediation_scenarios",
+                  {"n_scenarios": 1000, "weeks": 52}, 1000 * 52, "scenario-weeks"))
+
+    for n in QUICK_POPULATION_SIZES if quick else POPULATION_SIZES:
+        cases.append((f"cnv_population/{n}", "bench_population", {"population_size": n}, n, "plants"))
+
+    cases.append(("mining/single_x10000", "bench_mining_single", {"calls": 10_000}, 10_000, "fields"))
+    for n in PORTFOLIO_SIZES[:1] if quick else PORTFOLIO_SIZES:
+        cases.append((f"mining_portfolio/{n}", "bench_mining_portfolio", {"n_parcels": n}, n, "parcels"))
+    for n in RISK_DRAWS[:1] if quick else RISK_DRAWS:
+        cases.append((f"mining_risk/{n}x3y", "bench_mining_risk", {"draws": n}, n, "draws"))
+
+    return cases
+
+def run_cases(cases, repeats=5, progress=True):
+    """
+    Runs every case in its own spawned process.
+
+    Returns:
+        dict: Case name -> metrics (wall_s, wall_min_s, throughput, unit, peak_mb).
+    """
+    results = {}
+    ctx = multiprocessing.get_context("spawn")
+    for name, factory, kwargs, units, unit_name in cases:
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            metrics = pool.submit(_measure, factory, kwargs, repeats).result()
+        metrics["throughput"] = units / metrics["wall_s"] if metrics["wall_s"] > 0 else float("inf")
+        metrics["unit"] = f"{unit_name}/s"
+        results[name] = metrics
+        if progress:
+            print(f"{name:40s} {metrics['wall_s'] * 1000:10.2f} ms  {metrics['throughput']:14,.0f} {metrics['unit']:18s}"
+                  f" {metrics['peak_mb']:8.1f} MB", flush=True)
+    return results
+
+def machine_fingerprint():
+    """The host properties a baseline is only valid for."""
+    return {"system": platform.system(), "arch": platform.machine(), "cpu_count": os.cpu_count()}
+
+def compare_with_baseline(results, baseline, time_threshold=0.25, memory_threshold=0.25,
+                          time_slack_s=0.002, memory_slack_mb=8.0):
+    """
+    Flags cases slower (or hungrier) than the baseline beyond the thresholds.
+    Wall time is compared on the fastest repeat, which is the least
+    sensitive to scheduler noise.
+
+    Args:
+        results (dict): Output of run_cases.
+        baseline (dict): Stored results of a previous run.
+        time_threshold (float): Allowed relative wall-time increase.
+        memory_threshold (float): Allowed relative peak-memory increase.
+        time_slack_s (float): Absolute timing noise allowance.
+        memory_slack_mb (float): Absolute memory noise allowance.
+
+    Returns:
+        list: Human-readable regression descriptions (empty when clean).
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+
+        before, after = previous["wall_min_s"], current["wall_min_s"]
+        if after > before * (1 + time_threshold) + time_slack_s:
+            regressions.append(f"{name}: wall time +{after / before - 1:.0%} "
+                               f"({before * 1000:.2f} -> {after * 1000:.2f} ms)")
+
+        allowed_mb = previous["peak_mb"] * (1 + memory_threshold) + memory_slack_mb
+        if current["peak_mb"] > allowed_mb:
+            regressions.append(f"{name}: peak memory {previous['peak_mb']:.1f} -> {current['peak_mb']:.1f} MB")
+
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PhytoScout performance benchmarks.")
+    parser.add_argument("--quick", action="store_true", help="Small sizes only (CI smoke run)")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed runs per case (median reported)")
+    parser.add_argument("--filter", default="", help="Only run cases whose name contains this string")
+    parser.add_argument("--results", default=DEFAULT_RESULTS, help="Where to write this run's results")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline to compare against")
+    parser.add_argument("--update-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed relative slowdown")
+    parser.add_argument("--memory-threshold", type=float, default=0.25, help="Allowed relative memory growth")
+    parser.add_argument("--image-dir", default=None, help="Reuse generated test images between runs")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.image_dir or tmp
+        os.makedirs(workdir, exist_ok=True)
+        cases = [c for c in build_cases(workdir, quick=args.quick) if args.filter in c[0]]
+        results = run_cases(cases, repeats=args.repeats)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {**machine_fingerprint(), "platform": platform.platform(),
+                    "python": platform.python_version(), "numpy": np.__version__},
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.results)), exist_ok=True)
+    with open(args.results, "w") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"\nResults written to {args.results}")
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as fh:
+                baseline = json.load(fh).get("results", {})
+        baseline.update(results)  # Partial runs only refresh their own cases
+        with open(args.baseline, "w") as fh:
+            json.dump({**report, "results": baseline}, fh, indent=2)
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found; run with --update-baseline to create one.")
+        return 0
+
+    with open(args.baseline) as fh:
+        stored = json.load(fh)
+    regressions = compare_with_baseline(results, stored["results"], args.threshold, args.memory_threshold)
+
+    recorded_on = {key: stored.get("machine", {}).get(key) for key in machine_fingerprint()}
+    if recorded_on != machine_fingerprint():
+        print(f"\nBaseline was recorded on {recorded_on}, this is {machine_fingerprint()}; "
+              "timings are not comparable, so regressions are warnings only "
+              "(run with --update-baseline on this machine to gate on them).")
+        for line in regressions:
+            print(f"  ? {line}")
+        return 0
+
+    if regressions:
+        print("\nPerformance regressions:")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+
+    print("\nNo regressions against baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
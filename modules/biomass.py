@@ -1,7 +1,153 @@
+import io
+import datetime
+import numpy as np
+import pandas as pd
+import plotly.express as px
 import streamlit as st
-from utils.image_processing import calculate_green_index
+from utils.cache import ResultCache
+from utils.image_processing import (DEFAULT_PIXEL_BUDGET, PREVIEW_MAX_SIDE, calculate_green_index,
+                                    calculate_green_index_adaptive, calculate_green_index_tiled,
+                                    decode_within_budget, estimate_biomass, load_thumbnail)
+from utils.phenotype_store import PhenotypeStore, hash_image, project_biomass
+from utils.profiling import timed
+from utils.tray_segmentation import MIN_REGION_AREA, TRAY_LAYOUTS, segment_tray, well_names
+from utils.video_ingest import DEFAULT_SCENE_THRESHOLD, VIDEO_EXTENSIONS, canopy_time_series
+from utils.vegetation_indices import DEFAULT_THRESHOLDS, compute_indices
 from PIL import Image
 
+# Part of the cache key: bump when the analysis itself changes
+ANALYSIS_PARAMS = {"method": "green_gt_red_and_blue", "version": 2}
+
+# Analysis budgets offered in fast mode (pixels)
+PIXEL_BUDGETS = {"0.5 MP": 500_000, "2 MP": DEFAULT_PIXEL_BUDGET, "8 MP": 8_000_000}
+
+@st.cache_resource
+def get_result_cache():
+    """One green-index cache shared by every session of this server."""
+    return ResultCache()
+
+@st.cache_resource
+def get_phenotype_store():
+    """Per-plant measurement history shared by every session."""
+    return PhenotypeStore()
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def get_full_resolution_ratio(image_bytes):
+    """Reference ratio at full resolution, for checking the fast mode."""
+    return calculate_green_index_tiled(io.BytesIO(image_bytes))
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def get_vegetation_indices(image_bytes, max_pixels):
+    """All vegetation indices in one pass (over the fast-mode copy when max_pixels is set)."""
+    if max_pixels:
+        small, _ = decode_within_budget(io.BytesIO(image_bytes), max_pixels)
+        return compute_indices(np.asarray(small))
+    return compute_indices(io.BytesIO(image_bytes))
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def get_tray_segmentation(image_bytes, mode, rows, cols, min_area, max_pixels):
+    """
+    Per-plant table for a tray photo (over the fast-mode copy when
+    max_pixels is set; positions and areas are scaled back to the original).
+    """
+    if not max_pixels:
+        return segment_tray(io.BytesIO(image_bytes), mode, rows, cols, min_area=min_area)
+    
+    small, info = decode_within_budget(io.BytesIO(image_bytes), max_pixels)
+    scale_x = info["source_size"][0] / small.width
+    scale_y = info["source_size"][1] / small.height
+    plants = segment_tray(np.asarray(small), mode, rows, cols, min_area=max(1, round(min_area / (scale_x * scale_y))))
+    for col in ("centroid_x", "x0", "x1"):
+        if col in plants:
+            plants[col] = plants[col] * scale_x
+    for col in ("centroid_y", "y0", "y1"):
+        if col in plants:
+            plants[col] = plants[col] * scale_y
+    for col in ("pixels", "green_pixels"):
+        if col in plants:
+            plants[col] = (plants[col] * scale_x * scale_y).round().astype(np.int64)
+    return plants
+
+def render_tray(image_bytes, max_pixels):
+    """Per-plant green index for a whole tray, from one decode of the photo."""
+    t1, t2, t3 = st.columns(3)
+    mode = t1.radio("Split plants by", ["Grid of wells", "Connected green regions"],
+                    help="Wells suit regular trays; regions find plants anywhere in the frame.")
+    layout = t2.selectbox("Tray layout", list(TRAY_LAYOUTS), index=1, format_func=lambda n: f"{n} positions",
+                          disabled=mode != "Grid of wells")
+    min_area = t3.number_input("Smallest plant (pixels)", min_value=1, value=MIN_REGION_AREA,
+                               disabled=mode == "Grid of wells")
+    rows, cols = TRAY_LAYOUTS[layout]
+    
+    with st.spinner("Segmenting tray..."), timed("tray_segmentation", bytes=len(image_bytes)):
+        try:
+            plants = get_tray_segmentation(image_bytes, "grid" if mode == "Grid of wells" else "regions",
+                                           rows, cols, int(min_area), max_pixels)
+        except ValueError as exc:
+            st.error(f"Could not segment tray: {exc}")
+            return
+    
+    thumbnail = load_thumbnail(io.BytesIO(image_bytes))
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        scale = thumbnail.width / img.width
+    
+    label_col = "well" if mode == "Grid of wells" else "plant"
+    found = plants.dropna(subset=["centroid_x"])
+    fig = px.imshow(np.asarray(thumbnail), title=f"{len(found)} plants found")
+    fig.add_scatter(x=found["centroid_x"] * scale, y=found["centroid_y"] * scale, mode="markers+text",
+                    text=found[label_col].astype(str), textposition="top center",
+                    marker=dict(color="yellow", size=6), showlegend=False)
+    st.plotly_chart(fig, use_container_width=True)
+    
+    if mode == "Grid of wells":
+        heatmap = plants.pivot(index="row", columns="col", values="green_ratio")
+        heatmap.index = [name[:-1] for name in well_names(rows, 1)]  # "A1" -> "A"
+        fig = px.imshow(heatmap, text_auto=".0f" if layout <= 96 else False, color_continuous_scale="Greens",
+                        title="Green Pixel Ratio per Well (%)", labels={"color": "Green %", "x": "Column", "y": "Row"})
+        st.plotly_chart(fig, use_container_width=True)
+    
+    st.dataframe(plants.round(2), use_container_width=True, hide_index=True)
+    st.download_button("⬇️ Download per-plant table", plants.to_csv(index=False), file_name="tray_plants.csv",
+                       mime="text/csv")
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def get_canopy_series(video_bytes, filename, interval_s, scene_threshold, max_pixels):
+    """Canopy cover per sampled frame of a time-lapse (cached per video and sampling)."""
+    return canopy_time_series(io.BytesIO(video_bytes), filename, interval_s, scene_threshold, max_pixels)
+
+def render_timelapse(video_bytes, filename, max_pixels):
+    """Canopy-cover time series from a time-lapse, streamed frame by frame."""
+    v1, v2, v3 = st.columns(3)
+    use_interval = v1.checkbox("Sample at a fixed interval", value=True)
+    interval_s = v1.number_input("Interval (seconds of video)", min_value=0.1, value=1.0, step=0.5,
+                                 disabled=not use_interval)
+    use_scene = v2.checkbox("Also keep scene changes", help="e.g. lights switching or the tray being moved")
+    scene_threshold = v2.slider("Scene-change sensitivity (gray levels)", min_value=1.0, max_value=64.0,
+                                value=DEFAULT_SCENE_THRESHOLD, disabled=not use_scene)
+    
+    with st.spinner("Streaming frames..."), timed("timelapse", bytes=len(video_bytes)):
+        try:
+            series = get_canopy_series(video_bytes, filename, interval_s if use_interval else None,
+                                       scene_threshold if use_scene else None, max_pixels)
+        except (ImportError, OSError, ValueError) as exc:
+            st.error(f"Could not read the time-lapse: {exc}")
+            return
+    
+    if series.empty:
+        st.warning("No frames could be decoded.")
+        return
+    
+    v3.metric("Frames analysed", f"{len(series):,}")
+    v3.metric("Canopy Cover (last frame)", f"{series['green_ratio'].iloc[-1]:.1f}%",
+              delta=f"{series['green_ratio'].iloc[-1] - series['green_ratio'].iloc[0]:+.1f} pp since start")
+    
+    fig = px.line(series, x="time_s", y="green_ratio", markers=True, hover_data=["frame", "trigger"],
+                  title="Canopy Cover over the Time-lapse",
+                  labels={"time_s": "Video time (s)", "green_ratio": "Green Pixel Ratio (%)"})
+    st.plotly_chart(fig, use_container_width=True)
+    st.download_button("⬇️ Download time series", series.to_csv(index=False), file_name="canopy_series.csv",
+                       mime="text/csv")
+
 def render():
     st.header("📸 Biomass Predictor (NPEC-Lite)")
     st.markdown("Estimate plant biomass from top-down photos using Computer Vision (Greenness Index).")
@@ -13,24 +159,68 @@ def render():
         **Goal:** By linking phenotypic data (e.g., leaf area) with genomic information, we can create a more accurate prediction of plant health, especially under conditions of **drought or nutrient stress**—a core focus of the Aarts lab.
         """)
     
-    uploaded_file = st.file_uploader("Upload a top-down photo of the plant", type=["jpg", "png", "jpeg"])
+    uploaded_file = st.file_uploader("Upload a top-down photo of the plant (or a time-lapse)",
+                                     type=["jpg", "png", "jpeg", "gif", *(ext.lstrip(".") for ext in VIDEO_EXTENSIONS)])
+    filename = getattr(uploaded_file, "name", "").lower()
+    is_timelapse = filename.endswith((".gif", *VIDEO_EXTENSIONS))
+    
+    c1, c2, c3 = st.columns(3)
+    fast_mode = c1.toggle("⚡ Fast mode", value=True,
+                          help="Analyse a downsampled copy instead of every pixel (JPEGs are decoded at reduced scale).")
+    budget_label = c2.selectbox("Analysis budget", list(PIXEL_BUDGETS), index=1, disabled=not fast_mode)
+    compare_full = c3.checkbox("Compare with full resolution", disabled=not fast_mode)
+    
+    # Identifying the plant links this photo to its growth history
+    h1, h2, h3 = st.columns(3)
+    tray = h1.text_input("Tray", value="Tray-1")
+    plant_id = h2.text_input("Plant ID", placeholder="Optional, e.g. A3")
+    captured_on = h3.date_input("Capture date", value=datetime.date.today())
     
-    if uploaded_file is not None:
+    tray_mode = st.toggle("🧫 Tray mode", help="Measure every plant of a multi-well tray from one photo.")
+    
+    if uploaded_file is not None and is_timelapse:
+        render_timelapse(uploaded_file.getvalue(), filename, PIXEL_BUDGETS[budget_label] if fast_mode else None)
+    
+    elif uploaded_file is not None and tray_mode:
+        render_tray(uploaded_file.getvalue(), PIXEL_BUDGETS[budget_label] if fast_mode else None)
+    
+    elif uploaded_file is not None:
         col1, col2 = st.columns(2)
+        image_bytes = uploaded_file.getvalue()
         
         with col1:
-            st.image(uploaded_file, caption="Original Image", use_column_width=True)
+            # Previews are sent as thumbnails, not as the full-size upload
+            with timed("send_image", image="original"):
+                st.image(load_thumbnail(io.BytesIO(image_bytes)), caption="Original Image", use_column_width=True)
             
         with st.spinner("Analyzing spectral data..."):
-            green_ratio, processed_img = calculate_green_index(uploaded_file)
+            # Repeat uploads and widget reruns are served from the cache
+            if fast_mode:
+                max_pixels = PIXEL_BUDGETS[budget_label]
+                params = {**ANALYSIS_PARAMS, "mode": "adaptive", "max_pixels": max_pixels}
+                
+                def analyze():
+                    with timed("decode_and_mask", bytes=len(image_bytes), max_pixels=max_pixels):
+                        green_ratio, preview, _ = calculate_green_index_adaptive(io.BytesIO(image_bytes), max_pixels)
+                    return green_ratio, preview
+            else:
+                params = {**ANALYSIS_PARAMS, "mode": "full"}
+                
+                def analyze():
+                    with timed("decode_and_mask", bytes=len(image_bytes)):
+                        green_ratio, processed = calculate_green_index(io.BytesIO(image_bytes))
+                    processed.thumbnail((PREVIEW_MAX_SIDE, PREVIEW_MAX_SIDE))
+                    return green_ratio, processed
+            
+            with timed("green_index"):
+                green_ratio, processed_img = get_result_cache().get_or_compute(image_bytes, params, analyze)
             
             # Simple "Dummy" Regression Model based on Prof. Aarts' lab concept
-            # Biomass = GreenRatio * Factor
-            estimated_biomass_g = green_ratio * 3.5  # Arbitrary factor for demo
-            projected_yield_g = estimated_biomass_g * 4.2 # Projected growth
+            estimated_biomass_g, projected_yield_g = estimate_biomass(green_ratio)
             
         with col2:
-            st.image(processed_img, caption="Green Mask (Computer Vision)", use_column_width=True)
+            with timed("send_image", image="mask"):
+                st.image(processed_img, caption="Green Mask (Computer Vision)", use_column_width=True)
             
         st.divider()
         
@@ -38,10 +228,81 @@ def render():
         m1, m2, m3 = st.columns(3)
         m1.metric("Green Pixel Ratio", f"{green_ratio:.1f}%")
         m2.metric("Est. Current Biomass", f"{estimated_biomass_g:.1f} g")
-        m3.metric("Projected Yield (Day 40)", f"{projected_yield_g:.1f} g")
+        
+        # A measured growth curve replaces the fixed growth factor
+        history = pd.DataFrame()
+        if plant_id:
+            store = get_phenotype_store()
+            image_hash = hash_image(image_bytes)
+            captured_at = pd.Timestamp(captured_on, tz="UTC")
+            with timed("history_query"):
+                history = store.query(tray=tray, plant_ids=[plant_id])
+            
+            current = pd.DataFrame({"timestamp": [captured_at], "estimated_biomass_g": [estimated_biomass_g]})
+            unsaved = image_hash not in store
+            series = pd.concat([history, current]) if unsaved else history
+            growth_fit = project_biomass(series["timestamp"], series["estimated_biomass_g"])
+        else:
+            growth_fit = None
+        
+        if growth_fit is not None:
+            m3.metric("Projected Yield (Day 40)", f"{growth_fit['projected_g']:.1f} g",
+                      delta=f"growth curve fitted on {growth_fit['observations']} photos",
+                      delta_color="off")
+        else:
+            m3.metric("Projected Yield (Day 40)", f"{projected_yield_g:.1f} g")
+        
+        if plant_id:
+            if st.button("💾 Save to plant history", disabled=not unsaved):
+                store.append([{
+                    "tray": tray,
+                    "plant_id": plant_id,
+                    "timestamp": captured_at,
+                    "image_hash": image_hash,
+                    "green_ratio": green_ratio,
+                    "estimated_biomass_g": estimated_biomass_g,
+                    "source": getattr(uploaded_file, "name", ""),
+                }])
+                history = store.query(tray=tray, plant_ids=[plant_id])
+                st.success(f"Saved measurement for plant {plant_id} ({tray}).")
+            elif not unsaved:
+                st.caption("This photo is already in the plant's history.")
+            
+            if len(history) > 0:
+                fig = px.line(history, x="timestamp", y="estimated_biomass_g", markers=True,
+                              title=f"Growth History: {plant_id} ({tray})",
+                              labels={"timestamp": "Date", "estimated_biomass_g": "Est. Biomass (g)"})
+                st.plotly_chart(fig, use_container_width=True)
+        
+        # Fast mode decodes JPEGs at reduced DCT scale, which averages pixel
+        # blocks: the first such photo of a session is checked automatically
+        auto_check = (fast_mode and filename.endswith((".jpg", ".jpeg"))
+                      and not st.session_state.get("jpeg_fast_mode_checked"))
+        if fast_mode and (compare_full or auto_check):
+            st.session_state["jpeg_fast_mode_checked"] = True
+            with timed("full_resolution_check"):
+                full_ratio = get_full_resolution_ratio(image_bytes)
+            st.caption(f"Full-resolution ratio: {full_ratio:.2f}% "
+                       f"(fast mode differs by {green_ratio - full_ratio:+.2f} percentage points)"
+                       + ("; checked automatically because fast-mode JPEG results are approximate"
+                          if auto_check and not compare_full else ""))
         
         st.info("ℹ️ **Scientific Note:** This module mimics the high-throughput phenotyping done at NPEC. "
                 "By masking non-green pixels, we remove soil background to correlate 'Projected Canopy Area' with biomass.")
+        
+        with st.expander("🌈 Vegetation Indices"):
+            with timed("vegetation_indices"):
+                indices = get_vegetation_indices(image_bytes, PIXEL_BUDGETS[budget_label] if fast_mode else None)
+            st.dataframe(pd.DataFrame({
+                "Index": ["ExG (chromatic)", "VARI", "NGRDI"],
+                "Mean": [indices["exg_mean"], indices["vari_mean"], indices["ngrdi_mean"]],
+                "Canopy Threshold": [DEFAULT_THRESHOLDS["exg"], DEFAULT_THRESHOLDS["vari"], DEFAULT_THRESHOLDS["ngrdi"]],
+                "Canopy Cover (%)": [indices["exg_cover"], indices["vari_cover"], indices["ngrdi_cover"]],
+            }).round(3), hide_index=True)
+            st.caption("Computed together in one pass over the image with integer arithmetic.")
+        
+        with st.expander("⚙️ Result Cache"):
+            st.json(get_result_cache().stats())
     
     else:
         st.info("Please upload an image to start analysis.")
@@ -1,4 +1,7 @@
 import streamlit as st
+import pandas as pd
+from utils.diagnosis import diagnose, diagnose_batch, LOCATIONS, PATTERNS, UNSELECTED
+from utils.profiling import timed
 
 def render():
     st.header("🩺 Deficiency Detective")
@@ -13,41 +16,33 @@ def render():
     
     st.subheader("Visual Symptom Checker")
     
-    location = st.selectbox("Where are the symptoms located?", 
-                            ["Select...", "Old Leaves (Bottom)", "New Leaves (Top)", "Whole Plant"])
+    location = st.selectbox("Where are the symptoms located?", [UNSELECTED, *LOCATIONS])
     
-    pattern = st.selectbox("What is the pattern?",
-                           ["Select...", "Yellowing between veins (Interveinal Chlorosis)", 
-                            "Complete yellowing", "Purple/Reddish spots", "Brown/Necrotic edges"])
+    pattern = st.selectbox("What is the pattern?", [UNSELECTED, *PATTERNS])
     
     st.divider()
     
     if st.button("Diagnose"):
-        if location == "Select..." or pattern == "Select...":
-            st.error("Please select both location and pattern.")
-        
-        # Decision Logic based on Biology
-        elif location == "New Leaves (Top)":
-            if pattern == "Yellowing between veins (Interveinal Chlorosis)":
-                st.warning("⚠️ **Diagnosis: Iron (Fe) Deficiency**")
-                st.markdown("Iron is immobile in plants, so young leaves suffer first.")
-            elif pattern == "Complete yellowing":
-                st.warning("⚠️ **Diagnosis: Sulfur (S) Deficiency**")
-            else:
-                 st.warning("⚠️ **Diagnosis: Zinc (Zn) Deficiency**")
-                 st.markdown("**High Probability.** Zinc deficiency often causes 'rosetting' (stunted leaves) and chlorosis in new growth.")
-                 st.info("💡 **Recommendation:** This aligns with Prof. Aarts' research on *ZIP* transporters. Apply Zinc Sulfate foliar spray.")
-                 
-        elif location == "Old Leaves (Bottom)":
-            if pattern == "Yellowing between veins (Interveinal Chlorosis)":
-                 st.warning("⚠️ **Diagnosis: Magnesium (Mg) Deficiency**")
-            elif pattern == "Complete yellowing":
-                 st.warning("⚠️ **Diagnosis: Nitrogen (N) Deficiency**")
+        # Decision Logic based on Biology (compiled lookup table, see utils/diagnosis.py)
+        result = diagnose(location, pattern)
+        getattr(st, result.level)(result.message)
+        if result.detail:
+            st.markdown(result.detail)
+        if result.recommendation:
+            st.info(f"💡 **Recommendation:** {result.recommendation}")
+
+    with st.expander("📋 Batch Diagnosis (Scouting Reports)"):
+        st.markdown("Upload a CSV with `location` and `pattern` columns using the labels above.")
+        reports = st.file_uploader("Upload scouting reports", type=["csv"])
+        if reports is not None:
+            observations = pd.read_csv(reports)
+            if not {"location", "pattern"}.issubset(observations.columns):
+                st.error("The file needs `location` and `pattern` columns.")
             else:
-                 st.error("Unable to determine with high confidence.")
-                 
-        else:
-            st.info("Analysis inconclusive. Please consult a lab test.")
+                with timed("diagnose_batch", rows=len(observations)):
+                    diagnosed = pd.concat([observations, diagnose_batch(observations["location"], observations["pattern"])], axis=1)
+                st.bar_chart(diagnosed["diagnosis"].value_counts())
+                st.download_button("Download diagnoses", diagnosed.to_csv(index=False), "diagnoses.csv", "text/csv")
 
     st.markdown("---")
     st.caption("🔍 **AI Vision Mode** (Coming Soon): Train a CNN on the dataset to detect early-onset chlorosis before the human eye can see it, utilizing NPEC thermal imaging data.")
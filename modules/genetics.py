@@ -1,7 +1,110 @@
+import os
 import streamlit as st
 import plotly.express as px
-import pandas as pd
+import plotly.graph_objects as go
 import numpy as np
+from utils.cnv_population import summarize_population, COPY_NUMBER_MIN, COPY_NUMBER_MAX
+from utils.profiling import timed
+from utils.read_depth import DEFAULT_WINDOW_BP, call_copy_numbers, gc_content_windows, load_regions
+
+# Population sizes offered in the UI (summaries are streamed, so millions are fine)
+POPULATION_SIZES = [50, 150, 500, 1_000, 10_000, 100_000, 1_000_000, 5_000_000]
+
+# Server-side root of the *.depth and reference FASTA files (see
+# utils/read_depth.py); the page never reads anything outside it
+DEPTH_ROOT = os.environ.get("PHYTOSCOUT_DEPTH_DIR", "")
+FASTA_EXTENSIONS = (".fa", ".fasta", ".fna")
+
+def resolve_under_root(root, relative_path):
+    """
+    Resolves a path relative to `root`, following symlinks, and rejects
+    anything that ends up outside it.
+
+    Raises:
+        ValueError: If the resolved path escapes `root`.
+    """
+    real_root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(real_root, relative_path))
+    if os.path.commonpath([real_root, path]) != real_root:
+        raise ValueError(f"{relative_path} is outside {root}")
+    return path
+
+def list_files_under_root(root, extensions):
+    """Paths (relative to `root`) of the files with one of `extensions`, sorted."""
+    found = []
+    for folder, _, names in os.walk(root):
+        for name in names:
+            if name.lower().endswith(extensions):
+                relative = os.path.relpath(os.path.join(folder, name), root)
+                try:
+                    resolve_under_root(root, relative)
+                except ValueError:
+                    continue  # Symlink pointing out of the root
+                found.append(relative)
+    return sorted(found)
+
+@st.cache_data(show_spinner=False)
+def get_gc_windows(fasta_path, window_bp, mtime):
+    """GC fraction per window of the reference (cached per file version)."""
+    return gc_content_windows(fasta_path, window_bp)
+
+@st.cache_data(show_spinner=False)
+def get_copy_number_calls(depth_paths, mtimes, regions, window_bp, fasta_path, fasta_mtime):
+    """Read-depth calls for every sample (cached until a file changes)."""
+    gc = get_gc_windows(fasta_path, window_bp, fasta_mtime) if fasta_path else None
+    return call_copy_numbers(list(depth_paths), regions, window_bp, gc)
+
+def render_read_depth(gene):
+    """Copy numbers of the candidate loci from real sequencing depth."""
+    st.subheader("Read-Depth CNV Calling")
+    st.markdown("Estimate copy numbers of candidate loci from sequencing depth of *Noccaea* samples. "
+                "Depth files are memory-mapped on the server, so whole-genome coverage is never loaded at once.")
+    
+    if not DEPTH_ROOT or not os.path.isdir(DEPTH_ROOT):
+        st.info("Set `PHYTOSCOUT_DEPTH_DIR` to the server folder holding your .depth files "
+                "(made with `python -m utils.read_depth convert`) and reference FASTA.")
+        return
+    
+    r1, r2 = st.columns(2)
+    depth_files = list_files_under_root(DEPTH_ROOT, (".depth",))
+    selected_depth = r1.multiselect("Depth files", depth_files, default=depth_files,
+                                    help=f"Samples found under {DEPTH_ROOT}.")
+    fasta_file = r1.selectbox("Reference FASTA for GC correction (optional)",
+                              [None] + list_files_under_root(DEPTH_ROOT, FASTA_EXTENSIONS),
+                              format_func=lambda name: "None" if name is None else name)
+    regions_file = r2.file_uploader("Loci (CSV: name,contig,start,end or BED)", type=["csv", "bed"])
+    window_bp = r2.number_input("Window size (bp)", min_value=100, value=DEFAULT_WINDOW_BP, step=100)
+    
+    if not selected_depth or regions_file is None:
+        st.info("Select depth files and provide the coordinates of the loci in your reference assembly.")
+        return
+    
+    try:
+        depth_paths = tuple(resolve_under_root(DEPTH_ROOT, name) for name in selected_depth)
+        fasta_path = resolve_under_root(DEPTH_ROOT, fasta_file) if fasta_file else None
+        regions = load_regions(regions_file)
+        with st.spinner(f"Calling {len(depth_paths)} samples..."), timed("read_depth_calls", samples=len(depth_paths)):
+            calls = get_copy_number_calls(depth_paths, tuple(os.path.getmtime(p) for p in depth_paths), regions,
+                                          int(window_bp), fasta_path,
+                                          os.path.getmtime(fasta_path) if fasta_path else None)
+    except (OSError, ValueError, KeyError) as exc:
+        st.error(f"Could not call copy numbers: {exc}")
+        return
+    
+    # Loci named after the selected gene (e.g. "HMA4_a") come first
+    gene_short = gene.split("(")[0].split()[0].upper()
+    calls = calls.assign(selected=calls["locus"].str.upper().str.startswith(gene_short))
+    calls = calls.sort_values(["selected", "locus"], ascending=[False, True])
+    
+    fig = px.bar(calls, x="locus", y="copy_number", color="sample", barmode="group",
+                 title="Estimated Copy Number per Locus", labels={"copy_number": "Copy Number", "locus": "Locus"})
+    st.plotly_chart(fig, use_container_width=True)
+    st.dataframe(calls.pivot_table(index="sample", columns="locus", values="copy_number").round(2))
+
+@st.cache_data(show_spinner=False)
+def get_population_summary(population_size):
+    """Chart-sized summary of a simulated population (cached per size)."""
+    return summarize_population(population_size)
 
 def render():
     st.header("🧬 Genetics Explorer (CNV Analysis)")
@@ -35,51 +138,65 @@ def render():
         **Hypothesis:** Higher copy numbers of this gene = Higher tolerance.
         """)
         
-        population_size = st.slider("Population Size (n)", 50, 500, 150)
+        population_size = st.select_slider("Population Size (n)", options=POPULATION_SIZES, value=150,
+                                           format_func=lambda n: f"{n:,}")
         
     # Generate Mock Data for CNV
     # Logic: More copies = Higher tolerance (with some noise)
+    # The population is simulated in chunks and reduced to binned counts,
+    # per-group quantiles and a streaming OLS fit, so only a few hundred
+    # points ever reach the browser regardless of n.
+    with st.spinner("Simulating population..."), timed("simulate_population", n=population_size):
+        summary = get_population_summary(population_size)
     
-    np.random.seed(42)
-    
-    # Simulate Copy Numbers (e.g., 1 to 10 copies)
-    copy_numbers = np.random.randint(1, 8, size=population_size)
-    
-    # Simulate Tolerance (correlated to copy number + random environmental noise)
-    # Base tolerance + (Copy Number * Effect Size) + Noise
-    tolerance = 100 + (copy_numbers * 150) + np.random.normal(0, 50, size=population_size)
-    
-    # Simulate accumulation (also correlated)
-    accumulation = 500 + (copy_numbers * 800) + np.random.normal(0, 200, size=population_size)
-
-    df = pd.DataFrame({
-        "Plant ID": range(1, population_size + 1),
-        "Gene Copy Number": copy_numbers,
-        "Zinc Tolerance Index": tolerance,
-        "Leaf Zinc Accumulation (PPM)": accumulation
-    })
+    density = summary["density"]
+    box = summary["box"]
+    fit = summary["tolerance_fit"]
     
     with col2:
         tab1, tab2 = st.tabs(["📊 Tolerance Correlation", "🌿 Leaf Accumulation"])
         
         with tab1:
-            fig_tol = px.scatter(df, x="Gene Copy Number", y="Zinc Tolerance Index", 
-                                 title=f"Copy Number Variation vs. Tolerance ({gene.split('(')[0]})",
-                                 trendline="ols", # Add a trendline to show significant correlation
-                                 color="Zinc Tolerance Index",
-                                 color_continuous_scale="Viridis")
-            st.plotly_chart(fig_tol, use_container_width=True)
+            with timed("build_figure", figure="tolerance"):
+                fig_tol = px.scatter(density, x="Gene Copy Number", y="Zinc Tolerance Index", 
+                                     title=f"Copy Number Variation vs. Tolerance ({gene.split('(')[0]})",
+                                     size="Plants", # Binned density instead of one marker per plant
+                                     color="Zinc Tolerance Index",
+                                     color_continuous_scale="Viridis")
+                
+                # Add a trendline to show significant correlation
+                trend_x = np.array([COPY_NUMBER_MIN, COPY_NUMBER_MAX])
+                fig_tol.add_trace(go.Scatter(x=trend_x, y=fit["intercept"] + fit["slope"] * trend_x,
+                                             mode="lines", name="OLS trendline", line=dict(color="black")))
+            with timed("send_figure", figure="tolerance"):
+                st.plotly_chart(fig_tol, use_container_width=True)
             
-            st.caption(f"**Observation:** Individuals with high copy numbers of *{gene.split('(')[0]}* display significantly higher tolerance to toxic Zinc levels.")
+            st.caption(f"**Observation:** Individuals with high copy numbers of *{gene.split('(')[0]}* display significantly higher tolerance to toxic Zinc levels. "
+                       f"(OLS: +{fit['slope']:.1f} per copy, R² = {fit['r_squared']:.3f}, n = {fit['n']:,})")
 
         with tab2:
-             fig_acc = px.box(df, x="Gene Copy Number", y="Leaf Zinc Accumulation (PPM)",
-                              title=f"Leaf Zinc Concentration by Copy Number Group",
-                              color="Gene Copy Number")
-             st.plotly_chart(fig_acc, use_container_width=True)
+             with timed("build_figure", figure="accumulation"):
+                 fig_acc = go.Figure()
+                 for row in box.to_dict("records"):
+                     # Pre-computed quartiles and fences: one box per copy number group
+                     copies = row["Gene Copy Number"]
+                     fig_acc.add_trace(go.Box(x=[copies], q1=[row["q1"]], median=[row["median"]], q3=[row["q3"]],
+                                              lowerfence=[row["lowerfence"]], upperfence=[row["upperfence"]],
+                                              name=str(copies)))
+                 fig_acc.update_layout(title="Leaf Zinc Concentration by Copy Number Group",
+                                       xaxis_title="Gene Copy Number",
+                                       yaxis_title="Leaf Zinc Accumulation (PPM)",
+                                       legend_title="Gene Copy Number")
+             with timed("send_figure", figure="accumulation"):
+                 st.plotly_chart(fig_acc, use_container_width=True)
 
     st.divider()
     
+    with st.expander("🧪 Copy Numbers from Sequencing Depth"):
+        render_read_depth(gene)
+    
+    st.divider()
+    
     st.markdown("""
     ### 🔬 Evolutionary Pathway: From Mutation to Adaptation
     
@@ -1,4 +1,16 @@
 import streamlit as st
+import plotly.express as px
+from utils.mining_economics import (
+    calculate_mining_economics, load_parcels, value_portfolio,
+    METAL_PRICES, HIGH_GRADE_ASH_PCT, PARCEL_COLUMNS,
+)
+from utils.mining_risk import (
+    simulate_risk, PRICE_VOLATILITY, DEFAULT_YIELD_CV, DEFAULT_CONCENTRATION_CV, DEFAULT_COST_PER_HA,
+)
+from utils.profiling import timed
+
+# Monte Carlo draws offered in the UI (results are streamed, so millions are fine)
+RISK_DRAWS = [100_000, 1_000_000, 5_000_000]
 
 def render():
     st.header("💰 Phytomining Economy")
@@ -28,35 +40,23 @@ def render():
         
     with col2:
         st.subheader("2. Metal Stats")
-        metal_type = st.selectbox("Target Metal", ["Zinc (Zn)", "Nickel (Ni)"])
+        metal_type = st.selectbox("Target Metal", list(METAL_PRICES))
         concentration = st.slider(f"Plant {metal_type} Concentration (mg/kg)", 
                                   min_value=1000, max_value=30000, value=10000, step=500,
                                   help="Concentration in dried leaf tissue")
         
     # Market Prices (Approximate)
-    prices = {
-        "Zinc (Zn)": 2.50, # $/kg
-        "Nickel (Ni)": 18.00 # $/kg (Nickel is much more valuable!)
-    }
-    
-    selected_price = prices[metal_type]
+    selected_price = METAL_PRICES[metal_type]
     
     st.subheader("3. Market Data")
     price_input = st.number_input(f"Current Market Price ($/kg)", value=selected_price, step=0.1)
     
-    # Calculations
-    # 1. Total Biomass (kg) = Hectares * tons/ha * 1000
-    total_biomass_kg = hectares * biomass_per_ha * 1000
-    
-    # 2. Total Metal (kg) = Biomass (kg) * (Concentration (mg/kg) / 1,000,000) -> mg to kg
-    total_metal_kg = total_biomass_kg * (concentration / 1000000)
-    
-    # 3. Gross Value ($)
-    gross_value = total_metal_kg * price_input
-    
-    # 4. Ash Amount (for bio-ore) - Assuming ~5-10% ash content
-    ash_mass_kg = total_biomass_kg * 0.08 
-    metal_in_ash = (total_metal_kg / ash_mass_kg) * 100 # Percentage
+    # Calculations (shared with the portfolio mode below)
+    economics = calculate_mining_economics(hectares, biomass_per_ha, concentration, price_input)
+    total_metal_kg = economics["total_metal_kg"]
+    gross_value = economics["gross_value"]
+    ash_mass_kg = economics["ash_mass_kg"]
+    metal_in_ash = economics["metal_in_ash_pct"]
     
     st.divider()
     
@@ -75,8 +75,111 @@ def render():
     
     This ash would contain approx. **{metal_in_ash:.1f}% {metal_type.split()[0]}**. 
     
-    *{'High-grade ore! Smelters pay a premium for this.' if metal_in_ash > 10 else 'Low grade, might need enrichment.'}*
+    *{'High-grade ore! Smelters pay a premium for this.' if metal_in_ash > HIGH_GRADE_ASH_PCT else 'Low grade, might need enrichment.'}*
     """)
     
     if metal_type == "Nickel (Ni)":
         st.success("💡 **Insight:** Nickel phytomining is generally more profitable than Zinc due to higher market prices, which is why companies like *Botanickel* focus on it.")
+    
+    st.divider()
+    render_risk(hectares, biomass_per_ha, concentration, price_input, metal_type)
+    
+    st.divider()
+    render_portfolio()
+
+@st.cache_data(show_spinner=False)
+def get_risk_summary(hectares, biomass_per_ha, concentration, price, years, volatility, drift,
+                     yield_cv, concentration_cv, cost_per_ha, draws, workers):
+    """Monte Carlo summary (cached per input set)."""
+    return simulate_risk(hectares, biomass_per_ha, concentration, price, years, volatility, drift,
+                         yield_cv, concentration_cv, cost_per_ha, draws=draws, workers=workers)
+
+def render_risk(hectares, biomass_per_ha, concentration, price, metal_type):
+    st.markdown("## 🎲 Risk Mode")
+    st.markdown("The projection above assumes today's price and an average harvest. Risk mode samples "
+                "price paths, yield and concentration to show the range of outcomes.")
+    
+    if not st.toggle("Run Monte Carlo simulation"):
+        return
+    
+    c1, c2, c3 = st.columns(3)
+    years = c1.slider("Harvests (years)", min_value=1, max_value=10, value=3)
+    volatility = c1.slider("Price volatility (per year)", min_value=0.05, max_value=1.0,
+                           value=PRICE_VOLATILITY[metal_type], step=0.05)
+    drift = c1.slider("Expected price change (per year)", min_value=-0.2, max_value=0.2, value=0.0, step=0.01)
+    yield_cv = c2.slider("Yield uncertainty (CV)", min_value=0.0, max_value=1.0, value=DEFAULT_YIELD_CV, step=0.05)
+    concentration_cv = c2.slider("Concentration uncertainty (CV)", min_value=0.0, max_value=1.0,
+                                 value=DEFAULT_CONCENTRATION_CV, step=0.05)
+    cost_per_ha = c3.number_input("Operating cost ($/ha per year)", min_value=0.0, value=DEFAULT_COST_PER_HA, step=50.0)
+    draws = c3.selectbox("Simulated outcomes", RISK_DRAWS, index=1, format_func=lambda n: f"{n:,}")
+    parallel = c3.checkbox("Use all CPU cores", help="Spread the simulation chunks over a process pool.")
+    
+    try:
+        with st.spinner(f"Simulating {draws:,} outcomes..."), timed("mining_risk", draws=draws, years=years):
+            risk = get_risk_summary(hectares, biomass_per_ha, concentration, price, years, volatility, drift,
+                                    yield_cv, concentration_cv, cost_per_ha, draws, None if parallel else 1)
+    except ValueError as exc:
+        st.error(f"Could not simulate: {exc}")
+        return
+    
+    profit = risk["profit"]
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("Profit P5 (bad case)", f"${profit['P5']:,.0f}")
+    m2.metric("Profit P50 (median)", f"${profit['P50']:,.0f}")
+    m3.metric("Profit P95 (good case)", f"${profit['P95']:,.0f}")
+    m4.metric("Probability of Loss", f"{risk['prob_loss']:.1%}")
+    
+    fig = px.bar(risk["revenue_hist"], x="center", y="probability",
+                 title=f"Revenue over {years} year(s) ({risk['draws']:,} simulated outcomes)",
+                 labels={"center": "Revenue ($)", "probability": "Probability"})
+    fig.update_traces(width=(risk["revenue_hist"]["high"] - risk["revenue_hist"]["low"]).to_numpy())
+    fig.add_vline(x=risk["total_cost"], line_dash="dash", line_color="red", annotation_text="Costs")
+    for label, value in risk["revenue"].items():
+        fig.add_vline(x=value, line_dash="dot", line_color="gray", annotation_text=label)
+    st.plotly_chart(fig, use_container_width=True)
+    
+    grade = risk["grade"]
+    fig = px.bar(risk["grade_hist"], x="center", y="probability",
+                 title=f"Bio-ore Grade per Harvest (median {grade['P50']:.1f}% {metal_type.split()[0]})",
+                 labels={"center": "Metal in ash (%)", "probability": "Probability"})
+    fig.update_traces(width=(risk["grade_hist"]["high"] - risk["grade_hist"]["low"]).to_numpy())
+    fig.add_vline(x=HIGH_GRADE_ASH_PCT, line_dash="dash", line_color="green", annotation_text="High grade")
+    st.plotly_chart(fig, use_container_width=True)
+    st.caption(f"{grade['prob_high_grade']:.0%} of harvests reach high-grade ash (>{HIGH_GRADE_ASH_PCT}% metal). "
+               f"Without uncertainty the projection would be ${risk['point_revenue']:,.0f} revenue.")
+
+def render_portfolio():
+    st.markdown("## 🗺️ Field Portfolio")
+    st.markdown(f"Value many parcels at once. Upload a CSV or Parquet file with the columns "
+                f"`{'`, `'.join(PARCEL_COLUMNS)}` (`metal` may be a name or symbol, e.g. `Zn`).")
+    
+    parcel_file = st.file_uploader("Upload parcel table", type=["csv", "parquet"])
+    if parcel_file is None:
+        return
+    
+    price_cols = st.columns(len(METAL_PRICES))
+    prices = {metal: col.number_input(f"{metal} price ($/kg)", value=price, step=0.1, key=f"portfolio_{metal}")
+              for col, (metal, price) in zip(price_cols, METAL_PRICES.items())}
+    
+    try:
+        with timed("load_parcels"):
+            parcels = load_parcels(parcel_file, filename=parcel_file.name)
+        with timed("value_portfolio", parcels=len(parcels)):
+            portfolio = value_portfolio(parcels, prices)
+    except (ValueError, KeyError) as exc:
+        st.error(f"Could not value portfolio: {exc}")
+        return
+    
+    totals = portfolio["totals"]
+    p1, p2, p3, p4 = st.columns(4)
+    p1.metric("Parcels", f"{totals['parcels']:,}")
+    p2.metric("Total Metal Harvested", f"{totals['total_metal_kg']:,.0f} kg")
+    p3.metric("Gross Revenue", f"${totals['gross_value']:,.0f}")
+    p4.metric("High-grade Parcels", f"{totals['high_grade_parcels']:,}")
+    
+    st.subheader("By Metal")
+    st.dataframe(portfolio["by_metal"], use_container_width=True, hide_index=True)
+    
+    # Only the head of the ranking is sent to the browser
+    st.subheader("Top Parcels by Revenue")
+    st.dataframe(portfolio["parcels"].head(100), use_container_width=True, hide_index=True)
@@ -1,6 +1,83 @@
+import hashlib
+import numpy as np
 import streamlit as st
 import plotly.express as px
-from utils.mock_data import generate_remediation_data
+from utils.mock_data import generate_remediation_data, weeks_until_safe, DEFAULT_DECAY_RATE, SAFE_SOIL_ZINC_PPM
+from utils.profiling import timed
+from utils.spatial_remediation import GridSimulation, demo_raster, load_raster
+
+def render_field_map(initial_zinc, weeks):
+    """Spatial simulation over an uploaded (or demo) field raster."""
+    st.markdown("Simulate depletion cell by cell over a heterogeneous field. "
+                "Upload a raster of initial soil Zinc (PPM), or use a demo field with the same mean.")
+    
+    f1, f2, f3 = st.columns(3)
+    raster_file = f1.file_uploader("Initial Zinc raster", type=["npy", "csv", "txt", "png", "tif", "tiff"])
+    ppm_per_unit = f1.number_input("PPM per pixel value (images)", value=1.0, min_value=0.0)
+    decay_rate = f2.slider("Weekly uptake rate", min_value=0.01, max_value=0.20, value=DEFAULT_DECAY_RATE, step=0.01)
+    diffusion = f3.slider("Lateral exchange per week", min_value=0.0, max_value=0.25, value=0.0, step=0.01,
+                          help="Fraction exchanged with each neighbouring cell (soil mixing, water flow).")
+    
+    if raster_file is not None:
+        raster_bytes = raster_file.getvalue()
+        source_key = hashlib.sha256(raster_bytes).hexdigest()
+    else:
+        source_key = f"demo-{initial_zinc}"
+    
+    # The simulation lives in the session: extending the weeks continues from
+    # the saved state, shortening them only re-reads the stored statistics
+    key = (source_key, ppm_per_unit, decay_rate, diffusion)
+    sim = st.session_state.get("field_simulation")
+    if sim is None or st.session_state.get("field_simulation_key") != key:
+        with timed("load_raster"):
+            try:
+                initial = (load_raster(raster_file, raster_file.name, ppm_per_unit) if raster_file is not None
+                           else demo_raster(mean_ppm=initial_zinc))
+            except (OSError, ValueError) as exc:
+                st.error(f"Could not read the raster: {exc}")
+                return
+        sim = GridSimulation(initial, decay_rate, diffusion)
+        st.session_state["field_simulation"] = sim
+        st.session_state["field_simulation_key"] = key
+    
+    resumed_from = sim.week
+    with timed("simulate_grid", cells=sim.soil.size, from_week=resumed_from, to_week=weeks):
+        sim.run(weeks)
+    stats = sim.stats_frame(weeks)
+    
+    rows, cols = sim.initial.shape
+    if resumed_from == 0:
+        note = "fresh run"
+    elif resumed_from < weeks:
+        note = f"resumed from week {resumed_from}"
+    else:
+        note = "from stored state"
+    st.caption(f"{rows}×{cols} cells · weeks 1–{weeks} ({note})")
+    
+    last = stats.iloc[-1]
+    k1, k2, k3 = st.columns(3)
+    k1.metric("Mean Soil Zinc", f"{last['mean_ppm']:.0f} PPM")
+    k2.metric("Cells Below Safe Limit", f"{last['safe_fraction'] * 100:.1f}%")
+    k3.metric("Hotspot (90th pct.)", f"{last['p90_ppm']:.0f} PPM")
+    
+    with timed("build_figure", figure="field_stats"):
+        fig_stats = px.line(stats, x="week", y=["mean_ppm", "median_ppm", "p90_ppm"], title="Field Soil Zinc by Week",
+                            labels={"week": "Week", "value": "Soil Zinc (PPM)", "variable": "Statistic"})
+        fig_stats.add_hline(y=SAFE_SOIL_ZINC_PPM, line_dash="dash", annotation_text="Safe limit")
+    with timed("send_figure", figure="field_stats"):
+        st.plotly_chart(fig_stats, use_container_width=True)
+    
+    # Heatmaps come from the small per-week snapshots, never the full grid
+    shown_week = st.slider("Heatmap week", min_value=0, max_value=weeks, value=weeks)
+    snapshot = sim.snapshots[shown_week]
+    with timed("build_figure", figure="field_heatmap"):
+        fig_map = px.imshow(snapshot, color_continuous_scale="YlOrBr", zmin=0,
+                            zmax=float(np.nanmax(sim.snapshots[0])), title=f"Soil Zinc at Week {shown_week}",
+                            labels={"color": "PPM"})
+        fig_map.update_xaxes(showticklabels=False)
+        fig_map.update_yaxes(showticklabels=False)
+    with timed("send_figure", figure="field_heatmap"):
+        st.plotly_chart(fig_map, use_container_width=True)
 
 def render():
     st.header("🌱 Phytoremediation Tracker")
@@ -24,22 +101,30 @@ def render():
         weeks = st.slider("Growth Duration (Weeks)", min_value=4, max_value=24, value=12)
         
     # Generate Data
-    df = generate_remediation_data(initial_zinc, weeks)
+    with timed("generate_data", weeks=weeks):
+        df = generate_remediation_data(initial_zinc, weeks)
     
     # Visualization
-    tab1, tab2 = st.tabs(["📉 Soil Cleanup", "🌿 Plant Accumulation"])
+    tab1, tab2, tab3 = st.tabs(["📉 Soil Cleanup", "🌿 Plant Accumulation", "🗺️ Field Map"])
     
     with tab1:
-        fig_soil = px.line(df, x="Week", y="Soil Zinc (PPM)", title="Soil Zinc Depletion", 
-                           color_discrete_sequence=["brown"])
-        st.plotly_chart(fig_soil, use_container_width=True)
+        with timed("build_figure", figure="soil"):
+            fig_soil = px.line(df, x="Week", y="Soil Zinc (PPM)", title="Soil Zinc Depletion", 
+                               color_discrete_sequence=["brown"])
+        with timed("send_figure", figure="soil"):
+            st.plotly_chart(fig_soil, use_container_width=True)
         
     with tab2:
-        fig_plant = px.area(df, x="Week", y="Accumulated Plant Zinc (mg/kg)", title="Zinc Accumulation in Plant Tissue",
-                            color_discrete_sequence=["green"])
-        # Add a threshold line for "Hyperaccumulation" definition (>3000 mg/kg typically)
-        fig_plant.add_hline(y=3000, line_dash="dash", annotation_text="Hyperaccumulation Threshold")
-        st.plotly_chart(fig_plant, use_container_width=True)
+        with timed("build_figure", figure="plant"):
+            fig_plant = px.area(df, x="Week", y="Accumulated Plant Zinc (mg/kg)", title="Zinc Accumulation in Plant Tissue",
+                                color_discrete_sequence=["green"])
+            # Add a threshold line for "Hyperaccumulation" definition (>3000 mg/kg typically)
+            fig_plant.add_hline(y=3000, line_dash="dash", annotation_text="Hyperaccumulation Threshold")
+        with timed("send_figure", figure="plant"):
+            st.plotly_chart(fig_plant, use_container_width=True)
+        
+    with tab3:
+        render_field_map(initial_zinc, weeks)
         
     # KPI / Interpretation
     final_soil = df["Soil Zinc (PPM)"].iloc[-1]
@@ -47,8 +132,10 @@ def render():
     
     st.success(f"**Remediation Status:** {removed_pct:.1f}% reduction in soil Zinc.")
     
-    if final_soil < 300: # Arbitrary "Safe" limit
+    if final_soil < SAFE_SOIL_ZINC_PPM:
         st.balloons()
         st.info("✅ Soil is now within safe agricultural limits!")
     else:
-        st.warning(f"⚠️ Soil still above safe limit (300 PPM). Estimated {(initial_zinc-300)/((initial_zinc-final_soil)/weeks):.1f} more weeks needed.")
+        # Closed form from the decay model rather than a linear extrapolation
+        more_weeks = float(weeks_until_safe(initial_zinc)) - weeks
+        st.warning(f"⚠️ Soil still above safe limit ({SAFE_SOIL_ZINC_PPM} PPM). Estimated {more_weeks:.1f} more weeks needed.")
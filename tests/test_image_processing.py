@@ -0,0 +1,115 @@
+import struct
+import zlib
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from utils.image_processing import calculate_green_index, calculate_green_index_tiled, iter_rgb_tiles
+
+# Neither side is a multiple of the tile / strip / window sizes used below
+HEIGHT, WIDTH = 157, 203
+
+def make_plants(height=HEIGHT, width=WIDTH, seed=0):
+    """Noise with green blobs, so both counts and their ratio are non-trivial."""
+    rng = np.random.default_rng(seed)
+    rgb = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    yy, xx = np.mgrid[:height, :width]
+    for cy, cx, r in [(30, 40, 25), (100, 150, 40), (140, 20, 15)]:
+        blob = (yy - cy) ** 2 + (xx - cx) ** 2 < r ** 2
+        rgb[blob] = (40, 180, 50)
+    return rgb
+
+def write_tiff(path, rgb, tile=None, rows_per_strip=None, deflate=False, predictor=1):
+    """
+    Minimal baseline TIFF writer for layouts Pillow cannot save (tiled, or
+    Deflate with the horizontal predictor).
+    """
+    height, width, samples = rgb.shape
+
+    def encode(block):
+        if predictor == 2:
+            block = block.copy()
+            block[:, 1:] = block[:, 1:] - block[:, :-1]  # uint8 wraps, as in the file format
+        data = block.tobytes()
+        return zlib.compress(data) if deflate else data
+
+    blocks = []
+    if tile:
+        tile_width, tile_rows = tile
+        for y in range(0, height, tile_rows):
+            for x in range(0, width, tile_width):
+                block = np.zeros((tile_rows, tile_width, samples), np.uint8)
+                part = rgb[y:y + tile_rows, x:x + tile_width]
+                block[:part.shape[0], :part.shape[1]] = part
+                blocks.append(encode(block))
+    else:
+        blocks = [encode(rgb[y:y + rows_per_strip]) for y in range(0, height, rows_per_strip)]
+
+    offsets, offset = [], 8
+    for block in blocks:
+        offsets.append(offset)
+        offset += len(block)
+    ifd_offset = offset + offset % 2
+
+    tags = [(256, 4, [width]), (257, 4, [height]), (258, 3, [8] * samples), (259, 3, [8 if deflate else 1]),
+            (262, 3, [2]), (277, 3, [samples]), (284, 3, [1]), (317, 3, [predictor])]
+    counts = [len(block) for block in blocks]
+    if tile:
+        tags += [(322, 4, [tile[0]]), (323, 4, [tile[1]]), (324, 4, offsets), (325, 4, counts)]
+    else:
+        tags += [(273, 4, offsets), (278, 4, [rows_per_strip]), (279, 4, counts)]
+
+    entries, extra = b"", b""
+    extra_offset = ifd_offset + 2 + 12 * len(tags) + 4
+    for tag, kind, values in sorted(tags):
+        payload = struct.pack("<" + ("H" if kind == 3 else "I") * len(values), *values)
+        if len(payload) <= 4:
+            entries += struct.pack("<HHI", tag, kind, len(values)) + payload.ljust(4, b"\0")
+        else:
+            entries += struct.pack("<HHII", tag, kind, len(values), extra_offset + len(extra))
+            extra += payload
+
+    with open(path, "wb") as fh:
+        fh.write(b"II*\0" + struct.pack("<I", ifd_offset) + b"".join(blocks) + b"\0" * (ifd_offset - offset))
+        fh.write(struct.pack("<H", len(tags)) + entries + b"\0\0\0\0" + extra)
+
+def save_pillow(path, rgb, **params):
+    Image.fromarray(rgb).save(path, **params)
+
+CASES = {
+    "tiff_raw": ("tif", lambda p, rgb: save_pillow(p, rgb, compression="raw")),
+    "tiff_deflate": ("tif", lambda p, rgb: save_pillow(p, rgb, compression="tiff_adobe_deflate")),
+    "tiff_raw_strips": ("tif", lambda p, rgb: write_tiff(p, rgb, rows_per_strip=10)),
+    "tiff_deflate_strips_predictor": ("tif", lambda p, rgb: write_tiff(p, rgb, rows_per_strip=16, deflate=True,
+                                                                      predictor=2)),
+    "tiff_raw_tiled": ("tif", lambda p, rgb: write_tiff(p, rgb, tile=(64, 32))),
+    "tiff_deflate_tiled": ("tif", lambda p, rgb: write_tiff(p, rgb, tile=(48, 48), deflate=True)),
+    "tiff_deflate_tiled_predictor": ("tif", lambda p, rgb: write_tiff(p, rgb, tile=(64, 16), deflate=True,
+                                                                     predictor=2)),
+    "tiff_lzw": ("tif", lambda p, rgb: save_pillow(p, rgb, compression="tiff_lzw")),
+    "bmp": ("bmp", lambda p, rgb: save_pillow(p, rgb)),
+    "png": ("png", lambda p, rgb: save_pillow(p, rgb)),
+}
+
+@pytest.mark.parametrize("case", sorted(CASES))
+@pytest.mark.parametrize("tile_rows", [1, 50, 1024])
+def test_tiled_matches_in_memory(tmp_path, case, tile_rows):
+    suffix, write = CASES[case]
+    path = tmp_path / f"plants.{suffix}"
+    write(str(path), make_plants())
+
+    expected, _ = calculate_green_index(str(path))
+
+    assert calculate_green_index_tiled(str(path), tile_rows) == pytest.approx(expected, abs=1e-12)
+    with open(path, "rb") as fh:
+        assert calculate_green_index_tiled(fh, tile_rows) == pytest.approx(expected, abs=1e-12)
+
+def test_tiled_tiff_decodes_every_pixel(tmp_path):
+    # Exact pixels, not just the ratio: a misplaced tile would keep the count
+    rgb = np.dstack([make_plants(), make_plants(seed=1)[:, :, :1]])  # RGBA: extra sample is dropped
+    path = tmp_path / "rgba_tiled.tif"
+    write_tiff(str(path), rgb, tile=(64, 32), deflate=True, predictor=2)
+
+    decoded = np.concatenate(list(iter_rgb_tiles(str(path), tile_rows=40)))
+    np.testing.assert_array_equal(decoded, rgb[:, :, :3])
@@ -0,0 +1,269 @@
+import argparse
+import csv
+import glob
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from utils.image_processing import count_green_pixels, estimate_biomass, iter_rgb_tiles
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".ppm", ".tif", ".tiff", ".npy"}
+
+RESULT_COLUMNS = [
+    "path",
+    "status",
+    "width",
+    "height",
+    "green_ratio",
+    "estimated_biomass_g",
+    "projected_yield_g",
+    "error",
+]
+
+def iter_image_paths(source):
+    """
+    Lists the images to analyze, in a stable order so runs are reproducible.
+
+    Args:
+        source (str): A directory (searched recursively) or a glob pattern
+            such as "trays/2024-*/**/*.jpg".
+
+    Returns:
+        list: Sorted image paths.
+    """
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            for name in files:
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                    paths.append(os.path.join(root, name))
+    else:
+        paths = [p for p in glob.iglob(source, recursive=True) if os.path.isfile(p)]
+
+    return sorted(paths)
+
+def analyze_image_path(path):
+    """
+    Computes the green index for one image file (runs inside a worker process).
+    Any failure is caught and returned as an "error" row, so one corrupt
+    file never stops the rest of the run.
+
+    Args:
+        path (str): Path to the image.
+
+    Returns:
+        dict: One result row keyed by RESULT_COLUMNS.
+    """
+    row = dict.fromkeys(RESULT_COLUMNS, "")
+    row["path"] = path
+
+    try:
+        # Windowed read keeps worker memory flat even for orthomosaics
+        green_pixels, total_pixels, width, height = 0, 0, 0, 0
+        for tile in iter_rgb_tiles(path):
+            tile_green, tile_total = count_green_pixels(tile)
+            green_pixels += tile_green
+            total_pixels += tile_total
+            height += tile.shape[0]
+            width = tile.shape[1]
+
+        green_ratio = (green_pixels / total_pixels) * 100 if total_pixels else 0.0
+        estimated_biomass_g, projected_yield_g = estimate_biomass(green_ratio)
+
+        row.update({
+            "status": "ok",
+            "width": width,
+            "height": height,
+            "green_ratio": round(green_ratio, 4),
+            "estimated_biomass_g": round(estimated_biomass_g, 4),
+            "projected_yield_g": round(projected_yield_g, 4),
+        })
+    except Exception as exc:  # Corrupt / truncated / unsupported files
+        row["status"] = "error"
+        row["error"] = f"{type(exc).__name__}: {exc}"
+
+    return row
+
+def _crashed_row(path, exc):
+    # Result row for an image whose worker process died (OOM, decoder crash)
+    row = dict.fromkeys(RESULT_COLUMNS, "")
+    row.update({"path": path, "status": "error", "error": f"WorkerCrashed: {exc or 'worker process died'}"})
+    return row
+
+def _analyze_isolated(path):
+    """
+    Re-runs one image in a pool of its own, so a crash can be pinned on
+    it without taking other images down.
+    """
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        try:
+            return pool.submit(analyze_image_path, path).result()
+        except BrokenProcessPool as exc:
+            return _crashed_row(path, exc)
+
+def load_completed_paths(output_path, include_errors=True):
+    """
+    Reads the paths already recorded in a previous (possibly crashed) run.
+    Error rows count as completed by default, so images that failed are
+    not retried on resume (a crashing image would otherwise crash every
+    resume); pass include_errors=False to retry them.
+
+    Args:
+        output_path (str): The results CSV.
+        include_errors (bool): Treat "error" rows as completed.
+
+    Returns:
+        set: Paths that already have a result row.
+    """
+    if not os.path.exists(output_path):
+        return set()
+
+    with open(output_path, newline="") as fh:
+        return {row["path"] for row in csv.DictReader(fh)
+                if row.get("status") == "ok" or (include_errors and row.get("status"))}
+
+def _drop_error_rows(output_path, paths):
+    # Rewrites the table without the error rows of `paths` (about to be retried)
+    with open(output_path, newline="") as fh:
+        rows = [row for row in csv.DictReader(fh)
+                if row.get("status") and not (row["status"] == "error" and row["path"] in paths)]
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, "w", newline="") as fh:
+        writer = csv.DictWriter(fh, fieldnames=RESULT_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, output_path)
+
+def _print_progress(done, total, failed, started):
+    elapsed = time.monotonic() - started
+    rate = done / elapsed if elapsed > 0 else 0.0
+    eta = (total - done) / rate if rate > 0 else float("inf")
+    print(f"\r{done}/{total} images | {failed} failed | {rate:.1f} img/s | ETA {eta/60:.1f} min",
+          end="", file=sys.stderr, flush=True)
+
+def run_batch(source, output_path, workers=None, max_pending=None, resume=True, retry_errors=False,
+              progress=None):
+    """
+    Analyzes every image under `source` on a process pool and appends one
+    row per image to a CSV table.
+
+    Rows are flushed as soon as each image finishes, so after a crash the
+    same command picks up where it stopped (`resume=True` skips every path
+    already present in `output_path`, including failed ones unless
+    `retry_errors` is set). At most `max_pending` images are in
+    flight at once, which keeps memory bounded regardless of run size.
+    If a worker process dies (out of memory, decoder crash), the images it
+    took down are re-run one at a time and the one that crashes is recorded
+    as an error row, so resuming does not hit it again.
+
+    Args:
+        source (str): Directory or glob pattern (see iter_image_paths).
+        output_path (str): CSV file to create or append to.
+        workers (int): Worker processes (defaults to all cores).
+        max_pending (int): In-flight images (defaults to 4 per worker).
+        resume (bool): Skip images already recorded in `output_path`.
+        retry_errors (bool): On resume, analyse images with an error row again
+            (their old error rows are replaced).
+        progress (callable): Called as progress(done, total, failed, started).
+
+    Returns:
+        dict: Counts of 'processed', 'failed' and 'skipped' images
+        ('skipped': input images that already had a result).
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 4
+
+    completed = load_completed_paths(output_path, include_errors=not retry_errors) if resume else set()
+    all_paths = iter_image_paths(source)
+    paths = [p for p in all_paths if p not in completed]
+    if resume and retry_errors and os.path.exists(output_path):
+        _drop_error_rows(output_path, set(paths))
+
+    # Start a fresh table, or make sure a half-written last line from a
+    # crashed run does not swallow the first new row
+    mode = "a" if resume and os.path.exists(output_path) else "w"
+    if mode == "a":
+        with open(output_path, "rb+") as fh:
+            fh.seek(0, os.SEEK_END)
+            if fh.tell() > 0:
+                fh.seek(-1, os.SEEK_END)
+                if fh.read(1) != b"\n":
+                    fh.write(b"\n")
+
+    done, failed = 0, 0
+    started = time.monotonic()
+
+    with open(output_path, mode, newline="") as fh:
+        writer = csv.DictWriter(fh, fieldnames=RESULT_COLUMNS)
+        if mode == "w" or fh.tell() == 0:
+            writer.writeheader()
+
+        pool = ProcessPoolExecutor(max_workers=workers)
+        try:
+            todo = iter(paths)
+            pending = {}  # future -> path
+
+            while True:
+                # Keep the pool busy without queueing the whole directory
+                while len(pending) < max_pending:
+                    path = next(todo, None)
+                    if path is None:
+                        break
+                    pending[pool.submit(analyze_image_path, path)] = path
+
+                if not pending:
+                    break
+
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                rows, broken = [], False
+                for future in finished:
+                    try:
+                        rows.append(future.result())
+                        del pending[future]
+                    except BrokenProcessPool:
+                        broken = True
+
+                if broken:
+                    # A worker died and took every in-flight image with it.
+                    # Re-run those one by one in isolation so only the
+                    # culprit gets an error row, then carry on with a new pool.
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    rows.extend(_analyze_isolated(path) for path in pending.values())
+                    pending = {}
+                    pool = ProcessPoolExecutor(max_workers=workers)
+
+                for row in rows:
+                    writer.writerow(row)
+                    done += 1
+                    failed += row["status"] == "error"
+
+                fh.flush()
+                if progress is not None:
+                    progress(done, len(paths), failed, started)
+        finally:
+            pool.shutdown()
+
+    return {"processed": done, "failed": failed, "skipped": len(all_paths) - len(paths)}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch green-index phenotyping for image directories.")
+    parser.add_argument("source", help="Image directory or glob pattern")
+    parser.add_argument("-o", "--output", default="green_index_results.csv", help="Results CSV")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--max-pending", type=int, default=None, help="Images in flight at once")
+    parser.add_argument("--no-resume", action="store_true", help="Overwrite instead of resuming")
+    parser.add_argument("--retry-errors", action="store_true",
+                        help="On resume, retry images that failed before (by default they are skipped)")
+    args = parser.parse_args(argv)
+
+    summary = run_batch(args.source, args.output, workers=args.workers,
+                        max_pending=args.max_pending, resume=not args.no_resume,
+                        retry_errors=args.retry_errors, progress=_print_progress)
+    print(file=sys.stderr)
+    print(f"Done: {summary['processed']} processed, {summary['failed']} failed, "
+          f"{summary['skipped']} skipped (already in {args.output})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image, PngImagePlugin
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "PHYTOSCOUT_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "phyto_scout", "green_index")
+)
+
+# Disk writes between full directory scans; in between, the disk tier size
+# is tracked from this process's own writes (other processes share the dir)
+DISK_RESCAN_EVERY = 256
+# Eviction frees down to this fraction of `disk_bytes`, so a full cache is
+# not rescanned on every write
+DISK_LOW_WATER = 0.9
+
+def make_cache_key(data, params):
+    """
+    Builds a content address for an analysis result.
+
+    Args:
+        data (bytes): Raw bytes of the uploaded image.
+        params (dict): Analysis parameters (JSON-serializable).
+
+    Returns:
+        str: Hex SHA-256 of the image bytes plus the canonical parameters.
+    """
+    digest = hashlib.sha256(data)
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()
+
+def _image_nbytes(img):
+    return img.width * img.height * len(img.getbands())
+
+class ResultCache:
+    """
+    Two-tier cache for (green_ratio, preview image) results.
+
+    - Memory tier: LRU bounded by the decoded size of the stored previews.
+    - Disk tier: one PNG per key (ratio kept in a text chunk), evicted
+      oldest-first once the directory exceeds `disk_bytes`. The directory
+      is only scanned when the running size estimate goes over budget or
+      every DISK_RESCAN_EVERY writes, so a put does not cost O(files).
+
+    Safe to share between Streamlit sessions (shared state is locked).
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, memory_bytes=256 * 1024**2, disk_bytes=2 * 1024**3):
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+
+        self._memory = OrderedDict()
+        self._memory_used = 0
+        self._disk_used = None  # Unknown until the first scan
+        self._writes_since_scan = 0
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(
+            ["memory_hits", "disk_hits", "misses", "memory_evictions", "disk_evictions"], 0
+        )
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def _remember(self, key, ratio, img):
+        # Caller holds the lock
+        if key in self._memory:
+            self._memory_used -= _image_nbytes(self._memory.pop(key)[1])
+        self._memory[key] = (ratio, img)
+        self._memory_used += _image_nbytes(img)
+
+        while self._memory_used > self.memory_bytes and len(self._memory) > 1:
+            _, (_, old_img) = self._memory.popitem(last=False)
+            self._memory_used -= _image_nbytes(old_img)
+            self._counters["memory_evictions"] += 1
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        try:
+            with Image.open(path) as img:
+                img.load()
+                ratio = float(img.text["green_ratio"])
+                preview = img.copy()
+            os.utime(path)  # Mark as recently used for eviction
+        except (OSError, KeyError, ValueError):
+            return None
+        return ratio, preview
+
+    def _write_disk(self, key, ratio, img):
+        meta = PngImagePlugin.PngInfo()
+        meta.add_text("green_ratio", repr(float(ratio)))
+
+        buf = io.BytesIO()
+        img.save(buf, format="PNG", pnginfo=meta)
+
+        # Write-then-rename so readers never see a half-written file
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as fh:
+            fh.write(buf.getvalue())
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._writes_since_scan += 1
+            if self._disk_used is not None:
+                self._disk_used += buf.tell() - replaced
+            scan = (self._disk_used is None or self._disk_used > self.disk_bytes
+                    or self._writes_since_scan >= DISK_RESCAN_EVERY)
+            if scan:
+                self._writes_since_scan = 0
+        if scan:
+            remaining = self._evict_disk(keep=path)
+            with self._lock:
+                self._disk_used = remaining
+
+    def _evict_disk(self, keep=None):
+        """Scans the directory, evicts oldest-first and returns the bytes left."""
+        # Other sessions and processes evict concurrently, so any file may
+        # vanish between listing and removal; vanished files are skipped
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".png") and entry.path != keep:
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        if keep:
+            try:
+                total += os.path.getsize(keep)
+            except OSError:
+                pass
+        if total <= self.disk_bytes:
+            return total
+        for _, size, path in sorted(entries):
+            if total <= self.disk_bytes * DISK_LOW_WATER:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                total -= size  # Already evicted elsewhere
+                continue
+            except OSError:
+                continue
+            total -= size
+            with self._lock:
+                self._counters["disk_evictions"] += 1
+        return total
+
+    def get(self, key):
+        """
+        Looks up a result without computing it.
+
+        Returns:
+            tuple or None: (green_ratio, preview Image) on a hit.
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return self._memory[key]
+
+        # PNG decode happens outside the lock so other sessions are not blocked
+        hit = self._read_disk(key) if self.cache_dir else None
+
+        with self._lock:
+            if hit is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["disk_hits"] += 1
+            self._remember(key, *hit)
+            return hit
+
+    def put(self, key, ratio, img):
+        """Stores a result in both tiers."""
+        with self._lock:
+            self._remember(key, ratio, img)
+        if self.cache_dir:
+            self._write_disk(key, ratio, img)
+
+    def get_or_compute(self, data, params, compute):
+        """
+        Returns the cached result for (data, params), calling `compute()`
+        only on a miss.
+
+        Args:
+            data (bytes): Raw image bytes.
+            params (dict): Analysis parameters included in the key.
+            compute (callable): Returns (green_ratio, preview Image).
+
+        Returns:
+            tuple: (green_ratio, preview Image).
+        """
+        key = make_cache_key(data, params)
+        hit = self.get(key)
+        if hit is not None:
+            return hit
+
+        ratio, img = compute()
+        self.put(key, ratio, img)
+        return ratio, img
+
+    def stats(self):
+        """
+        Hit/miss/eviction counters plus current tier sizes, for sizing the
+        cache.
+
+        Returns:
+            dict: Counter name -> value.
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_items"] = len(self._memory)
+            stats["memory_bytes"] = self._memory_used
+            stats["disk_bytes"] = self._disk_used
+            lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+            stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+            return stats
@@ -0,0 +1,183 @@
+import numpy as np
+import pandas as pd
+
+from utils.stats import histogram_quantiles
+
+# Mock CNV model: trait = base + (copy number * effect size) + noise
+COPY_NUMBER_MIN = 1
+COPY_NUMBER_MAX = 7
+TOLERANCE_MODEL = {"base": 100.0, "effect": 150.0, "noise_sd": 50.0}
+ACCUMULATION_MODEL = {"base": 500.0, "effect": 800.0, "noise_sd": 200.0}
+
+DEFAULT_CHUNK_SIZE = 1_000_000
+
+def simulate_population_chunks(population_size, chunk_size=DEFAULT_CHUNK_SIZE, seed=42):
+    """
+    Simulates a CNV population in fixed-size chunks so that millions of
+    individuals never have to be held in memory at once.
+
+    Args:
+        population_size (int): Number of individuals.
+        chunk_size (int): Individuals per chunk.
+        seed (int): Random seed (the same seed and chunk size give the same population).
+
+    Yields:
+        tuple: (copy_numbers, tolerance, accumulation) arrays for one chunk.
+    """
+    rng = np.random.default_rng(seed)
+
+    for start in range(0, population_size, chunk_size):
+        size = min(chunk_size, population_size - start)
+
+        # Simulate Copy Numbers (e.g., 1 to 7 copies)
+        copy_numbers = rng.integers(COPY_NUMBER_MIN, COPY_NUMBER_MAX + 1, size=size, dtype=np.int8)
+
+        # Simulate Tolerance (correlated to copy number + random environmental noise)
+        tolerance = (TOLERANCE_MODEL["base"] + copy_numbers * TOLERANCE_MODEL["effect"]
+                     + rng.normal(0, TOLERANCE_MODEL["noise_sd"], size=size))
+
+        # Simulate accumulation (also correlated)
+        accumulation = (ACCUMULATION_MODEL["base"] + copy_numbers * ACCUMULATION_MODEL["effect"]
+                        + rng.normal(0, ACCUMULATION_MODEL["noise_sd"], size=size))
+
+        yield copy_numbers, tolerance, accumulation
+
+class RunningOLS:
+    """
+    Simple linear regression y ~ x from streamed chunks.
+
+    Keeps only the sufficient statistics (count, means and centred sums of
+    squares / cross-products), merged chunk by chunk with the pairwise
+    update so precision holds for very large n.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.sxx = 0.0
+        self.syy = 0.0
+        self.sxy = 0.0
+
+    def update(self, x, y):
+        """Adds one chunk of observations."""
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        n_b = x.size
+        if n_b == 0:
+            return
+
+        mean_xb, mean_yb = x.mean(), y.mean()
+        dx, dy = x - mean_xb, y - mean_yb
+        sxx_b, syy_b, sxy_b = dx @ dx, dy @ dy, dx @ dy
+
+        n = self.n + n_b
+        delta_x, delta_y = mean_xb - self.mean_x, mean_yb - self.mean_y
+        weight = self.n * n_b / n
+
+        self.sxx += sxx_b + delta_x * delta_x * weight
+        self.syy += syy_b + delta_y * delta_y * weight
+        self.sxy += sxy_b + delta_x * delta_y * weight
+        self.mean_x += delta_x * n_b / n
+        self.mean_y += delta_y * n_b / n
+        self.n = n
+
+    def result(self):
+        """
+        Returns:
+            dict: 'slope', 'intercept', 'r_squared' and 'n'.
+        """
+        if self.n < 2 or self.sxx == 0:
+            return {"slope": np.nan, "intercept": np.nan, "r_squared": np.nan, "n": self.n}
+
+        slope = self.sxy / self.sxx
+        r_squared = (self.sxy ** 2) / (self.sxx * self.syy) if self.syy else np.nan
+        return {"slope": slope, "intercept": self.mean_y - slope * self.mean_x,
+                "r_squared": r_squared, "n": self.n}
+
+def _trait_edges(model, bins):
+    # Fixed range covering +/- 6 SD around every group mean; values beyond
+    # it are clipped into the outer bins
+    lo = model["base"] + model["effect"] * COPY_NUMBER_MIN - 6 * model["noise_sd"]
+    hi = model["base"] + model["effect"] * COPY_NUMBER_MAX + 6 * model["noise_sd"]
+    return np.linspace(lo, hi, bins + 1)
+
+def _binned_counts(group_idx, values, edges, n_groups):
+    bins = len(edges) - 1
+    bin_idx = np.clip(np.searchsorted(edges, values, side="right") - 1, 0, bins - 1)
+    counts = np.bincount(group_idx * bins + bin_idx, minlength=n_groups * bins)
+    return counts.reshape(n_groups, bins)
+
+def summarize_population(population_size, chunk_size=DEFAULT_CHUNK_SIZE, seed=42,
+                         tolerance_bins=60, accumulation_bins=600):
+    """
+    Streams a simulated population through the regression and aggregation
+    steps, returning only chart-sized summaries.
+
+    Args:
+        population_size (int): Number of individuals.
+        chunk_size (int): Individuals simulated per chunk.
+        seed (int): Random seed.
+        tolerance_bins (int): Tolerance bins for the scatter density.
+        accumulation_bins (int): Accumulation bins used for the box-plot quantiles.
+
+    Returns:
+        dict:
+            'density' (pd.DataFrame): copy number x tolerance bin counts (non-empty bins only).
+            'box' (pd.DataFrame): per-copy-number quantiles and whisker fences of accumulation.
+            'tolerance_fit' / 'accumulation_fit' (dict): RunningOLS results vs copy number.
+    """
+    n_groups = COPY_NUMBER_MAX - COPY_NUMBER_MIN + 1
+    tol_edges = _trait_edges(TOLERANCE_MODEL, tolerance_bins)
+    acc_edges = _trait_edges(ACCUMULATION_MODEL, accumulation_bins)
+
+    tol_counts = np.zeros((n_groups, tolerance_bins), dtype=np.int64)
+    acc_counts = np.zeros((n_groups, accumulation_bins), dtype=np.int64)
+    acc_min = np.full(n_groups, np.inf)
+    acc_max = np.full(n_groups, -np.inf)
+    tol_fit, acc_fit = RunningOLS(), RunningOLS()
+
+    for copy_numbers, tolerance, accumulation in simulate_population_chunks(population_size, chunk_size, seed):
+        group_idx = copy_numbers.astype(np.intp) - COPY_NUMBER_MIN
+
+        tol_fit.update(copy_numbers, tolerance)
+        acc_fit.update(copy_numbers, accumulation)
+        tol_counts += _binned_counts(group_idx, tolerance, tol_edges, n_groups)
+        acc_counts += _binned_counts(group_idx, accumulation, acc_edges, n_groups)
+        np.minimum.at(acc_min, group_idx, accumulation)
+        np.maximum.at(acc_max, group_idx, accumulation)
+
+    copy_axis = np.arange(COPY_NUMBER_MIN, COPY_NUMBER_MAX + 1)
+    tol_centers = (tol_edges[:-1] + tol_edges[1:]) / 2
+    groups, bins = np.nonzero(tol_counts)
+    density = pd.DataFrame({
+        "Gene Copy Number": copy_axis[groups],
+        "Zinc Tolerance Index": tol_centers[bins],
+        "Plants": tol_counts[groups, bins],
+    })
+
+    rows = []
+    for g in range(n_groups):
+        n = int(acc_counts[g].sum())
+        if n == 0:
+            continue
+        q1, median, q3 = histogram_quantiles(acc_counts[g], acc_edges, [0.25, 0.5, 0.75])
+        # Clamp to observed extremes (bin interpolation can step past them)
+        q1, median, q3 = np.clip([q1, median, q3], acc_min[g], acc_max[g])
+        iqr = q3 - q1
+        rows.append({
+            "Gene Copy Number": int(copy_axis[g]),
+            "Plants": n,
+            "q1": q1,
+            "median": median,
+            "q3": q3,
+            "lowerfence": max(acc_min[g], q1 - 1.5 * iqr),
+            "upperfence": min(acc_max[g], q3 + 1.5 * iqr),
+        })
+
+    return {
+        "density": density,
+        "box": pd.DataFrame(rows),
+        "tolerance_fit": tol_fit.result(),
+        "accumulation_fit": acc_fit.result(),
+    }
@@ -0,0 +1,124 @@
+import argparse
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+UNSELECTED = "Select..."
+
+LOCATIONS = ["Old Leaves (Bottom)", "New Leaves (Top)", "Whole Plant"]
+
+PATTERNS = [
+    "Yellowing between veins (Interveinal Chlorosis)",
+    "Complete yellowing",
+    "Purple/Reddish spots",
+    "Brown/Necrotic edges",
+]
+
+class Diagnosis(NamedTuple):
+    name: str  # Short label used in batch output
+    level: str  # Streamlit message type: "warning", "error" or "info"
+    message: str
+    detail: str = ""
+    recommendation: str = ""
+
+DIAGNOSES = {
+    "incomplete": Diagnosis("Incomplete observation", "error", "Please select both location and pattern."),
+    "iron": Diagnosis("Iron (Fe) Deficiency", "warning", "⚠️ **Diagnosis: Iron (Fe) Deficiency**",
+                      detail="Iron is immobile in plants, so young leaves suffer first."),
+    "sulfur": Diagnosis("Sulfur (S) Deficiency", "warning", "⚠️ **Diagnosis: Sulfur (S) Deficiency**"),
+    "zinc": Diagnosis("Zinc (Zn) Deficiency", "warning", "⚠️ **Diagnosis: Zinc (Zn) Deficiency**",
+                      detail="**High Probability.** Zinc deficiency often causes 'rosetting' (stunted leaves) and chlorosis in new growth.",
+                      recommendation="This aligns with Prof. Aarts' research on *ZIP* transporters. Apply Zinc Sulfate foliar spray."),
+    "magnesium": Diagnosis("Magnesium (Mg) Deficiency", "warning", "⚠️ **Diagnosis: Magnesium (Mg) Deficiency**"),
+    "nitrogen": Diagnosis("Nitrogen (N) Deficiency", "warning", "⚠️ **Diagnosis: Nitrogen (N) Deficiency**"),
+    "uncertain": Diagnosis("Low confidence", "error", "Unable to determine with high confidence."),
+    "inconclusive": Diagnosis("Inconclusive", "info", "Analysis inconclusive. Please consult a lab test."),
+}
+
+# Decision Logic based on Biology: location -> pattern -> diagnosis,
+# "*" covering every other pattern at that location
+DECISION_RULES = {
+    # Immobile nutrients (Fe, S, Zn) show up in new growth first
+    "New Leaves (Top)": {
+        "Yellowing between veins (Interveinal Chlorosis)": "iron",
+        "Complete yellowing": "sulfur",
+        "*": "zinc",
+    },
+    # Mobile nutrients (Mg, N) are remobilised out of old leaves
+    "Old Leaves (Bottom)": {
+        "Yellowing between veins (Interveinal Chlorosis)": "magnesium",
+        "Complete yellowing": "nitrogen",
+        "*": "uncertain",
+    },
+    "Whole Plant": {"*": "inconclusive"},
+}
+
+def _compile_table():
+    # Row/column 0 stand for "not selected / unknown"; every other cell is
+    # the index of a diagnosis in the returned key list
+    keys = list(DIAGNOSES)
+    table = np.full((len(LOCATIONS) + 1, len(PATTERNS) + 1), keys.index("incomplete"), dtype=np.int8)
+    for i, location in enumerate(LOCATIONS, start=1):
+        rules = DECISION_RULES[location]
+        for j, pattern in enumerate(PATTERNS, start=1):
+            table[i, j] = keys.index(rules.get(pattern, rules["*"]))
+    return keys, table
+
+# Built once at import; shared by the interactive page and the batch API
+_DIAGNOSIS_KEYS, _DECISION_TABLE = _compile_table()
+_DIAGNOSIS_LIST = [DIAGNOSES[key] for key in _DIAGNOSIS_KEYS]
+_DIAGNOSIS_NAMES = [d.name for d in _DIAGNOSIS_LIST]
+_RECOMMENDATIONS = list(dict.fromkeys(d.recommendation for d in _DIAGNOSIS_LIST))
+_RECOMMENDATION_CODES = np.array([_RECOMMENDATIONS.index(d.recommendation) for d in _DIAGNOSIS_LIST])
+
+def diagnose(location, pattern):
+    """
+    Looks up the diagnosis for one observation.
+
+    Args:
+        location (str): One of LOCATIONS (anything else counts as unselected).
+        pattern (str): One of PATTERNS (anything else counts as unselected).
+
+    Returns:
+        Diagnosis: The matching record.
+    """
+    i = LOCATIONS.index(location) + 1 if location in LOCATIONS else 0
+    j = PATTERNS.index(pattern) + 1 if pattern in PATTERNS else 0
+    return _DIAGNOSIS_LIST[_DECISION_TABLE[i, j]]
+
+def diagnose_batch(locations, patterns):
+    """
+    Diagnoses whole columns of observations with one table lookup.
+
+    Args:
+        locations (array-like): Symptom locations (strings).
+        patterns (array-like): Symptom patterns (strings), same length.
+
+    Returns:
+        pd.DataFrame: Categorical 'diagnosis' and 'recommendation' columns,
+        one row per observation.
+    """
+    # Unknown strings get code -1, which lands on the "unselected" row/column
+    loc_idx = pd.Categorical(locations, categories=LOCATIONS).codes.astype(np.intp) + 1
+    pat_idx = pd.Categorical(patterns, categories=PATTERNS).codes.astype(np.intp) + 1
+    codes = _DECISION_TABLE[loc_idx, pat_idx]
+
+    return pd.DataFrame({
+        "diagnosis": pd.Categorical.from_codes(codes, _DIAGNOSIS_NAMES),
+        "recommendation": pd.Categorical.from_codes(_RECOMMENDATION_CODES[codes], _RECOMMENDATIONS),
+    })
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch Deficiency Detective for scouting reports.")
+    parser.add_argument("observations", help="CSV with 'location' and 'pattern' columns")
+    parser.add_argument("-o", "--output", default="diagnoses.csv", help="Output CSV")
+    args = parser.parse_args(argv)
+
+    observations = pd.read_csv(args.observations)
+    result = diagnose_batch(observations["location"], observations["pattern"])
+    pd.concat([observations, result], axis=1).to_csv(args.output, index=False)
+    print(result["diagnosis"].value_counts().to_string())
+
+if __name__ == "__main__":
+    main()
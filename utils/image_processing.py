@@ -1,5 +1,68 @@
+import os
+import warnings
+import zlib
+from contextlib import contextmanager
+
 import numpy as np
-from PIL import Image
+import PIL
+from PIL import BmpImagePlugin, Image, PpmImagePlugin, TiffImagePlugin
+
+# Simple "Dummy" Regression Model based on Prof. Aarts' lab concept
+# Biomass = GreenRatio * Factor
+BIOMASS_FACTOR = 3.5  # Arbitrary factor for demo
+GROWTH_FACTOR = 4.2  # Projected growth to Day 40
+
+# Rows per window for the tiled (memory-bounded) path
+DEFAULT_TILE_ROWS = 1024
+
+# Largest image the tiled path will open (about 45k x 45k pixels)
+MAX_LARGE_IMAGE_PIXELS = 2_000_000_000
+
+# Pixels analysed by the adaptive (downsampled) path, and the longest side
+# of the previews sent to the browser
+DEFAULT_PIXEL_BUDGET = 2_000_000
+PREVIEW_MAX_SIDE = 640
+
+# Uncompressed pixel layouts we can map straight from disk
+_RAW_CHANNEL_ORDER = {"RGB": slice(None), "BGR": slice(None, None, -1)}
+
+# TIFF compressions whose strips / tiles are decoded one at a time
+# (Pillow hands every other compressed TIFF to libtiff as a single tile)
+_TIFF_BLOCK_DECODERS = {1: bytes, 8: zlib.decompress, 32946: zlib.decompress}
+
+def count_green_pixels(img_array):
+    """
+    Counts green pixels in an RGB array without building a display image.
+    Uses the same Green > Red AND Green > Blue rule as calculate_green_index.
+    
+    Args:
+        img_array (np.ndarray): uint8 array of shape (H, W, 3).
+        
+    Returns:
+        tuple: (green_pixels, total_pixels) as ints.
+    """
+    r = img_array[:, :, 0]
+    g = img_array[:, :, 1]
+    b = img_array[:, :, 2]
+    
+    green_mask = (g > r) & (g > b)
+    total_pixels = img_array.shape[0] * img_array.shape[1]
+    
+    return int(np.count_nonzero(green_mask)), int(total_pixels)
+
+def estimate_biomass(green_ratio):
+    """
+    Converts a green pixel ratio into biomass figures.
+    
+    Args:
+        green_ratio (float): Percentage of green pixels (0-100).
+        
+    Returns:
+        tuple: (estimated_biomass_g, projected_yield_g).
+    """
+    estimated_biomass_g = green_ratio * BIOMASS_FACTOR
+    projected_yield_g = estimated_biomass_g * GROWTH_FACTOR
+    return estimated_biomass_g, projected_yield_g
 
 def calculate_green_index(image_file):
     """
@@ -46,3 +109,317 @@ def calculate_green_index(image_file):
     processed_img = Image.fromarray(img_array)
     
     return green_ratio, processed_img
+
+# Formats the tiled path can stream (see iter_rgb_tiles); only these may go
+# past Pillow's decompression-bomb cap, everything else is decoded in full
+_STREAMABLE_PLUGINS = (TiffImagePlugin.TiffImageFile, BmpImagePlugin.BmpImageFile, PpmImagePlugin.PpmImageFile)
+
+def _open_streamable(image_source):
+    """
+    Opens a TIFF/BMP/PPM that Image.open refused as a decompression bomb,
+    by constructing the plugin's image class directly (it parses the header
+    without the size check). On Pillow versions older than this was written
+    against it defers to Image.open, which raises the original error.
+    """
+    if int(PIL.__version__.split(".")[0]) < 10:
+        return Image.open(image_source)
+
+    for plugin in _STREAMABLE_PLUGINS:
+        if not isinstance(image_source, (str, os.PathLike)):
+            image_source.seek(0)
+        try:
+            return plugin(image_source)
+        except SyntaxError:
+            continue  # Not this format
+    return Image.open(image_source)
+
+@contextmanager
+def _open_large(image_source, max_pixels=MAX_LARGE_IMAGE_PIXELS):
+    """
+    Opens an image lazily. Orthomosaics are legitimately far beyond Pillow's
+    decompression-bomb cap, so the size is checked against `max_pixels`
+    here instead; the process-wide Image.MAX_IMAGE_PIXELS is left alone.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+        try:
+            img = Image.open(image_source)
+        except Image.DecompressionBombError:
+            img = _open_streamable(image_source)
+
+    with img:
+        width, height = img.size
+        if max_pixels is not None and width * height > max_pixels:
+            raise ValueError(f"image is {width}x{height} pixels, above the limit of {max_pixels}")
+        yield img
+
+def _raw_strips(img, path):
+    """
+    Maps the pixel data of an uncompressed image (BMP, PPM, plain TIFF)
+    directly from disk. Returns a list of (H, W, 3) uint8 views, one per
+    stored strip, or None when the layout cannot be mapped.
+    """
+    width = img.size[0]
+    strips = []
+    for tile in img.tile:
+        codec, extents, offset, args = tile[0], tile[1], tile[2], tile[3]
+        rawmode, stride, orientation = (args, 0, 1) if isinstance(args, str) else (tuple(args) + (0, 1))[:3]
+
+        if codec != "raw" or rawmode not in _RAW_CHANNEL_ORDER:
+            return None
+        x0, y0, x1, y1 = extents
+        if x0 != 0 or x1 != width:
+            return None
+
+        rows = y1 - y0
+        stride = stride or width * 3
+        data = np.memmap(path, dtype=np.uint8, mode="r", offset=offset, shape=(rows, stride))
+        strip = data[:, :width * 3].reshape(rows, width, 3)[:, :, _RAW_CHANNEL_ORDER[rawmode]]
+        strips.append(strip[::-1] if orientation < 0 else strip)
+
+    return strips
+
+def _tiff_bands(img):
+    """
+    Reads an 8-bit RGB(A) TIFF, stripped or tiled, uncompressed or Deflate,
+    one strip or one row of tiles at a time. Returns a generator of
+    (rows, W, 3) uint8 arrays, or None when the layout is not supported.
+    """
+    tags = img.tag_v2
+    samples = tags.get(277, 1)
+    decode = _TIFF_BLOCK_DECODERS.get(tags.get(259, 1))
+    if (decode is None or tags.get(262) != 2 or tags.get(284, 1) != 1 or samples < 3
+            or set(tags.get(258, (8,))) != {8} or tags.get(317, 1) not in (1, 2)):
+        return None
+
+    width, height = img.size
+    if 324 in tags:
+        block_width, block_rows = tags[322], tags[323]
+        offsets, counts = tags[324], tags[325]
+    elif 273 in tags:
+        block_width, block_rows = width, tags.get(278, height)
+        offsets, counts = tags[273], tags[279]
+    else:
+        return None
+    per_row = -(-width // block_width)
+    differenced = tags.get(317, 1) == 2
+
+    def read_block(index, rows):
+        img.fp.seek(offsets[index])
+        data = np.frombuffer(decode(img.fp.read(counts[index])), dtype=np.uint8)
+        block = data[:rows * block_width * samples].reshape(rows, block_width, samples)
+        # Predictor 2 stores each pixel as the difference to its left neighbour
+        return np.cumsum(block, axis=1, dtype=np.uint8) if differenced else block
+
+    def bands():
+        for y in range(0, height, block_rows):
+            first = y // block_rows * per_row
+            if per_row == 1:
+                yield read_block(first, min(block_rows, height - y))[:, :width, :3]
+                continue
+            band = np.empty((block_rows, width, 3), dtype=np.uint8)
+            for column in range(per_row):
+                x = column * block_width
+                band[:, x:x + block_width] = read_block(first + column, block_rows)[:, :width - x, :3]
+            yield band[:height - y]
+
+    return bands()
+
+def _windows(bands, width, tile_rows):
+    """Regroups row bands of any height into windows of `tile_rows` rows."""
+    window = np.empty((tile_rows, width, 3), dtype=np.uint8)
+    filled = 0
+    for band in bands:
+        start = 0
+        while start < len(band):
+            count = min(tile_rows - filled, len(band) - start)
+            window[filled:filled + count] = band[start:start + count]
+            filled += count
+            start += count
+            if filled == tile_rows:
+                yield window
+                window = np.empty((tile_rows, width, 3), dtype=np.uint8)
+                filled = 0
+    if filled:
+        yield window[:filled]
+
+def iter_rgb_tiles(image_source, tile_rows=DEFAULT_TILE_ROWS):
+    """
+    Yields the image as horizontal RGB windows of at most `tile_rows` rows,
+    so callers never hold more than one window of pixels at a time.
+
+    - `.npy` arrays and uncompressed BMP/PPM/TIFF files are memory-mapped,
+      so only the window being processed is paged in.
+    - Stripped or tiled TIFFs that are uncompressed or Deflate-compressed
+      are decoded one strip / row of tiles at a time.
+    - Everything else (JPEG, PNG, LZW or JPEG-compressed TIFF, ...) cannot
+      be decoded partially and is decoded in full first, so memory grows
+      with the image; each window is then cropped and converted on its own.
+      Use calculate_green_index_adaptive to bound memory for those.
+
+    Args:
+        image_source: File path or file object.
+        tile_rows (int): Rows per window.
+
+    Yields:
+        np.ndarray: uint8 array of shape (rows, W, 3).
+    """
+    path = os.fspath(image_source) if isinstance(image_source, (str, os.PathLike)) else None
+
+    if path is not None and path.lower().endswith(".npy"):
+        arr = np.load(path, mmap_mode="r")
+        for y in range(0, arr.shape[0], tile_rows):
+            yield np.asarray(arr[y:y + tile_rows, :, :3])
+        return
+
+    with _open_large(image_source) as img:
+        strips = _raw_strips(img, path) if path is not None and img.mode == "RGB" else None
+
+        if strips is not None:
+            for strip in strips:
+                for y in range(0, strip.shape[0], tile_rows):
+                    yield np.asarray(strip[y:y + tile_rows])
+            return
+
+        width, height = img.size
+        bands = _tiff_bands(img) if img.format == "TIFF" else None
+        if bands is not None:
+            yield from _windows(bands, width, tile_rows)
+            return
+
+        for y in range(0, height, tile_rows):
+            window = img.crop((0, y, width, min(y + tile_rows, height)))
+            yield np.asarray(window.convert("RGB"))
+
+def calculate_green_index_tiled(image_source, tile_rows=DEFAULT_TILE_ROWS):
+    """
+    Memory-bounded variant of calculate_green_index for very large images
+    (e.g. drone orthomosaics). Green and total pixel counts are summed per
+    window, so the result is identical to the in-memory version.
+
+    Args:
+        image_source: File path or file object (see iter_rgb_tiles).
+        tile_rows (int): Rows per window.
+
+    Returns:
+        float: Percentage of green pixels (0-100).
+    """
+    green_pixels, total_pixels = 0, 0
+    for tile in iter_rgb_tiles(image_source, tile_rows):
+        tile_green, tile_total = count_green_pixels(tile)
+        green_pixels += tile_green
+        total_pixels += tile_total
+
+    if total_pixels == 0:
+        return 0.0
+
+    return (green_pixels / total_pixels) * 100
+
+def green_mask_preview(img, max_side=PREVIEW_MAX_SIDE):
+    """
+    Builds a small display version of the green mask (non-green pixels
+    turned grayscale, as in calculate_green_index).
+
+    Args:
+        img (Image): RGB image, any size.
+        max_side (int): Longest side of the preview in pixels.
+
+    Returns:
+        Image: RGB preview of at most max_side x max_side pixels.
+    """
+    preview = img.copy()
+    preview.thumbnail((max_side, max_side), Image.Resampling.BOX)
+
+    img_array = np.array(preview)
+    r = img_array[:, :, 0]
+    g = img_array[:, :, 1]
+    b = img_array[:, :, 2]
+    green_mask = (g > r) & (g > b)
+
+    gray_array = np.array(preview.convert("L"))
+    img_array[~green_mask] = gray_array[~green_mask, None]
+    return Image.fromarray(img_array)
+
+def load_thumbnail(image_file, max_side=PREVIEW_MAX_SIDE):
+    """
+    Decodes an image straight to preview size. JPEGs are decoded at a
+    reduced DCT scale, so a 24 MP photo never materialises in full.
+
+    Args:
+        image_file: File path or file object.
+        max_side (int): Longest side of the thumbnail in pixels.
+
+    Returns:
+        Image: RGB thumbnail.
+    """
+    with Image.open(image_file) as img:
+        img.thumbnail((max_side, max_side), Image.Resampling.BOX)
+        return img.convert("RGB")
+
+def decode_within_budget(image_file, max_pixels=DEFAULT_PIXEL_BUDGET):
+    """
+    Decodes an image to at most `max_pixels` pixels for analysis (see
+    calculate_green_index_adaptive for how).
+
+    Returns:
+        Image: RGB image within the budget.
+        dict: 'source_size', 'analysed_size' and 'draft_scale'.
+    """
+    with Image.open(image_file) as img:
+        source_size = img.size
+        width, height = source_size
+
+        # Draft picks the smallest DCT scale that still covers the request
+        scale = min(1.0, (max_pixels / (width * height)) ** 0.5) if width and height else 1.0
+        target = (max(1, int(width * scale)), max(1, int(height * scale)))
+        img.draft("RGB", target)
+        draft_scale = img.size[0] / width if width else 1.0
+
+        small = img.convert("RGB")
+
+    if small.width * small.height > max_pixels:
+        small = small.resize(target, Image.Resampling.NEAREST)
+
+    return small, {"source_size": source_size, "analysed_size": small.size, "draft_scale": draft_scale}
+
+def calculate_green_index_adaptive(image_file, max_pixels=DEFAULT_PIXEL_BUDGET, compare_full=False):
+    """
+    Fast variant of calculate_green_index: the image is analysed at no more
+    than `max_pixels` pixels instead of at full resolution. Canopy cover is
+    an area ratio, so it changes very little with resolution.
+
+    - JPEGs use draft (scaled DCT) decoding at 1/2, 1/4 or 1/8 size, which
+      skips most of the decode work. The scaled DCT averages pixel blocks,
+      so mixed green / soil blocks can change class and the ratio of a
+      draft-decoded JPEG is an approximation (use compare_full to measure
+      the difference).
+    - Whatever is still above the budget is subsampled (nearest pixel).
+      Unlike averaging, this keeps each pixel's own green / not-green
+      class, so for non-JPEG formats the ratio is an unbiased sample of
+      the full image.
+
+    Args:
+        image_file: File path or file object.
+        max_pixels (int): Pixel budget for the analysis.
+        compare_full (bool): Also run the full-resolution (tiled) analysis
+            and report the difference, to check the accuracy loss.
+
+    Returns:
+        float: Percentage of green pixels (0-100).
+        Image: Green mask preview (see green_mask_preview).
+        dict: 'source_size', 'analysed_size', 'draft_scale' and, with
+        compare_full, 'full_ratio' and 'ratio_delta' (percentage points).
+    """
+    small, info = decode_within_budget(image_file, max_pixels)
+
+    green_pixels, total_pixels = count_green_pixels(np.asarray(small))
+    green_ratio = (green_pixels / total_pixels) * 100 if total_pixels else 0.0
+
+    if compare_full:
+        if hasattr(image_file, "seek"):
+            image_file.seek(0)
+        full_ratio = calculate_green_index_tiled(image_file)
+        info["full_ratio"] = full_ratio
+        info["ratio_delta"] = green_ratio - full_ratio
+
+    return green_ratio, green_mask_preview(small), info
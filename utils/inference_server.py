@@ -0,0 +1,360 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+from PIL import Image
+
+from utils.image_processing import count_green_pixels, estimate_biomass
+
+MAX_BODY_BYTES = 64 * 1024**2
+LATENCY_WINDOW = 10_000  # Most recent requests kept for percentiles
+
+def analyze_image_bytes(data):
+    """
+    Green index for one encoded image (JPEG/PNG/...).
+
+    Args:
+        data (bytes): Encoded image.
+
+    Returns:
+        dict: 'green_ratio', 'estimated_biomass_g', 'projected_yield_g',
+        'width', 'height' -- or 'error' if the image cannot be decoded.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img_array = np.asarray(img.convert("RGB"))
+    except Exception as exc:  # Corrupt / unsupported uploads
+        return {"error": f"{type(exc).__name__}: {exc}"}
+
+    green_pixels, total_pixels = count_green_pixels(img_array)
+    green_ratio = (green_pixels / total_pixels) * 100 if total_pixels else 0.0
+    estimated_biomass_g, projected_yield_g = estimate_biomass(green_ratio)
+
+    return {
+        "green_ratio": green_ratio,
+        "estimated_biomass_g": estimated_biomass_g,
+        "projected_yield_g": projected_yield_g,
+        "width": img_array.shape[1],
+        "height": img_array.shape[0],
+    }
+
+def analyze_image_batch(payloads):
+    """Runs analyze_image_bytes over a micro-batch inside one worker call."""
+    return [analyze_image_bytes(data) for data in payloads]
+
+class WorkerError(Exception):
+    """
+    A batch failed on the server side (worker crash or executor error), as
+    opposed to an image that could not be decoded.
+
+    Attributes:
+        status (int): 503 when the request can be retried on the rebuilt
+            pool, 500 otherwise.
+    """
+
+    def __init__(self, message, status=500):
+        super().__init__(message)
+        self.status = status
+
+def _body_length(method, headers):
+    """
+    Validates the Content-Length of a request.
+
+    Returns:
+        tuple: (length, None), or (None, (status, payload)) when the header
+        is not a non-negative integer (400), is missing on a POST (411) or
+        exceeds MAX_BODY_BYTES (413).
+    """
+    value = headers.get("content-length")
+    if value is None:
+        if method == "POST":
+            return None, (411, {"error": "Content-Length required"})
+        return 0, None
+    if not (value.isascii() and value.isdigit()):
+        return None, (400, {"error": f"Invalid Content-Length: {value!r}"})
+    length = int(value)
+    if length > MAX_BODY_BYTES:
+        return None, (413, {"error": "Image too large"})
+    return length, None
+
+class InferenceServer:
+    """
+    Minimal asyncio HTTP/1.1 service around the green-index computation.
+
+    Requests are queued, grouped into micro-batches (up to `max_batch`
+    images or `max_wait_ms` of waiting, whichever comes first) and run on
+    a process pool, with at most one batch per worker in flight. When the
+    queue already holds `max_queue` images new requests are rejected with
+    503 + Retry-After instead of piling up.
+
+    Endpoints:
+        POST /analyze  body = encoded image -> JSON result
+        GET  /stats    latency percentiles, batch sizes and counters
+        GET  /health   liveness probe
+    """
+
+    def __init__(self, host="127.0.0.1", port=8765, workers=None, max_batch=16,
+                 max_wait_ms=5.0, max_queue=256):
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue = max_queue
+
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._batch_sizes = deque(maxlen=LATENCY_WINDOW)
+        self._counters = dict.fromkeys(["requests", "ok", "errors", "rejected", "pool_restarts"], 0)
+
+    async def serve_forever(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._slots = asyncio.Semaphore(self.workers)
+        self._pool = ProcessPoolExecutor(max_workers=self.workers)
+
+        batcher = asyncio.create_task(self._batch_loop())
+        server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        print(f"Serving green-index inference on http://{self.host}:{self.port} "
+              f"({self.workers} workers, batch <= {self.max_batch}, queue <= {self.max_queue})")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            self._pool.shutdown(cancel_futures=True)
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # One batch per worker in flight; the queue absorbs the rest
+            await self._slots.acquire()
+            asyncio.create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        self._batch_sizes.append(len(batch))
+        pool = self._pool
+        try:
+            results = await loop.run_in_executor(pool, analyze_image_batch, [data for data, _ in batch])
+        except BrokenProcessPool as exc:
+            # A worker died (e.g. a decoder crash) and the executor stays
+            # broken: replace it once, so only the batches in flight fail
+            if self._pool is pool:
+                pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                self._counters["pool_restarts"] += 1
+            self._fail_batch(batch, WorkerError(f"Worker crashed: {exc}", status=503))
+            return
+        except Exception as exc:  # Fail this batch only
+            self._fail_batch(batch, WorkerError(f"{type(exc).__name__}: {exc}"))
+            return
+        finally:
+            self._slots.release()
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _fail_batch(self, batch, error):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    async def _analyze(self, data):
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((data, future))
+        except asyncio.QueueFull:
+            return None
+        return await future
+
+    def stats(self):
+        """
+        Returns:
+            dict: Counters, queue depth, mean batch size and latency
+            percentiles (ms) over the last LATENCY_WINDOW requests.
+        """
+        stats = dict(self._counters)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["mean_batch_size"] = float(np.mean(self._batch_sizes)) if self._batch_sizes else 0.0
+        if self._latencies:
+            p50, p90, p99 = np.percentile(np.array(self._latencies) * 1000, [50, 90, 99])
+            stats.update({"latency_p50_ms": p50, "latency_p90_ms": p90, "latency_p99_ms": p99})
+        return stats
+
+    async def _handle_client(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                method, path, _ = (request_line.split(" ", 2) + ["", ""])[:3]
+                headers = {}
+                for line in header_lines:
+                    name, sep, value = line.partition(":")
+                    if sep:
+                        headers[name.strip().lower()] = value.strip()
+
+                length, error = _body_length(method, headers)
+                if error is not None:
+                    # The body cannot be framed, so the connection is not reused
+                    await self._respond(writer, *error, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                keep_alive = headers.get("connection", "").lower() != "close"
+                status, payload, extra = await self._route(method, path, body)
+                await self._respond(writer, status, payload, keep_alive, extra)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method, path, body):
+        if method == "GET" and path == "/health":
+            return 200, {"status": "ok"}, None
+        if method == "GET" and path == "/stats":
+            return 200, self.stats(), None
+        if method != "POST" or path != "/analyze":
+            return 404, {"error": "Not found"}, None
+
+        started = time.perf_counter()
+        self._counters["requests"] += 1
+        try:
+            result = await self._analyze(body)
+        except WorkerError as exc:
+            self._counters["errors"] += 1
+            return exc.status, {"error": str(exc)}, {"Retry-After": "1"} if exc.status == 503 else None
+
+        if result is None:
+            self._counters["rejected"] += 1
+            return 503, {"error": "Queue full, retry later"}, {"Retry-After": "1"}
+
+        self._latencies.append(time.perf_counter() - started)
+        if "error" in result:
+            self._counters["errors"] += 1
+            return 400, result, None
+
+        self._counters["ok"] += 1
+        return 200, result, None
+
+    async def _respond(self, writer, status, payload, keep_alive=True, extra_headers=None):
+        reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 411: "Length Required",
+                   413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+        body = json.dumps(payload).encode()
+        headers = {
+            "Content-Type": "application/json",
+            "Content-Length": str(len(body)),
+            "Connection": "keep-alive" if keep_alive else "close",
+            **(extra_headers or {}),
+        }
+        head = f"HTTP/1.1 {status} {reasons[status]}\r\n" + "".join(f"{k}: {v}\r\n" for k, v in headers.items())
+        writer.write(head.encode("latin-1") + b"\r\n" + body)
+        await writer.drain()
+
+async def _client_worker(host, port, data, n_requests, latencies, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+    request_head = (f"POST /analyze HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/octet-stream\r\n"
+                    f"Content-Length: {len(data)}\r\n\r\n").encode()
+    try:
+        for _ in range(n_requests):
+            started = time.perf_counter()
+            writer.write(request_head + data)
+            await writer.drain()
+
+            head = await reader.readuntil(b"\r\n\r\n")
+            status = int(head.split(b" ", 2)[1])
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            await reader.readexactly(length)
+
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+async def load_test(image_path, host="127.0.0.1", port=8765, concurrency=32, requests=1000):
+    """
+    Drives a running server with `concurrency` keep-alive connections.
+
+    Args:
+        image_path (str): Image posted on every request.
+        host (str): Server host.
+        port (int): Server port.
+        concurrency (int): Parallel connections.
+        requests (int): Total requests across all connections.
+
+    Returns:
+        dict: Throughput, client-side latency percentiles (ms) and status counts.
+    """
+    with open(image_path, "rb") as fh:
+        data = fh.read()
+
+    latencies, statuses = [], {}
+    per_client = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+
+    started = time.perf_counter()
+    await asyncio.gather(*(_client_worker(host, port, data, n, latencies, statuses) for n in per_client if n))
+    elapsed = time.perf_counter() - started
+
+    p50, p90, p99 = np.percentile(np.array(latencies) * 1000, [50, 90, 99])
+    return {"requests": len(latencies), "seconds": elapsed, "requests_per_s": len(latencies) / elapsed,
+            "latency_p50_ms": p50, "latency_p90_ms": p90, "latency_p99_ms": p99, "status_counts": statuses}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local green-index inference service.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="Run the HTTP service")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    serve.add_argument("--max-batch", type=int, default=16, help="Images per micro-batch")
+    serve.add_argument("--max-wait-ms", type=float, default=5.0, help="Max wait to fill a batch")
+    serve.add_argument("--max-queue", type=int, default=256, help="Queued images before returning 503")
+
+    bench = sub.add_parser("loadtest", help="Load test a running service")
+    bench.add_argument("image", help="Image to post")
+    bench.add_argument("--host", default="127.0.0.1")
+    bench.add_argument("--port", type=int, default=8765)
+    bench.add_argument("--concurrency", type=int, default=32)
+    bench.add_argument("--requests", type=int, default=1000)
+
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        server = InferenceServer(args.host, args.port, args.workers, args.max_batch, args.max_wait_ms, args.max_queue)
+        try:
+            asyncio.run(server.serve_forever())
+        except KeyboardInterrupt:
+            pass
+    else:
+        report = asyncio.run(load_test(args.image, args.host, args.port, args.concurrency, args.requests))
+        print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
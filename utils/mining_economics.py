@@ -0,0 +1,175 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Market Prices (Approximate, $/kg)
+METAL_PRICES = {
+    "Zinc (Zn)": 2.50,
+    "Nickel (Ni)": 18.00,  # Nickel is much more valuable!
+}
+
+ASH_FRACTION = 0.08  # Assuming ~5-10% ash content after burning
+HIGH_GRADE_ASH_PCT = 10  # Metal content (%) above which smelters pay a premium
+
+# Columns expected in an uploaded parcel table
+PARCEL_COLUMNS = ["parcel_id", "hectares", "biomass_t_per_ha", "metal", "concentration_mg_per_kg"]
+
+def calculate_mining_economics(hectares, biomass_per_ha, concentration, price, ash_fraction=ASH_FRACTION):
+    """
+    Phytomining yield and value for one field or many (all inputs may be
+    scalars or equally shaped NumPy arrays / pandas Series).
+
+    Args:
+        hectares: Land area (ha).
+        biomass_per_ha: Dry biomass yield (tons/ha).
+        concentration: Metal concentration in dried leaf tissue (mg/kg).
+        price: Metal market price ($/kg).
+        ash_fraction (float): Ash mass as a fraction of dry biomass.
+
+    Returns:
+        dict: 'total_biomass_kg', 'total_metal_kg', 'gross_value',
+        'ash_mass_kg' and 'metal_in_ash_pct'.
+    """
+    # 1. Total Biomass (kg) = Hectares * tons/ha * 1000
+    total_biomass_kg = hectares * biomass_per_ha * 1000
+
+    # 2. Total Metal (kg) = Biomass (kg) * (Concentration (mg/kg) / 1,000,000) -> mg to kg
+    total_metal_kg = total_biomass_kg * (concentration / 1000000)
+
+    # 3. Gross Value ($)
+    gross_value = total_metal_kg * price
+
+    # 4. Ash Amount (for bio-ore)
+    ash_mass_kg = total_biomass_kg * ash_fraction
+    with np.errstate(divide="ignore", invalid="ignore"):
+        metal_in_ash_pct = (total_metal_kg / ash_mass_kg) * 100  # Percentage
+
+    return {
+        "total_biomass_kg": total_biomass_kg,
+        "total_metal_kg": total_metal_kg,
+        "gross_value": gross_value,
+        "ash_mass_kg": ash_mass_kg,
+        "metal_in_ash_pct": metal_in_ash_pct,
+    }
+
+def _metal_aliases(prices):
+    # "Zinc (Zn)" is accepted as-is, as "zinc" or as "zn"
+    aliases = {}
+    for label in prices:
+        name, _, symbol = label.partition(" (")
+        for alias in (label, name, symbol.rstrip(")")):
+            if alias:
+                aliases[alias.strip().lower()] = label
+    return aliases
+
+def load_parcels(source, filename=None):
+    """
+    Reads a parcel table from CSV or Parquet.
+
+    Args:
+        source: Path or file object.
+        filename (str): Name used to detect the format when `source` is a
+            file object (e.g. a Streamlit upload).
+
+    Returns:
+        pd.DataFrame: The parcel table (validated to contain PARCEL_COLUMNS,
+        'parcel_id' is optional and generated when missing).
+    """
+    name = filename or (os.fspath(source) if isinstance(source, (str, os.PathLike)) else "")
+    if name.lower().endswith((".parquet", ".pq")):
+        parcels = pd.read_parquet(source)
+    else:
+        parcels = pd.read_csv(source)
+
+    if "parcel_id" not in parcels.columns:
+        parcels.insert(0, "parcel_id", np.arange(1, len(parcels) + 1))
+
+    missing = [c for c in PARCEL_COLUMNS if c not in parcels.columns]
+    if missing:
+        raise ValueError(f"Parcel table is missing columns: {', '.join(missing)}")
+
+    return parcels
+
+def value_portfolio(parcels, prices=METAL_PRICES, ash_fraction=ASH_FRACTION):
+    """
+    Values every parcel in one vectorized pass and aggregates the result.
+    Parcels without a metal, or with an unknown one, raise a ValueError.
+
+    Args:
+        parcels (pd.DataFrame): Table with PARCEL_COLUMNS (see load_parcels).
+        prices (dict): Metal label -> $/kg.
+        ash_fraction (float): Ash mass as a fraction of dry biomass.
+
+    Returns:
+        dict:
+            'parcels' (pd.DataFrame): Input plus all metrics, ranked by gross value.
+            'by_metal' (pd.DataFrame): Per-metal totals.
+            'totals' (dict): Portfolio-wide totals.
+    """
+    # Missing metals would get factorize code -1, which must never be used as an index
+    blank = parcels["metal"].isna() | (parcels["metal"].astype(str).str.strip() == "")
+    if blank.any():
+        bad_ids = parcels.loc[blank, "parcel_id"].astype(str).tolist()
+        shown = ", ".join(bad_ids[:10]) + (f" (+{len(bad_ids) - 10} more)" if len(bad_ids) > 10 else "")
+        raise ValueError(f"{len(bad_ids)} parcel(s) have no metal: parcel_id {shown}")
+
+    # Metal strings are resolved once per distinct value, then broadcast by code
+    metal_codes, metal_values = pd.factorize(parcels["metal"])
+    metal_values = [str(m).strip().lower() for m in metal_values]
+    aliases = _metal_aliases(prices)
+    unknown = [m for m in metal_values if m not in aliases]
+    if unknown:
+        raise ValueError(f"Unknown metal(s): {', '.join(unknown)}. Expected one of: {', '.join(prices)}")
+
+    labels = list(prices)
+    label_idx = np.array([labels.index(aliases[m]) for m in metal_values], dtype=np.intp)[metal_codes]
+    price = np.array([prices[label] for label in labels])[label_idx]
+
+    hectares = parcels["hectares"].to_numpy(dtype=float)
+    metrics = calculate_mining_economics(
+        hectares,
+        parcels["biomass_t_per_ha"].to_numpy(dtype=float),
+        parcels["concentration_mg_per_kg"].to_numpy(dtype=float),
+        price,
+        ash_fraction,
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        value_per_ha = metrics["gross_value"] / hectares
+
+    order = np.argsort(-metrics["gross_value"])
+    ranked = pd.DataFrame({
+        "rank": np.arange(1, len(order) + 1),
+        "parcel_id": parcels["parcel_id"].to_numpy()[order],
+        "metal": pd.Categorical.from_codes(label_idx[order], labels),
+        "hectares": hectares[order],
+        "price_per_kg": price[order],
+        **{key: values[order] for key, values in metrics.items()},
+        "value_per_ha": value_per_ha[order],
+    })
+
+    n_labels = len(labels)
+    metal_kg = np.bincount(label_idx, weights=metrics["total_metal_kg"], minlength=n_labels)
+    ash_kg = np.bincount(label_idx, weights=metrics["ash_mass_kg"], minlength=n_labels)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ash_grade = metal_kg / ash_kg * 100
+    by_metal = pd.DataFrame({
+        "metal": labels,
+        "parcels": np.bincount(label_idx, minlength=n_labels),
+        "hectares": np.bincount(label_idx, weights=hectares, minlength=n_labels),
+        "total_metal_kg": metal_kg,
+        "gross_value": np.bincount(label_idx, weights=metrics["gross_value"], minlength=n_labels),
+        "ash_mass_kg": ash_kg,
+        "metal_in_ash_pct": ash_grade,
+    })
+    by_metal = by_metal[by_metal["parcels"] > 0].reset_index(drop=True)
+
+    totals = {
+        "parcels": len(parcels),
+        "hectares": float(by_metal["hectares"].sum()),
+        "total_metal_kg": float(metal_kg.sum()),
+        "gross_value": float(metrics["gross_value"].sum()),
+        "high_grade_parcels": int(np.count_nonzero(metrics["metal_in_ash_pct"] > HIGH_GRADE_ASH_PCT)),
+    }
+
+    return {"parcels": ranked, "by_metal": by_metal, "totals": totals}
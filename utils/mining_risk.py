@@ -0,0 +1,251 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils.mining_economics import ASH_FRACTION, HIGH_GRADE_ASH_PCT, METAL_PRICES, calculate_mining_economics
+from utils.stats import histogram_quantiles
+
+# Annual price volatility (log returns) per metal; nickel swings harder than zinc
+PRICE_VOLATILITY = {
+    "Zinc (Zn)": 0.25,
+    "Nickel (Ni)": 0.35,
+}
+
+DEFAULT_YIELD_CV = 0.25  # Season-to-season spread of dry biomass yield
+DEFAULT_CONCENTRATION_CV = 0.30  # Spread of leaf metal concentration between harvests
+DEFAULT_COST_PER_HA = 500.0  # Cultivation, harvest and incineration ($/ha per year)
+
+DEFAULT_DRAWS = 1_000_000
+DEFAULT_CHUNK_SIZE = 250_000
+QUANTILES = (0.05, 0.5, 0.95)
+
+# Fixed histograms used for the streaming quantiles: revenue on a log scale
+# (it is a product of lognormal factors), grade on a linear one
+REVENUE_BINS = 8192
+GRADE_BINS = 4096
+DISPLAY_BINS = 80
+
+def _lognormal_params(mean, cv):
+    # mu, sigma of a lognormal with the given mean and coefficient of variation
+    sigma = np.sqrt(np.log1p(cv ** 2))
+    return np.log(mean) - sigma ** 2 / 2, sigma
+
+def _edges(model):
+    # Fixed bin edges covering +/- 10 SD of every factor; draws beyond are
+    # clipped into the outer bins and the quantiles clamped to the observed extremes
+    years = model["years"]
+    spread = np.sqrt(model["yield_sigma"] ** 2 + model["conc_sigma"] ** 2 + model["price_sigma"] ** 2 * years)
+    base = np.log(model["point_revenue"])
+    drift = abs(model["price_drift"]) * years
+    log_edges = np.linspace(base - drift - 10 * spread, base + np.log(years) + drift + 10 * spread, REVENUE_BINS + 1)
+
+    grade_high = model["point_grade"] * np.exp(10 * model["conc_sigma"])
+    return log_edges, np.linspace(0.0, grade_high, GRADE_BINS + 1)
+
+def _bin(values, edges):
+    bins = len(edges) - 1
+    idx = np.clip(np.searchsorted(edges, values, side="right") - 1, 0, bins - 1)
+    return np.bincount(idx, minlength=bins)
+
+def _simulate_chunk(seed_seq, size, model):
+    """
+    Simulates one chunk of draws and reduces it to histogram counts and
+    running sums; the per-draw arrays are dropped before returning.
+    """
+    rng = np.random.default_rng(seed_seq)
+    log_edges, grade_edges = _edges(model)
+
+    price = np.full(size, model["price"])
+    revenue = np.zeros(size)
+    grade_counts = np.zeros(GRADE_BINS, dtype=np.int64)
+    high_grade = 0
+    price_step = model["price_drift"] - model["price_sigma"] ** 2 / 2
+
+    # One harvest per year, sold at that year's price along the GBM path
+    for _ in range(model["years"]):
+        price *= np.exp(price_step + model["price_sigma"] * rng.standard_normal(size))
+        biomass = np.exp(model["yield_mu"] + model["yield_sigma"] * rng.standard_normal(size))
+        concentration = np.exp(model["conc_mu"] + model["conc_sigma"] * rng.standard_normal(size))
+
+        harvest = calculate_mining_economics(model["hectares"], biomass, concentration, price, model["ash_fraction"])
+        revenue += harvest["gross_value"]
+        grade = harvest["metal_in_ash_pct"]
+        grade_counts += _bin(grade, grade_edges)
+        high_grade += int(np.count_nonzero(grade > HIGH_GRADE_ASH_PCT))
+
+    return {
+        "draws": size,
+        "revenue_counts": _bin(np.log(revenue), log_edges),
+        "grade_counts": grade_counts,
+        "losses": int(np.count_nonzero(revenue < model["total_cost"])),
+        "high_grade": high_grade,
+        "revenue_sum": float(revenue.sum()),
+        "revenue_sq_sum": float(revenue @ revenue),
+        "revenue_min": float(revenue.min()),
+        "revenue_max": float(revenue.max()),
+    }
+
+def _merge(total, part):
+    if total is None:
+        return part
+    for key in ("draws", "revenue_counts", "grade_counts", "losses", "high_grade", "revenue_sum", "revenue_sq_sum"):
+        total[key] = total[key] + part[key]
+    total["revenue_min"] = min(total["revenue_min"], part["revenue_min"])
+    total["revenue_max"] = max(total["revenue_max"], part["revenue_max"])
+    return total
+
+def _display_histogram(counts, edges, bins=DISPLAY_BINS, tail=0.001):
+    # Regroups the fine histogram into `bins` bars between the `tail` quantiles
+    # (the extreme tails are left out of the chart)
+    lo, hi = histogram_quantiles(counts, edges, [tail, 1 - tail])
+    display_edges = np.linspace(lo, hi, bins + 1) if hi > lo else np.array([lo, lo + 1.0])
+    centers = (edges[:-1] + edges[1:]) / 2
+    inside = (centers >= display_edges[0]) & (centers < display_edges[-1])
+    idx = np.searchsorted(display_edges, centers[inside], side="right") - 1
+    regrouped = np.bincount(idx, weights=counts[inside], minlength=len(display_edges) - 1)
+    return display_edges, regrouped
+
+def simulate_risk(hectares, biomass_per_ha, concentration, price, years=1, price_volatility=0.3,
+                  price_drift=0.0, yield_cv=DEFAULT_YIELD_CV, concentration_cv=DEFAULT_CONCENTRATION_CV,
+                  cost_per_ha=DEFAULT_COST_PER_HA, ash_fraction=ASH_FRACTION, draws=DEFAULT_DRAWS,
+                  chunk_size=DEFAULT_CHUNK_SIZE, seed=42, workers=1):
+    """
+    Monte Carlo revenue and profit distribution of a phytomining field.
+
+    Every draw follows a geometric Brownian motion price path (one harvest
+    sold per year) with lognormal yield and concentration around the given
+    means, valued with calculate_mining_economics. Draws are simulated in
+    seeded chunks and reduced to fixed histograms, so memory does not grow
+    with `draws`; each chunk has its own spawned seed, so the result is the
+    same for any number of workers.
+
+    Args:
+        hectares (float): Land area (ha).
+        biomass_per_ha (float): Mean dry biomass yield (tons/ha per year).
+        concentration (float): Mean leaf metal concentration (mg/kg).
+        price (float): Current metal price ($/kg).
+        years (int): Harvests (one per year).
+        price_volatility (float): Annual volatility of the price log returns.
+        price_drift (float): Annual expected price growth (0.05 = +5 %/year).
+        yield_cv (float): Coefficient of variation of the yield.
+        concentration_cv (float): Coefficient of variation of the concentration.
+        cost_per_ha (float): Operating cost per hectare and year ($).
+        ash_fraction (float): Ash mass as a fraction of dry biomass.
+        draws (int): Number of simulated outcomes.
+        chunk_size (int): Draws per chunk.
+        seed (int): Random seed.
+        workers (int): Processes for the chunks (1 = in this process, None = all cores).
+
+    Returns:
+        dict:
+            'draws', 'mean_revenue', 'std_revenue', 'total_cost', 'point_revenue' (no uncertainty),
+            'revenue' / 'profit' (dict): 'P5', 'P50', 'P95' ($),
+            'prob_loss' (share of draws with revenue below cost),
+            'grade' (dict): 'P5', 'P50', 'P95' metal in ash (%) and 'prob_high_grade'
+                (share of harvests above HIGH_GRADE_ASH_PCT),
+            'revenue_hist' / 'grade_hist' (pd.DataFrame): chart-sized histograms.
+    """
+    years = int(years)
+    if min(hectares, biomass_per_ha, concentration, price) <= 0 or years < 1 or draws < 1:
+        raise ValueError("Area, yield, concentration, price, years and draws must be positive")
+
+    point = calculate_mining_economics(hectares, biomass_per_ha, concentration, price, ash_fraction)
+    yield_mu, yield_sigma = _lognormal_params(biomass_per_ha, yield_cv)
+    conc_mu, conc_sigma = _lognormal_params(concentration, concentration_cv)
+    model = {
+        "hectares": float(hectares),
+        "price": float(price),
+        "years": years,
+        "price_drift": float(price_drift),
+        "price_sigma": float(price_volatility),
+        "yield_mu": yield_mu, "yield_sigma": yield_sigma,
+        "conc_mu": conc_mu, "conc_sigma": conc_sigma,
+        "ash_fraction": ash_fraction,
+        "total_cost": cost_per_ha * hectares * years,
+        "point_revenue": point["gross_value"],
+        "point_grade": point["metal_in_ash_pct"],
+    }
+
+    sizes = [min(chunk_size, draws - start) for start in range(0, draws, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    totals = None
+    if len(sizes) == 1 or workers == 1:
+        for seed_seq, size in zip(seeds, sizes):
+            totals = _merge(totals, _simulate_chunk(seed_seq, size, model))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for part in pool.map(_simulate_chunk, seeds, sizes, [model] * len(sizes)):
+                totals = _merge(totals, part)
+
+    log_edges, grade_edges = _edges(model)
+    labels = [f"P{round(q * 100)}" for q in QUANTILES]
+    revenue_q = np.exp(histogram_quantiles(totals["revenue_counts"], log_edges, QUANTILES))
+    revenue_q = np.clip(revenue_q, totals["revenue_min"], totals["revenue_max"])
+    grade_q = histogram_quantiles(totals["grade_counts"], grade_edges, QUANTILES)
+
+    n = totals["draws"]
+    mean = totals["revenue_sum"] / n
+    variance = max(totals["revenue_sq_sum"] / n - mean ** 2, 0.0)
+
+    display_edges, counts = _display_histogram(totals["revenue_counts"], log_edges)
+    display_edges = np.exp(display_edges)
+    revenue_hist = pd.DataFrame({"low": display_edges[:-1], "high": display_edges[1:],
+                                 "center": np.sqrt(display_edges[:-1] * display_edges[1:]),
+                                 "probability": counts / n})
+    display_edges, counts = _display_histogram(totals["grade_counts"], grade_edges)
+    grade_hist = pd.DataFrame({"low": display_edges[:-1], "high": display_edges[1:],
+                               "center": (display_edges[:-1] + display_edges[1:]) / 2,
+                               "probability": counts / (n * years)})
+
+    return {
+        "draws": n,
+        "mean_revenue": mean,
+        "std_revenue": float(np.sqrt(variance)),
+        "total_cost": model["total_cost"],
+        "point_revenue": float(point["gross_value"] * years),
+        "revenue": dict(zip(labels, revenue_q.tolist())),
+        "profit": {label: value - model["total_cost"] for label, value in zip(labels, revenue_q.tolist())},
+        "prob_loss": totals["losses"] / n,
+        "grade": {**dict(zip(labels, map(float, grade_q))), "prob_high_grade": totals["high_grade"] / (n * years)},
+        "revenue_hist": revenue_hist,
+        "grade_hist": grade_hist,
+    }
+
+def main(argv=None):
+    aliases = {label.split()[0].lower(): label for label in METAL_PRICES}
+    parser = argparse.ArgumentParser(description="Monte Carlo price and yield risk of a phytomining field.")
+    parser.add_argument("--metal", choices=sorted(aliases), default="nickel")
+    parser.add_argument("--hectares", type=float, default=1.0)
+    parser.add_argument("--yield", dest="biomass_per_ha", type=float, default=10.0, help="Dry biomass (t/ha per year)")
+    parser.add_argument("--concentration", type=float, default=10000, help="Leaf metal (mg/kg)")
+    parser.add_argument("--price", type=float, default=None, help="$/kg (default: METAL_PRICES)")
+    parser.add_argument("--years", type=int, default=1)
+    parser.add_argument("--volatility", type=float, default=None, help="Annual price volatility (default per metal)")
+    parser.add_argument("--drift", type=float, default=0.0)
+    parser.add_argument("--yield-cv", type=float, default=DEFAULT_YIELD_CV)
+    parser.add_argument("--concentration-cv", type=float, default=DEFAULT_CONCENTRATION_CV)
+    parser.add_argument("--cost-per-ha", type=float, default=DEFAULT_COST_PER_HA)
+    parser.add_argument("--draws", type=int, default=DEFAULT_DRAWS)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=1, help="Processes (0 = all cores)")
+    parser.add_argument("-o", "--output", default=None, help="Write the revenue histogram to this CSV")
+    args = parser.parse_args(argv)
+
+    metal = aliases[args.metal]
+    risk = simulate_risk(args.hectares, args.biomass_per_ha, args.concentration,
+                         METAL_PRICES[metal] if args.price is None else args.price, args.years,
+                         PRICE_VOLATILITY[metal] if args.volatility is None else args.volatility, args.drift,
+                         args.yield_cv, args.concentration_cv, args.cost_per_ha, draws=args.draws, seed=args.seed,
+                         workers=args.workers or None)
+
+    print(f"{metal}: {risk['draws']:,} draws, cost ${risk['total_cost']:,.0f}")
+    for label in risk["revenue"]:
+        print(f"  {label}: revenue ${risk['revenue'][label]:,.0f}  profit ${risk['profit'][label]:,.0f}")
+    print(f"  P(loss) = {risk['prob_loss']:.1%}   P(high-grade ash) = {risk['grade']['prob_high_grade']:.1%}")
+    if args.output:
+        risk["revenue_hist"].to_csv(args.output, index=False)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,12 @@
 import pandas as pd
 import numpy as np
 
+# Model constants shared by the single-plot and batched simulators
+DEFAULT_DECAY_RATE = 0.05  # Weekly soil Zinc decay rate
+DEFAULT_UPTAKE_STEEPNESS = 0.5  # Slope of the plant uptake S-curve
+PLANT_TISSUE_SCALE = 50  # Scale up for realistic plant tissue numbers
+SAFE_SOIL_ZINC_PPM = 300  # Arbitrary "Safe" limit
+
 def generate_remediation_data(initial_zinc_ppm, weeks):
     """
     Generates a mock dataset for metal uptake over time.
@@ -12,26 +18,102 @@ def generate_remediation_data(initial_zinc_ppm, weeks):
     Returns:
         pd.DataFrame: Data with 'Week', 'Soil_Zinc_PPM', and 'Plant_Zinc_Accumulated'.
     """
-    weeks_range = list(range(1, weeks + 1))
+    result = simulate_remediation_scenarios(initial_zinc_ppm, weeks)
+    
+    df = pd.DataFrame({
+        "Week": result["week"],
+        "Soil Zinc (PPM)": result["soil_zinc"][0],
+        "Accumulated Plant Zinc (mg/kg)": result["plant_zinc"][0]
+    })
+    
+    return df
+
+def simulate_remediation_scenarios(initial_zinc_ppm, weeks, decay_rate=DEFAULT_DECAY_RATE,
+                                   uptake_steepness=DEFAULT_UPTAKE_STEEPNESS):
+    """
+    Simulates many remediation scenarios at once (one row per scenario).
+    Scenario parameters are broadcast against each other, so a sweep over
+    plots x decay rates can be passed as arrays of the same length.
+    
+    Args:
+        initial_zinc_ppm (float or array): Starting soil concentration per scenario.
+        weeks (int): Duration of the experiment (shared by all scenarios).
+        decay_rate (float or array): Weekly soil Zinc decay rate.
+        uptake_steepness (float or array): Slope of the plant uptake S-curve.
+        
+    Returns:
+        dict: 'week' (weeks,), the broadcast scenario parameters (n,), and
+        'soil_zinc' / 'plant_zinc' curves as (n, weeks) arrays.
+    """
+    initial, decay, steepness = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(initial_zinc_ppm, dtype=float)),
+        np.atleast_1d(np.asarray(decay_rate, dtype=float)),
+        np.atleast_1d(np.asarray(uptake_steepness, dtype=float)),
+    )
+    weeks_range = np.arange(1, weeks + 1)
     
     # Simulate logarithmic decay of Soil Zinc (Plants suck it up fast then slow down)
-    decay_rate = 0.05
-    soil_zinc = [initial_zinc_ppm * np.exp(-decay_rate * w) for w in weeks_range]
+    soil_zinc = initial[:, None] * np.exp(-decay[:, None] * weeks_range)
     
     # Simulate Logistic Growth of Plant Zinc (S-curve)
     # Saturation point is roughly how much the soil lost
-    removed_zinc_total = initial_zinc_ppm - soil_zinc[-1]
+    removed_zinc_total = initial - soil_zinc[:, -1]
+    with np.errstate(over="ignore"):  # exp overflow -> inf -> no uptake yet, which is the correct limit
+        uptake = removed_zinc_total[:, None] / (1 + np.exp(-steepness[:, None] * (weeks_range - (weeks / 2))))
+    
+    return {
+        "week": weeks_range,
+        "initial_zinc_ppm": initial,
+        "decay_rate": decay,
+        "uptake_steepness": steepness,
+        "soil_zinc": soil_zinc,
+        "plant_zinc": uptake * PLANT_TISSUE_SCALE,
+    }
+
+def remediation_scenarios_to_frame(result):
+    """
+    Converts the output of simulate_remediation_scenarios to a long-format
+    DataFrame (one row per scenario and week). Only call this when a table
+    is actually needed; the arrays are the cheap representation.
     
-    plant_zinc = []
-    for w in weeks_range:
-        # Sigmoid function for accumulation
-        uptake = removed_zinc_total / (1 + np.exp(-0.5 * (w - (weeks/2))))
-        plant_zinc.append(uptake)
+    Args:
+        result (dict): Output of simulate_remediation_scenarios.
         
-    df = pd.DataFrame({
-        "Week": weeks_range,
-        "Soil Zinc (PPM)": soil_zinc,
-        "Accumulated Plant Zinc (mg/kg)": [z * 50 for z in plant_zinc] # Scale up for realistic plant tissue numbers
+    Returns:
+        pd.DataFrame: 'Scenario', parameters, 'Week', 'Soil Zinc (PPM)' and
+        'Accumulated Plant Zinc (mg/kg)'.
+    """
+    n_scenarios, n_weeks = result["soil_zinc"].shape
+    
+    return pd.DataFrame({
+        "Scenario": np.repeat(np.arange(n_scenarios), n_weeks),
+        "Initial Soil Zinc (PPM)": np.repeat(result["initial_zinc_ppm"], n_weeks),
+        "Decay Rate": np.repeat(result["decay_rate"], n_weeks),
+        "Uptake Steepness": np.repeat(result["uptake_steepness"], n_weeks),
+        "Week": np.tile(result["week"], n_scenarios),
+        "Soil Zinc (PPM)": result["soil_zinc"].ravel(),
+        "Accumulated Plant Zinc (mg/kg)": result["plant_zinc"].ravel(),
     })
+
+def weeks_until_safe(initial_zinc_ppm, decay_rate=DEFAULT_DECAY_RATE, safe_limit_ppm=SAFE_SOIL_ZINC_PPM):
+    """
+    Closed-form time for the soil to drop below the safe limit under the
+    exponential decay model: initial * exp(-k * t) = limit.
     
-    return df
+    Args:
+        initial_zinc_ppm (float or array): Starting soil concentration.
+        decay_rate (float or array): Weekly soil Zinc decay rate.
+        safe_limit_ppm (float): Target concentration.
+        
+    Returns:
+        np.ndarray: Weeks from the start (0 if already safe, inf if the
+        soil never gets there).
+    """
+    initial = np.asarray(initial_zinc_ppm, dtype=float)
+    decay = np.asarray(decay_rate, dtype=float)
+    
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weeks = np.log(initial / safe_limit_ppm) / decay
+    
+    weeks = np.where(initial <= safe_limit_ppm, 0.0, weeks)
+    return np.where((initial > safe_limit_ppm) & (decay <= 0), np.inf, weeks)
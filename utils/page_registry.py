@@ -0,0 +1,111 @@
+import argparse
+import importlib
+import subprocess
+import sys
+import time
+
+# Sidebar label -> module providing render(). Modules are imported the
+# first time their page is opened, so plotly/pandas/PIL are only paid for
+# by the pages that need them.
+PAGES = {
+    "Phytoremediation Tracker": "modules.remediation",
+    "Biomass Predictor": "modules.biomass",
+    "Deficiency Detective": "modules.diagnostics",
+    "🧬 Genetics Explorer": "modules.genetics",
+    "💰 Phytomining Economy": "modules.mining",
+}
+
+# Seconds spent importing each page in this server process
+_import_seconds = {}
+
+def load_page(name):
+    """
+    Returns the module for a sidebar page, importing it on first use.
+
+    Args:
+        name (str): Sidebar label (a key of PAGES).
+
+    Returns:
+        module: The page module (has a render() function).
+    """
+    module_name = PAGES[name]
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+
+    started = time.perf_counter()
+    module = importlib.import_module(module_name)
+    _import_seconds[name] = time.perf_counter() - started
+    return module
+
+def import_report():
+    """
+    Import cost of the pages loaded so far in this process.
+
+    Note that dependencies shared between pages are only paid once, so a
+    page opened later can look cheaper than it would be on a cold start;
+    use measure_cold_imports() for an isolated breakdown.
+
+    Returns:
+        dict: Page label -> seconds.
+    """
+    return dict(_import_seconds)
+
+_COLD_IMPORT_SCRIPT = """
+import sys, time
+import streamlit
+sys.stderr.write("--page-import--\\n")
+started = time.perf_counter()
+import {module}
+print(time.perf_counter() - started)
+"""
+
+def _heaviest_imports(importtime_log, top):
+    # -X importtime lines: "import time: self [us] | cumulative | name",
+    # with nesting shown by two spaces of indentation per level. Only the
+    # direct imports of the page module (depth 1) are kept.
+    entries = []
+    for line in importtime_log.split("--page-import--", 1)[-1].splitlines():
+        if not line.startswith("import time:") or line.count("|") < 2:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth != 1 or not cumulative.strip().isdigit():
+            continue
+        entries.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(entries, reverse=True)[:top]
+
+def measure_cold_imports(pages=None, top=5):
+    """
+    Imports each page in a fresh interpreter (with streamlit already loaded,
+    as it is under `streamlit run`) and reports its cold import cost.
+
+    Args:
+        pages (list): Sidebar labels to measure (defaults to all).
+        top (int): Number of heaviest dependencies to list per page.
+
+    Returns:
+        dict: Page label -> {'seconds': float, 'heaviest': [(seconds, module), ...]}.
+    """
+    report = {}
+    for name in pages or PAGES:
+        script = _COLD_IMPORT_SCRIPT.format(module=PAGES[name])
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", script],
+                              capture_output=True, text=True, check=True)
+        report[name] = {
+            "seconds": float(proc.stdout.strip().splitlines()[-1]),
+            "heaviest": _heaviest_imports(proc.stderr, top),
+        }
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold import cost of each PhytoScout page.")
+    parser.add_argument("--top", type=int, default=5, help="Heaviest dependencies to list per page")
+    args = parser.parse_args(argv)
+
+    for name, entry in measure_cold_imports(top=args.top).items():
+        print(f"{name}: {entry['seconds'] * 1000:.0f} ms")
+        for seconds, module in entry["heaviest"]:
+            print(f"    {seconds * 1000:8.1f} ms  {module}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,445 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from utils.batch import analyze_image_path, iter_image_paths
+from utils.image_processing import BIOMASS_FACTOR, GROWTH_FACTOR
+
+DEFAULT_STORE_DIR = os.environ.get(
+    "PHYTOSCOUT_STORE_DIR", os.path.join(os.path.expanduser("~"), ".local", "share", "phyto_scout", "phenotypes")
+)
+
+SCHEMA = pa.schema([
+    ("tray", pa.string()),
+    ("plant_id", pa.string()),
+    ("timestamp", pa.timestamp("ms", tz="UTC")),
+    ("image_hash", pa.string()),
+    ("green_ratio", pa.float64()),
+    ("estimated_biomass_g", pa.float64()),
+    ("source", pa.string()),
+])
+
+PROJECTION_DAY = 40  # Same horizon as the fixed GROWTH_FACTOR projection
+# Growth-curve ceiling: the fixed model's projection at full canopy cover
+MAX_PROJECTED_BIOMASS_G = 100 * BIOMASS_FACTOR * GROWTH_FACTOR
+MAX_SEGMENTS = 64  # Small segments are merged once there are more than this
+SMALL_SEGMENT_ROWS = 50_000  # Larger segments are left alone by automatic merging
+
+def hash_image(data):
+    """Content hash used to recognise images that are already stored."""
+    return hashlib.sha256(data).hexdigest()
+
+def _to_utc(value):
+    ts = pd.Timestamp(value)
+    ts = ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+    return ts.floor("ms")  # Stored resolution
+
+@contextmanager
+def _file_lock(path):
+    """
+    Exclusive lock on `path` held across processes (e.g. a CLI ingest next
+    to the app), released when the block exits.
+    """
+    with open(path, "a+b") as fh:
+        try:
+            import fcntl
+        except ImportError:  # Windows
+            import msvcrt
+            fh.seek(0)
+            msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+            return
+
+        fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+def _segment_meta(name, table):
+    # Summary kept in the manifest so queries can skip whole segments
+    plants = table["plant_id"]
+    times = table["timestamp"]
+    return {
+        "file": name,
+        "rows": table.num_rows,
+        "trays": sorted(pc.unique(table["tray"]).to_pylist()),
+        "plant_min": pc.min(plants).as_py(),
+        "plant_max": pc.max(plants).as_py(),
+        "time_min_ms": pc.min(times).cast(pa.int64()).as_py(),
+        "time_max_ms": pc.max(times).cast(pa.int64()).as_py(),
+    }
+
+class PhenotypeStore:
+    """
+    Append-only columnar history of per-plant measurements.
+
+    - Every append writes one immutable Arrow IPC (Feather v2) segment,
+      sorted by tray, plant and time. Reads memory-map the segments, so a
+      query only pages in the columns and segments it touches.
+    - manifest.json lists the segments with their trays, plant-ID range
+      and time range. Range queries use it to skip segments outright.
+    - Image hashes are kept in memory so already-stored images are
+      recognised (and not re-analysed) before any decoding happens.
+
+    Safe to share between Streamlit sessions of one process and between
+    processes (e.g. the app and a CLI ingest): writers hold a file lock and
+    re-read the manifest under it, and segment names are unique per write.
+    """
+
+    def __init__(self, root=DEFAULT_STORE_DIR, max_segments=MAX_SEGMENTS):
+        self.root = root
+        self.max_segments = max_segments
+        self._lock = threading.Lock()
+
+        os.makedirs(self.root, exist_ok=True)
+        self._manifest = {"version": 1, "segments": []}
+        self._hashes = set()
+        self._hashed_files = set()
+        with self._lock:
+            self._refresh()
+
+    @property
+    def _manifest_path(self):
+        return os.path.join(self.root, "manifest.json")
+
+    @contextmanager
+    def _writing(self):
+        # Thread lock, then the inter-process lock; the manifest is re-read
+        # under both so writes always start from the current state
+        with self._lock, _file_lock(os.path.join(self.root, ".lock")):
+            self._refresh()
+            yield
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path) as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return {"version": 1, "segments": []}
+
+    def _refresh(self):
+        """
+        Reloads the manifest written by any process (caller holds the
+        thread lock) and brings the hash set up to date: hashes of new
+        segments are added, and the set is rebuilt when segments went away.
+        """
+        for attempt in range(3):
+            self._manifest = self._read_manifest()
+            files = {meta["file"] for meta in self._manifest["segments"]}
+            if not self._hashed_files <= files:
+                self._hashes, self._hashed_files = set(), set()
+            try:
+                for name in sorted(files - self._hashed_files):
+                    self._hashes.update(self._read_segment(name, ["image_hash"])["image_hash"].to_pylist())
+                    self._hashed_files.add(name)
+                return
+            except FileNotFoundError:
+                # Compacted away by another process since the manifest was read
+                if attempt == 2:
+                    raise
+
+    def _write_manifest(self):
+        # Write-then-rename so readers never see a half-written manifest
+        tmp_path = f"{self._manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as fh:
+            json.dump(self._manifest, fh, indent=1)
+        os.replace(tmp_path, self._manifest_path)
+
+    def _read_segment(self, name, columns=None):
+        with pa.memory_map(os.path.join(self.root, name)) as source:
+            table = pa.ipc.open_file(source).read_all()
+        return table.select(columns) if columns else table
+
+    def _write_segment(self, table):
+        # Caller holds the locks. Names never collide between processes.
+        name = f"segment-{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:12]}.arrow"
+        path = os.path.join(self.root, name)
+        with pa.OSFile(f"{path}.tmp", "wb") as sink:
+            with pa.ipc.new_file(sink, SCHEMA) as writer:
+                writer.write_table(table)
+        os.replace(f"{path}.tmp", path)
+        self._hashed_files.add(name)
+        return _segment_meta(name, table)
+
+    def __contains__(self, image_hash):
+        with self._lock:
+            self._refresh()
+            return image_hash in self._hashes
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return sum(meta["rows"] for meta in self._manifest["segments"])
+
+    def append(self, records):
+        """
+        Stores new measurements. Rows whose image hash is already stored
+        (or repeated within `records`) are skipped.
+
+        Args:
+            records (pd.DataFrame or list of dict): Columns of SCHEMA;
+                'timestamp' defaults to now, 'source' to "", and
+                'estimated_biomass_g' is derived from 'green_ratio'.
+
+        Returns:
+            int: Number of rows written.
+        """
+        frame = pd.DataFrame(records)
+        if frame.empty:
+            return 0
+        if "timestamp" not in frame:
+            frame["timestamp"] = pd.Timestamp.now(tz="UTC")
+        if "source" not in frame:
+            frame["source"] = ""
+        if "estimated_biomass_g" not in frame:
+            frame["estimated_biomass_g"] = frame["green_ratio"] * BIOMASS_FACTOR
+
+        frame["tray"] = frame["tray"].astype(str)
+        frame["plant_id"] = frame["plant_id"].astype(str)
+        frame["timestamp"] = frame["timestamp"].map(_to_utc)
+        frame = frame.drop_duplicates("image_hash")
+
+        with self._writing():
+            frame = frame[~frame["image_hash"].isin(self._hashes)]
+            if frame.empty:
+                return 0
+
+            frame = frame.sort_values(["tray", "plant_id", "timestamp"])
+            table = pa.Table.from_pandas(frame[SCHEMA.names], schema=SCHEMA, preserve_index=False)
+            self._manifest["segments"].append(self._write_segment(table))
+            self._hashes.update(frame["image_hash"])
+
+            if len(self._manifest["segments"]) > self.max_segments:
+                self._compact([m for m in self._manifest["segments"] if m["rows"] < SMALL_SEGMENT_ROWS])
+            self._write_manifest()
+
+        return len(frame)
+
+    def _compact(self, old):
+        # Caller holds the locks. Interactive saves write one-row segments;
+        # merging them keeps the per-query file count bounded.
+        if len(old) < 2:
+            return
+        table = pa.concat_tables([self._read_segment(meta["file"]) for meta in old])
+        table = table.sort_by([("tray", "ascending"), ("plant_id", "ascending"), ("timestamp", "ascending")])
+        merged = self._write_segment(table)
+
+        names = {meta["file"] for meta in old}
+        self._manifest["segments"] = [m for m in self._manifest["segments"] if m["file"] not in names] + [merged]
+        self._hashed_files -= names  # Their hashes live on in the merged segment
+        self._write_manifest()
+
+        for meta in old:
+            try:
+                os.remove(os.path.join(self.root, meta["file"]))
+            except OSError:
+                pass
+
+    def compact(self):
+        """Merges every segment into one (e.g. after a large ingest)."""
+        with self._writing():
+            self._compact(list(self._manifest["segments"]))
+
+    def query(self, tray=None, plant_ids=None, start=None, end=None, columns=None):
+        """
+        Range query over the history, e.g. "tray A over the last 30 days".
+        Segments whose manifest entry rules them out are never opened.
+
+        Args:
+            tray (str): Only this tray.
+            plant_ids (list): Only these plants.
+            start: Earliest timestamp (inclusive), anything pd.Timestamp accepts.
+            end: Latest timestamp (inclusive).
+            columns (list): Columns to return (default: all).
+
+        Returns:
+            pd.DataFrame: Matching rows ordered by tray, plant and time.
+        """
+        plant_ids = None if plant_ids is None else sorted(str(p) for p in plant_ids)
+        start = None if start is None else _to_utc(start)
+        end = None if end is None else _to_utc(end)
+        start_ms = None if start is None else start.value // 1_000_000
+        end_ms = None if end is None else end.value // 1_000_000
+
+        # A concurrent compaction may delete segments listed in the manifest
+        # just read; the query then starts over from the new manifest
+        for attempt in range(3):
+            with self._lock:
+                self._refresh()
+                segments = list(self._manifest["segments"])
+            try:
+                tables = self._query_segments(segments, tray, plant_ids, start, end, start_ms, end_ms, columns)
+                break
+            except FileNotFoundError:
+                if attempt == 2:
+                    raise
+
+        if not tables:
+            return pd.DataFrame({name: pd.Series(dtype=object) for name in (columns or SCHEMA.names)})
+
+        result = pa.concat_tables(tables).to_pandas()
+        order = [c for c in ("tray", "plant_id", "timestamp") if c in result.columns]
+        return result.sort_values(order).reset_index(drop=True) if order else result
+
+    def _query_segments(self, segments, tray, plant_ids, start, end, start_ms, end_ms, columns):
+        time_type = SCHEMA.field("timestamp").type
+        tables = []
+        for meta in segments:
+            if tray is not None and tray not in meta["trays"]:
+                continue
+            if plant_ids is not None and (plant_ids[-1] < meta["plant_min"] or plant_ids[0] > meta["plant_max"]):
+                continue
+            if start_ms is not None and meta["time_max_ms"] < start_ms:
+                continue
+            if end_ms is not None and meta["time_min_ms"] > end_ms:
+                continue
+
+            table = self._read_segment(meta["file"])
+            mask = None
+            for condition in (
+                None if tray is None else pc.equal(table["tray"], tray),
+                None if plant_ids is None else pc.is_in(table["plant_id"], value_set=pa.array(plant_ids)),
+                None if start is None else pc.greater_equal(table["timestamp"], pa.scalar(start, time_type)),
+                None if end is None else pc.less_equal(table["timestamp"], pa.scalar(end, time_type)),
+            ):
+                if condition is not None:
+                    mask = condition if mask is None else pc.and_(mask, condition)
+            if mask is not None:
+                table = table.filter(mask)
+            if table.num_rows:
+                tables.append(table.select(columns) if columns else table)
+        return tables
+
+def project_biomass(timestamps, biomass_g, horizon_day=PROJECTION_DAY, capacity_g=MAX_PROJECTED_BIOMASS_G):
+    """
+    Projects biomass at `horizon_day` days after the first observation from
+    a logistic growth fit, replacing the fixed GROWTH_FACTOR once a plant
+    has a measured history. The curve is fitted by least squares on the
+    logit, log(b / (K - b)) = a + r * t, with the capacity K fixed, so it
+    stays a linear fit and the projection can never run away.
+
+    Args:
+        timestamps (array-like): Observation times.
+        biomass_g (array-like): Estimated biomass at those times.
+        horizon_day (float): Day (since the first observation) to project to.
+        capacity_g (float): Biomass the curve levels off at.
+
+    Returns:
+        dict or None: 'projected_g', 'daily_growth_rate', 'observations',
+        'days_observed' -- or None when the history cannot support a fit
+        (fewer than two days with positive biomass).
+    """
+    times = pd.to_datetime(pd.Series(timestamps), utc=True).reset_index(drop=True)
+    biomass = np.asarray(biomass_g, dtype=float)
+    keep = biomass > 0
+    times, biomass = times[keep], np.minimum(biomass[keep], capacity_g * 0.999)
+
+    days = ((times - times.min()).dt.total_seconds() / 86400).to_numpy()
+    if len(days) < 2 or np.ptp(days) < 1:
+        return None
+
+    rate, intercept = np.polyfit(days, np.log(biomass / (capacity_g - biomass)), 1)
+    fitted = capacity_g / (1 + np.exp(-(intercept + rate * horizon_day)))
+
+    return {
+        "projected_g": max(float(fitted), float(biomass[np.argmax(days)])),  # Plants do not shrink back
+        "daily_growth_rate": float(rate),
+        "observations": int(len(days)),
+        "days_observed": float(np.ptp(days)),
+    }
+
+def ingest_images(store, paths, tray, plant_id_from="stem", workers=None):
+    """
+    Adds image files to the store, analysing only images it has not seen.
+    The file modification time is used as the measurement timestamp.
+
+    Args:
+        store (PhenotypeStore): Target store.
+        paths (list): Image paths.
+        tray (str): Tray of every image.
+        plant_id_from (str): "stem" (file name) or "parent" (folder name).
+        workers (int): Analysis processes (default: all cores).
+
+    Returns:
+        dict: 'new', 'skipped' and 'errors' counts.
+    """
+    new = []
+    for path in paths:
+        with open(path, "rb") as fh:
+            digest = hash_image(fh.read())
+        if digest not in store:
+            new.append((path, digest))
+
+    records, errors = [], 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for (path, digest), row in zip(new, pool.map(analyze_image_path, [p for p, _ in new], chunksize=4)):
+            if row["status"] != "ok":
+                errors += 1
+                continue
+            plant_source = path if plant_id_from == "stem" else os.path.dirname(path)
+            records.append({
+                "tray": tray,
+                "plant_id": os.path.splitext(os.path.basename(plant_source))[0],
+                "timestamp": pd.Timestamp(os.path.getmtime(path), unit="s", tz="UTC"),
+                "image_hash": digest,
+                "green_ratio": row["green_ratio"],
+                "estimated_biomass_g": row["estimated_biomass_g"],
+                "source": path,
+            })
+
+    written = store.append(records)
+    return {"new": written, "skipped": len(paths) - len(new), "errors": errors}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-plant phenotype history store.")
+    parser.add_argument("--store", default=DEFAULT_STORE_DIR, help="Store directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ingest = sub.add_parser("ingest", help="Analyse and store new images")
+    ingest.add_argument("source", help="Directory or glob pattern of images")
+    ingest.add_argument("--tray", required=True)
+    ingest.add_argument("--plant-id-from", choices=["stem", "parent"], default="stem")
+    ingest.add_argument("--workers", type=int, default=None)
+
+    query = sub.add_parser("query", help="Export a range of the history as CSV")
+    query.add_argument("--tray", default=None)
+    query.add_argument("--plant", action="append", default=None, help="Plant ID (repeatable)")
+    query.add_argument("--days", type=float, default=None, help="Only the last N days")
+    query.add_argument("-o", "--output", default="-", help="Output CSV ('-' for stdout)")
+
+    sub.add_parser("compact", help="Merge all segments into one")
+
+    args = parser.parse_args(argv)
+    store = PhenotypeStore(args.store)
+
+    if args.command == "ingest":
+        started = time.perf_counter()
+        counts = ingest_images(store, iter_image_paths(args.source), args.tray, args.plant_id_from, args.workers)
+        print(f"{counts['new']} new, {counts['skipped']} already stored, {counts['errors']} errors "
+              f"in {time.perf_counter() - started:.1f}s")
+    elif args.command == "query":
+        start = pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=args.days) if args.days else None
+        history = store.query(tray=args.tray, plant_ids=args.plant, start=start)
+        history.to_csv(sys.stdout if args.output == "-" else args.output, index=False)
+    else:
+        store.compact()
+
+if __name__ == "__main__":
+    main()
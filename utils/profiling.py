@@ -0,0 +1,131 @@
+import contextvars
+import io
+import json
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("phyto_scout.timing")
+
+# Stage list of the page run active in the current thread (Streamlit runs
+# each session's script in its own thread, so runs never mix)
+_current_run = contextvars.ContextVar("phyto_scout_run", default=None)
+_current_depth = contextvars.ContextVar("phyto_scout_depth", default=0)
+
+# cProfile allows one active profiler per process, and sessions share it
+_cprofile_lock = threading.Lock()
+
+def enable_timing_log(stream=None, level=logging.INFO):
+    """
+    Emits one JSON line per timed stage / page run on `stream` (stderr by
+    default). Without this the records still go through the standard
+    logging tree, so any existing handler or metrics shipper can pick them up.
+    """
+    if any(getattr(h, "_phyto_scout", False) for h in logger.handlers):
+        return
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    handler._phyto_scout = True
+    logger.addHandler(handler)
+    logger.setLevel(level)
+
+@contextmanager
+def timed(stage, **fields):
+    """
+    Times a block as a named stage of the current page run. Stages nest;
+    outside a page run the timing is only logged.
+
+    Args:
+        stage (str): Stage name, e.g. "decode" or "build_figures".
+        **fields: Extra context logged with the stage (sizes, counts, ...).
+    """
+    depth = _current_depth.get()
+    record = {"stage": stage, "ms": None, "depth": depth, **fields}
+
+    # Appended on entry so the run lists stages in start order (parents first)
+    run = _current_run.get()
+    if run is not None:
+        run["stages"].append(record)
+
+    token = _current_depth.set(depth + 1)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record["ms"] = round((time.perf_counter() - started) * 1000, 3)
+        _current_depth.reset(token)
+
+        page = {"page": run["page"]} if run is not None else {}
+        logger.info(json.dumps({"event": "stage", **page, **record}, default=str))
+
+@contextmanager
+def page_run(page):
+    """
+    Collects every timed() stage of one page render.
+
+    Yields:
+        dict: {'page', 'stages': [...], 'total_ms'} -- filled in when the block exits.
+    """
+    run = {"page": page, "stages": [], "total_ms": None}
+    token = _current_run.set(run)
+    started = time.perf_counter()
+    try:
+        yield run
+    finally:
+        run["total_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        _current_run.reset(token)
+        logger.info(json.dumps({"event": "page", "page": page, "total_ms": run["total_ms"],
+                                "stages": len(run["stages"])}))
+
+@contextmanager
+def profile_run(interval=0.001):
+    """
+    Profiles one block. Uses the pyinstrument sampling profiler when it is
+    installed, and falls back to the (deterministic, slower) cProfile. Only
+    one cProfile session can run at a time: while another session holds it
+    the block runs unprofiled and 'profiler' stays None.
+
+    Yields:
+        dict: {'profiler', 'report'} -- the text report (or a "profiler
+        busy" note) is filled in on exit.
+    """
+    result = {"profiler": None, "report": ""}
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        Profiler = None
+
+    if Profiler is not None:
+        profiler = Profiler(interval=interval)
+        result["profiler"] = "pyinstrument"
+        profiler.start()
+        try:
+            yield result
+        finally:
+            profiler.stop()
+            result["report"] = profiler.output_text(unicode=True, color=False)
+        return
+
+    import cProfile
+    import pstats
+
+    if not _cprofile_lock.acquire(blocking=False):
+        result["report"] = "Profiler busy: another session is being profiled, try again shortly."
+        yield result
+        return
+
+    try:
+        profiler = cProfile.Profile()
+        result["profiler"] = "cProfile"
+        profiler.enable()
+        try:
+            yield result
+        finally:
+            profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(30)
+            result["report"] = out.getvalue()
+    finally:
+        _cprofile_lock.release()
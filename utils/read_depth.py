@@ -0,0 +1,404 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_WINDOW_BP = 1_000
+DEFAULT_BIN_BP = 100  # Resolution of depth files converted from bedGraph
+DEFAULT_PLOIDY = 2
+GC_BINS = 50  # GC-fraction strata for the median GC correction
+CHUNK_ELEMENTS = 4_000_000  # Depth values paged in per step (~16 MB as float32)
+BEDGRAPH_CHUNK_ROWS = 1_000_000
+
+REGION_COLUMNS = ["name", "contig", "start", "end"]
+
+# ---------------------------------------------------------------------------
+# Depth file format: one flat binary array (all contigs back to back) plus a
+# JSON sidecar "<file>.json" describing dtype, bin size and contig layout:
+#   {"sample": "...", "dtype": "float32", "bin_bp": 100,
+#    "contigs": [{"name": "chr1", "offset": 0, "bins": 12345}, ...]}
+# ---------------------------------------------------------------------------
+
+def sidecar_path(depth_path):
+    return f"{depth_path}.json"
+
+def write_depth(path, contig_depths, bin_bp=1, sample=None, dtype=np.float32):
+    """
+    Writes per-contig depth arrays in the binary format, one contig at a time.
+
+    Args:
+        path (str): Output file (e.g. "sample1.depth").
+        contig_depths (dict or iterable): contig name -> 1-D depth array
+            (per base for bin_bp=1, else mean depth per bin).
+        bin_bp (int): Bases per stored value.
+        sample (str): Sample name (default: file name).
+        dtype: Stored dtype (uint16 is enough for raw per-base depth).
+    """
+    items = contig_depths.items() if isinstance(contig_depths, dict) else contig_depths
+    contigs, offset = [], 0
+    with open(path, "wb") as fh:
+        for name, depth in items:
+            values = np.asarray(depth, dtype=dtype)
+            values.tofile(fh)
+            contigs.append({"name": name, "offset": offset, "bins": int(values.size)})
+            offset += values.size
+
+    meta = {"sample": sample or os.path.splitext(os.path.basename(path))[0],
+            "dtype": np.dtype(dtype).name, "bin_bp": int(bin_bp), "contigs": contigs}
+    with open(sidecar_path(path), "w") as fh:
+        json.dump(meta, fh, indent=1)
+
+class DepthTrack:
+    """
+    Memory-mapped view of one sample's depth file. Nothing is read until a
+    contig slice is actually used, and then only those pages.
+    """
+
+    def __init__(self, path):
+        with open(sidecar_path(path)) as fh:
+            meta = json.load(fh)
+        self.path = path
+        self.sample = meta["sample"]
+        self.bin_bp = meta["bin_bp"]
+        self.contigs = {c["name"]: (c["offset"], c["bins"]) for c in meta["contigs"]}
+
+        total = sum(bins for _, bins in self.contigs.values())
+        self._data = np.memmap(path, dtype=meta["dtype"], mode="r", shape=(total,))
+
+    def contig(self, name):
+        """Depth values of one contig (a memmap view, not a copy)."""
+        if name not in self.contigs:
+            raise KeyError(f"{self.sample}: contig {name!r} not in depth file")
+        offset, bins = self.contigs[name]
+        return self._data[offset:offset + bins]
+
+def window_means(values, window_bins, chunk_elements=CHUNK_ELEMENTS):
+    """
+    Mean of consecutive windows of `window_bins` values, computed chunk by
+    chunk so only one chunk of a memory-mapped array is resident at a time.
+
+    Args:
+        values (np.ndarray or np.memmap): 1-D depth values.
+        window_bins (int): Values per window.
+        chunk_elements (int): Values paged in per step (rounded to whole windows).
+
+    Returns:
+        np.ndarray: float64 means, one per window (the last may be partial).
+    """
+    n = values.shape[0]
+    means = np.empty(-(-n // window_bins), dtype=np.float64)
+    step = max(1, chunk_elements // window_bins) * window_bins
+
+    for start in range(0, n, step):
+        block = values[start:start + step]
+        full = block.shape[0] // window_bins
+        first = start // window_bins
+        if full:
+            means[first:first + full] = block[:full * window_bins].reshape(full, window_bins).sum(
+                axis=1, dtype=np.float64) / window_bins
+        if block.shape[0] % window_bins:
+            means[first + full] = block[full * window_bins:].mean(dtype=np.float64)
+    return means
+
+def genome_windows(track, window_bp=DEFAULT_WINDOW_BP):
+    """
+    Window means over every contig of a sample.
+
+    Returns:
+        dict: contig name -> float64 array of window means.
+    """
+    if window_bp % track.bin_bp:
+        raise ValueError(f"window_bp ({window_bp}) must be a multiple of the file's bin size ({track.bin_bp})")
+    window_bins = window_bp // track.bin_bp
+    return {name: window_means(track.contig(name), window_bins) for name in track.contigs}
+
+def read_chrom_sizes(path):
+    """Reads contig lengths from a chrom.sizes or samtools .fai file."""
+    sizes = pd.read_csv(path, sep="\t", header=None, usecols=[0, 1], names=["contig", "length"], dtype={0: str})
+    return dict(zip(sizes["contig"], sizes["length"].astype(np.int64)))
+
+def _bedgraph_chunks(path):
+    return pd.read_csv(path, sep="\t", header=None, comment="#", usecols=[0, 1, 2, 3],
+                       names=["contig", "start", "end", "depth"], dtype={"contig": str},
+                       chunksize=BEDGRAPH_CHUNK_ROWS)
+
+def bedgraph_to_depth(bedgraph_path, out_path, bin_bp=DEFAULT_BIN_BP, chrom_sizes=None, sample=None):
+    """
+    Converts a bedGraph (e.g. from `bedtools genomecov -bg` or mosdepth) to
+    the binary format at `bin_bp` resolution (mean depth per bin).
+
+    The bedGraph is streamed in chunks. Each interval is spread over the
+    bins it overlaps through the coverage integral, so long intervals cost
+    no more than short ones, and the output is filled through a memmap.
+
+    Args:
+        bedgraph_path (str): Input bedGraph (contig, start, end, depth).
+        out_path (str): Output depth file; the sidecar is written next to it.
+        bin_bp (int): Bases per stored value.
+        chrom_sizes (dict): contig -> length. Read from the bedGraph (extra
+            pass) when not given.
+        sample (str): Sample name.
+    """
+    if chrom_sizes is None:
+        chrom_sizes = {}
+        for chunk in _bedgraph_chunks(bedgraph_path):
+            for contig, end in chunk.groupby("contig", sort=False)["end"].max().items():
+                chrom_sizes[contig] = max(chrom_sizes.get(contig, 0), int(end))
+
+    contigs, offset = [], 0
+    for name, length in chrom_sizes.items():
+        bins = -(-int(length) // bin_bp)
+        contigs.append({"name": name, "offset": offset, "bins": bins})
+        offset += bins
+    layout = {c["name"]: (c["offset"], c["bins"]) for c in contigs}
+
+    out = np.memmap(out_path, dtype=np.float32, mode="w+", shape=(max(offset, 1),))
+    for chunk in _bedgraph_chunks(bedgraph_path):
+        for contig, rows in chunk.groupby("contig", sort=False):
+            if contig not in layout:
+                continue
+            base, n_bins = layout[contig]
+            starts = rows["start"].to_numpy(np.int64)
+            ends = rows["end"].to_numpy(np.int64)
+            depth = rows["depth"].to_numpy(np.float64)
+
+            # Coverage integral F(x) = sum of depth * overlap up to x; bin sums are
+            # F(bin end) - F(bin start), evaluated only over the chunk's span
+            first_bin, last_bin = starts.min() // bin_bp, min(-(-ends.max() // bin_bp), n_bins)
+            edges = np.arange(first_bin, last_bin + 1, dtype=np.int64) * bin_bp
+            order = np.argsort(starts)
+            starts, ends, depth = starts[order], ends[order], depth[order]
+            cum = np.concatenate([[0.0], np.cumsum(depth * (ends - starts))])
+
+            # Intervals ending at or before an edge count in full; the next one
+            # (which may straddle the edge) counts up to the edge
+            done = np.searchsorted(ends, edges, side="right")
+            straddling = np.minimum(done, len(starts) - 1)
+            partial = depth[straddling] * np.clip(edges - starts[straddling], 0, None)
+            integral = cum[done] + np.where(done < len(starts), partial, 0.0)
+
+            sums = np.diff(integral)
+            out[base + first_bin:base + last_bin] += (sums / bin_bp).astype(np.float32)
+    out.flush()
+    del out
+
+    meta = {"sample": sample or os.path.splitext(os.path.basename(out_path))[0],
+            "dtype": "float32", "bin_bp": int(bin_bp), "contigs": contigs}
+    with open(sidecar_path(out_path), "w") as fh:
+        json.dump(meta, fh, indent=1)
+
+def gc_content_windows(fasta_path, window_bp=DEFAULT_WINDOW_BP):
+    """
+    GC fraction per window for every contig of a reference FASTA, streamed
+    line by line. Windows made only of N get NaN.
+
+    Returns:
+        dict: contig name -> float64 array of GC fractions.
+    """
+    gc_lut = np.zeros(256, dtype=np.int64)
+    acgt_lut = np.zeros(256, dtype=np.int64)
+    for base in b"GCgc":
+        gc_lut[base] = 1
+    for base in b"ACGTacgt":
+        acgt_lut[base] = 1
+
+    result = {}
+    name, gc_counts, acgt_counts, pending = None, [], [], b""
+
+    def flush_windows(seq, final):
+        # Counts whole windows of `seq`, returning the unconsumed tail
+        full = len(seq) // window_bp
+        if final and len(seq) % window_bp:
+            full += 1
+        if full:
+            codes = np.frombuffer(seq[:full * window_bp], dtype=np.uint8)
+            bounds = np.arange(0, len(codes), window_bp)
+            gc_counts.append(np.add.reduceat(gc_lut[codes], bounds))
+            acgt_counts.append(np.add.reduceat(acgt_lut[codes], bounds))
+        return seq[full * window_bp:]
+
+    def finish():
+        if name is not None:
+            flush_windows(pending, final=True)
+            gc = np.concatenate(gc_counts) if gc_counts else np.zeros(0)
+            acgt = np.concatenate(acgt_counts) if acgt_counts else np.zeros(0)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                result[name] = np.where(acgt > 0, gc / acgt, np.nan)
+
+    with open(fasta_path, "rb") as fh:
+        for line in fh:
+            if line.startswith(b">"):
+                finish()
+                name, gc_counts, acgt_counts, pending = line[1:].split()[0].decode(), [], [], b""
+                continue
+            pending += line.strip()
+            if len(pending) >= 64 * window_bp:
+                pending = flush_windows(pending, final=False)
+        finish()
+
+    return result
+
+def normalize_windows(windows, gc=None, gc_bins=GC_BINS):
+    """
+    Turns raw window depths into copy ratios (1.0 = genome-wide typical).
+
+    - GC correction (when `gc` is given): each window is scaled by the
+      genome median over the median of its GC stratum, which removes the
+      library's GC bias.
+    - Median normalization: ratios are relative to the genome-wide median
+      of covered windows, so sequencing depth cancels out between samples.
+
+    Args:
+        windows (dict): contig -> window means (see genome_windows).
+        gc (dict): contig -> GC fraction per window, same window size.
+        gc_bins (int): Number of GC strata.
+
+    Returns:
+        dict: contig -> float64 copy ratios (NaN where uncovered).
+    """
+    names = list(windows)
+    depth = np.concatenate([windows[n] for n in names])
+    covered = depth > 0
+
+    if gc is not None:
+        gc_all = np.full(depth.size, np.nan)
+        start = 0
+        for n in names:
+            contig_gc = gc.get(n, np.zeros(0))[:len(windows[n])]
+            gc_all[start:start + contig_gc.size] = contig_gc
+            start += len(windows[n])
+        usable = covered & ~np.isnan(gc_all)
+        strata = np.minimum((np.nan_to_num(gc_all) * gc_bins).astype(np.intp), gc_bins - 1)
+
+        overall = np.median(depth[usable]) if usable.any() else np.nan
+        stratum_median = np.full(gc_bins, np.nan)
+        for s in np.unique(strata[usable]):
+            stratum_median[s] = np.median(depth[usable & (strata == s)])
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            depth = np.where(usable, depth * overall / stratum_median[strata], np.nan)
+        covered = usable & np.isfinite(depth)
+
+    median = np.median(depth[covered]) if covered.any() else np.nan
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratios = np.where(covered, depth / median, np.nan)
+
+    out, start = {}, 0
+    for n in names:
+        out[n] = ratios[start:start + len(windows[n])]
+        start += len(windows[n])
+    return out
+
+def load_regions(source):
+    """
+    Reads the loci to call (e.g. HMA4, ZIP, MTP1 coordinates in the
+    reference used for alignment) from a CSV with REGION_COLUMNS or a BED
+    file (contig, start, end, name).
+
+    Returns:
+        pd.DataFrame: name, contig, start, end.
+    """
+    name = os.fspath(source) if isinstance(source, (str, os.PathLike)) else getattr(source, "name", "")
+    if name.lower().endswith(".bed"):
+        regions = pd.read_csv(source, sep="\t", header=None, comment="#", usecols=[0, 1, 2, 3],
+                              names=["contig", "start", "end", "name"], dtype={"contig": str})
+    else:
+        regions = pd.read_csv(source, dtype={"contig": str})
+
+    missing = [c for c in REGION_COLUMNS if c not in regions.columns]
+    if missing:
+        raise ValueError(f"Regions file is missing columns: {', '.join(missing)}")
+    return regions[REGION_COLUMNS]
+
+def call_sample(depth_path, regions, window_bp=DEFAULT_WINDOW_BP, gc=None, ploidy=DEFAULT_PLOIDY):
+    """
+    Copy-number estimates for one sample over the given loci (runs inside a
+    worker process).
+
+    Returns:
+        pd.DataFrame: One row per locus: sample, locus, contig, start, end,
+        windows, mean_depth, copy_ratio and copy_number.
+    """
+    track = DepthTrack(depth_path)
+    windows = genome_windows(track, window_bp)
+    ratios = normalize_windows(windows, gc)
+
+    rows = []
+    for region in regions.itertuples(index=False):
+        first, last = region.start // window_bp, -(-region.end // window_bp)
+        depth = windows.get(region.contig, np.zeros(0))[first:last]
+        ratio = ratios.get(region.contig, np.zeros(0))[first:last]
+        copy_ratio = float(np.nanmedian(ratio)) if np.isfinite(ratio).any() else np.nan
+        rows.append({
+            "sample": track.sample,
+            "locus": region.name,
+            "contig": region.contig,
+            "start": region.start,
+            "end": region.end,
+            "windows": int(depth.size),
+            "mean_depth": float(depth.mean()) if depth.size else np.nan,
+            "copy_ratio": copy_ratio,
+            "copy_number": copy_ratio * ploidy,
+        })
+    return pd.DataFrame(rows)
+
+def call_copy_numbers(depth_paths, regions, window_bp=DEFAULT_WINDOW_BP, gc=None, ploidy=DEFAULT_PLOIDY,
+                      workers=None):
+    """
+    Calls every sample in parallel (one process per sample at a time).
+
+    Args:
+        depth_paths (list): Depth files (each with its JSON sidecar).
+        regions (pd.DataFrame): Loci (see load_regions).
+        window_bp (int): Window size for means and normalization.
+        gc (dict): GC fraction per window (see gc_content_windows), optional.
+        ploidy (int): Copy number of a normal region.
+        workers (int): Processes (default: all cores).
+
+    Returns:
+        pd.DataFrame: Rows of call_sample for all samples.
+    """
+    if len(depth_paths) == 1 or workers == 1:
+        frames = [call_sample(p, regions, window_bp, gc, ploidy) for p in depth_paths]
+    else:
+        n = len(depth_paths)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            frames = list(pool.map(call_sample, depth_paths, [regions] * n, [window_bp] * n, [gc] * n, [ploidy] * n))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read-depth copy-number calling for candidate loci.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    convert = sub.add_parser("convert", help="bedGraph -> binary depth file")
+    convert.add_argument("bedgraph")
+    convert.add_argument("-o", "--output", required=True, help="Output .depth file")
+    convert.add_argument("--bin-bp", type=int, default=DEFAULT_BIN_BP)
+    convert.add_argument("--chrom-sizes", default=None, help="chrom.sizes or .fai (saves a pass)")
+    convert.add_argument("--sample", default=None)
+
+    call = sub.add_parser("call", help="Copy numbers over loci for many samples")
+    call.add_argument("depth_files", nargs="+", help="Binary depth files")
+    call.add_argument("--regions", required=True, help="CSV (name,contig,start,end) or BED")
+    call.add_argument("--window-bp", type=int, default=DEFAULT_WINDOW_BP)
+    call.add_argument("--fasta", default=None, help="Reference FASTA for GC correction")
+    call.add_argument("--ploidy", type=int, default=DEFAULT_PLOIDY)
+    call.add_argument("--workers", type=int, default=None)
+    call.add_argument("-o", "--output", default="copy_numbers.csv")
+
+    args = parser.parse_args(argv)
+    if args.command == "convert":
+        sizes = read_chrom_sizes(args.chrom_sizes) if args.chrom_sizes else None
+        bedgraph_to_depth(args.bedgraph, args.output, args.bin_bp, sizes, args.sample)
+    else:
+        gc = gc_content_windows(args.fasta, args.window_bp) if args.fasta else None
+        calls = call_copy_numbers(args.depth_files, load_regions(args.regions), args.window_bp, gc,
+                                  args.ploidy, args.workers)
+        calls.to_csv(args.output, index=False)
+        print(calls.pivot_table(index="sample", columns="locus", values="copy_number").round(2).to_string())
+
+if __name__ == "__main__":
+    main()
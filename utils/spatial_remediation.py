@@ -0,0 +1,283 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from utils.mock_data import DEFAULT_DECAY_RATE, PLANT_TISSUE_SCALE, SAFE_SOIL_ZINC_PPM
+
+MAX_GRID_SIDE = 1000  # Larger rasters are block-averaged down to this
+SNAPSHOT_SIDE = 100  # Side of the per-week heatmap snapshots
+MAX_DIFFUSION = 0.25  # Exchange fraction above which the explicit update oscillates
+
+STAT_COLUMNS = ["week", "mean_ppm", "median_ppm", "p90_ppm", "max_ppm", "safe_fraction",
+                "removed_pct", "removed_zinc_tissue_equiv"]
+
+def block_mean(grid, max_side):
+    """
+    Downsamples a 2-D grid by averaging square blocks, so the result has at
+    most `max_side` cells per side. NaN cells (outside the field) are
+    ignored; blocks without any valid cell stay NaN.
+
+    Args:
+        grid (np.ndarray): 2-D array.
+        max_side (int): Longest side of the result.
+
+    Returns:
+        np.ndarray: float32 array of shape (ceil(H / f), ceil(W / f)).
+    """
+    factor = max(1, -(-max(grid.shape) // max_side))
+    if factor == 1:
+        return grid.astype(np.float32, copy=True)
+
+    h, w = grid.shape
+    padded = np.full((-(-h // factor) * factor, -(-w // factor) * factor), np.nan, dtype=np.float32)
+    padded[:h, :w] = grid
+    blocks = padded.reshape(padded.shape[0] // factor, factor, padded.shape[1] // factor, factor)
+
+    valid = ~np.isnan(blocks)
+    counts = valid.sum(axis=(1, 3))
+    sums = np.where(valid, blocks, 0).sum(axis=(1, 3), dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (sums / counts).astype(np.float32)
+
+def load_raster(source, filename=None, ppm_per_unit=1.0):
+    """
+    Reads an initial soil-concentration raster.
+
+    - `.npy`: 2-D array of PPM values.
+    - `.csv` / `.txt`: comma-separated grid of PPM values (empty = outside the field).
+    - Images (PNG, TIFF, ...): single band, scaled by `ppm_per_unit`.
+
+    Rasters larger than MAX_GRID_SIDE are block-averaged down to it.
+
+    Args:
+        source: Path or file object.
+        filename (str): Name used to detect the format when `source` is a
+            file object (e.g. a Streamlit upload).
+        ppm_per_unit (float): PPM per raw pixel value (images only).
+
+    Returns:
+        np.ndarray: float32 grid of PPM, NaN outside the field.
+    """
+    name = (filename or (os.fspath(source) if isinstance(source, (str, os.PathLike)) else "")).lower()
+    if name.endswith(".npy"):
+        grid = np.load(source)
+    elif name.endswith((".csv", ".txt")):
+        grid = np.genfromtxt(source, delimiter=",", dtype=np.float32)
+    else:
+        with Image.open(source) as img:
+            band = img if img.mode in ("I", "I;16", "F", "L") else img.convert("L")
+            grid = np.asarray(band, dtype=np.float32) * ppm_per_unit
+
+    grid = np.asarray(grid, dtype=np.float32)
+    if grid.ndim != 2:
+        raise ValueError(f"Expected a 2-D raster, got shape {grid.shape}")
+    if max(grid.shape) > MAX_GRID_SIDE:
+        grid = block_mean(grid, MAX_GRID_SIDE)
+    return grid
+
+def demo_raster(shape=(400, 400), mean_ppm=800, hotspots=6, seed=0):
+    """
+    Synthetic contaminated field: a background level plus Gaussian hotspots
+    (e.g. old spoil heaps), for trying the simulation without a survey.
+
+    Returns:
+        np.ndarray: float32 grid of PPM with the requested mean.
+    """
+    rng = np.random.default_rng(seed)
+    rows, cols = shape
+    y = np.linspace(0, 1, rows, dtype=np.float32)[:, None]
+    x = np.linspace(0, 1, cols, dtype=np.float32)[None, :]
+
+    grid = np.full(shape, 0.3, dtype=np.float32)
+    for cy, cx, radius, height in zip(rng.random(hotspots), rng.random(hotspots),
+                                      rng.uniform(0.05, 0.2, hotspots), rng.uniform(0.5, 2.0, hotspots)):
+        grid += height * np.exp(-((y - cy) ** 2 + (x - cx) ** 2) / (2 * radius ** 2))
+
+    return grid * (mean_ppm / grid.mean())
+
+class GridSimulation:
+    """
+    Week-by-week soil depletion over a 2-D field grid.
+
+    Each week is one in-place NumPy update across all cells: first-order
+    uptake (the same exponential decay as the single-plot tracker, with a
+    scalar or per-cell rate) followed by an optional lateral exchange
+    between neighbouring cells. With a uniform raster and no exchange every
+    cell's soil concentration follows generate_remediation_data exactly.
+    Plant tissue is not modelled: the tracker's logistic uptake curve
+    depends on the total duration, which a resumable run does not know, so
+    'removed_zinc_tissue_equiv' is only the removed soil zinc on the tissue
+    scale (PLANT_TISSUE_SCALE), not the tracker's plant-zinc curve.
+
+    The simulation is resumable: run(24) after run(12) continues from week
+    12, and save() / load() persist the full state between sessions.
+    Only per-week statistics and small heatmap snapshots are kept per week.
+    """
+
+    def __init__(self, initial_ppm, decay_rate=DEFAULT_DECAY_RATE, diffusion=0.0,
+                 safe_limit_ppm=SAFE_SOIL_ZINC_PPM, snapshot_side=SNAPSHOT_SIDE):
+        if not 0 <= diffusion <= MAX_DIFFUSION:
+            raise ValueError(f"diffusion must be between 0 and {MAX_DIFFUSION}")
+
+        self.initial = np.asarray(initial_ppm, dtype=np.float32)
+        self.soil = self.initial.copy()
+        self.decay_rate = np.asarray(decay_rate, dtype=np.float32)
+        self.diffusion = float(diffusion)
+        self.safe_limit_ppm = float(safe_limit_ppm)
+        self.snapshot_side = snapshot_side
+        self.week = 0
+
+        self._flux = None
+        self._valid = ~np.isnan(self.initial)
+        self._all_valid = bool(self._valid.all())
+        self._initial_total = float(np.nansum(self.initial, dtype=np.float64))
+        self._initial_mean = self._initial_total / max(int(self._valid.sum()), 1)
+
+        self.stats = []
+        self.snapshots = [block_mean(self.initial, snapshot_side)]  # Index = week
+
+    @property
+    def _retain(self):
+        return np.exp(-self.decay_rate).astype(np.float32)
+
+    def _exchange(self):
+        # Mass-conserving flux between 4-neighbours; NaN cells are no-flux walls.
+        # Both fluxes come from the same state, in buffers reused every week.
+        if self._flux is None:
+            rows, cols = self.soil.shape
+            self._flux = (np.empty((rows - 1, cols), np.float32), np.empty((rows, cols - 1), np.float32))
+        soil = self.soil
+        flux_rows, flux_cols = self._flux
+
+        np.subtract(soil[1:, :], soil[:-1, :], out=flux_rows)
+        np.subtract(soil[:, 1:], soil[:, :-1], out=flux_cols)
+        for flux in self._flux:
+            np.nan_to_num(flux, copy=False)
+            flux *= self.diffusion
+
+        soil[1:, :] -= flux_rows
+        soil[:-1, :] += flux_rows
+        soil[:, 1:] -= flux_cols
+        soil[:, :-1] += flux_cols
+
+    def _record(self):
+        values = self.soil if self._all_valid else self.soil[self._valid]
+        median, p90 = np.percentile(values, [50, 90]) if values.size else (np.nan, np.nan)
+        mean = float(values.mean(dtype=np.float64)) if values.size else np.nan
+        total = float(values.sum(dtype=np.float64))
+
+        self.stats.append({
+            "week": self.week,
+            "mean_ppm": mean,
+            "median_ppm": float(median),
+            "p90_ppm": float(p90),
+            "max_ppm": float(values.max()) if values.size else np.nan,
+            "safe_fraction": float(np.count_nonzero(values < self.safe_limit_ppm) / max(values.size, 1)),
+            "removed_pct": (1 - total / self._initial_total) * 100 if self._initial_total else 0.0,
+            "removed_zinc_tissue_equiv": (self._initial_mean - mean) * PLANT_TISSUE_SCALE,
+        })
+        self.snapshots.append(block_mean(self.soil, self.snapshot_side))
+
+    def run(self, weeks):
+        """
+        Advances the simulation to week `weeks` (no-op if already there).
+
+        Returns:
+            GridSimulation: self, for chaining.
+        """
+        retain = self._retain
+        while self.week < weeks:
+            np.multiply(self.soil, retain, out=self.soil)
+            if self.diffusion:
+                self._exchange()
+            self.week += 1
+            self._record()
+        return self
+
+    def stats_frame(self, weeks=None):
+        """Per-week statistics (up to `weeks`) as a DataFrame."""
+        stats = self.stats if weeks is None else self.stats[:weeks]
+        return pd.DataFrame(stats, columns=STAT_COLUMNS)
+
+    def save(self, path):
+        """Writes the full state to a .npz file."""
+        np.savez_compressed(
+            path,
+            initial=self.initial,
+            soil=self.soil,
+            decay_rate=self.decay_rate,
+            params=np.array([self.diffusion, self.safe_limit_ppm, self.snapshot_side, self.week]),
+            stats=self.stats_frame()[STAT_COLUMNS].to_numpy(dtype=np.float64),
+            snapshots=np.stack(self.snapshots),
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Restores a simulation written by save()."""
+        with np.load(path) as data:
+            diffusion, safe_limit_ppm, snapshot_side, week = data["params"]
+            sim = cls(data["initial"], data["decay_rate"], diffusion, safe_limit_ppm, int(snapshot_side))
+            sim.soil = data["soil"].copy()
+            sim.week = int(week)
+            sim.stats = [dict(zip(STAT_COLUMNS, row)) for row in data["stats"].tolist()]
+            for row in sim.stats:
+                row["week"] = int(row["week"])
+            sim.snapshots = list(data["snapshots"])
+        return sim
+
+def _resume_conflicts(sim, args):
+    """Command-line parameters that differ from a resumed simulation."""
+    conflicts = []
+    if args.decay_rate is not None and not np.allclose(sim.decay_rate, args.decay_rate):
+        conflicts.append(f"--decay-rate {args.decay_rate}")
+    if args.diffusion is not None and not np.isclose(sim.diffusion, args.diffusion):
+        conflicts.append(f"--diffusion {args.diffusion} (saved: {sim.diffusion:g})")
+    if args.raster:
+        initial = load_raster(args.raster)
+        if initial.shape != sim.initial.shape or not np.allclose(initial, sim.initial, equal_nan=True):
+            conflicts.append(f"raster {args.raster}")
+    return conflicts
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Spatial remediation simulation over a field raster.")
+    parser.add_argument("raster", nargs="?", help="Initial PPM raster (.npy, .csv or image); omit for a demo field")
+    parser.add_argument("--weeks", type=int, default=12)
+    parser.add_argument("--decay-rate", type=float, default=None, help=f"Default {DEFAULT_DECAY_RATE}")
+    parser.add_argument("--diffusion", type=float, default=None, help=f"Weekly neighbour exchange (0-{MAX_DIFFUSION})")
+    parser.add_argument("--state", default=None, help="State .npz: resumed when it exists, written afterwards")
+    parser.add_argument("--override", action="store_true",
+                        help="Start over when the raster or parameters differ from the --state file")
+    parser.add_argument("-o", "--output", default="field_stats.csv", help="Per-week statistics CSV")
+    args = parser.parse_args(argv)
+
+    sim = None
+    if args.state and os.path.exists(args.state):
+        sim = GridSimulation.load(args.state)
+        conflicts = _resume_conflicts(sim, args)
+        if conflicts and not args.override:
+            parser.error(f"{args.state} was run with other inputs ({', '.join(conflicts)}); "
+                         "drop them to resume, or pass --override to start over")
+        if conflicts:
+            print(f"Discarding {args.state}: {', '.join(conflicts)}")
+            sim = None
+        else:
+            print(f"Resuming from week {sim.week}")
+
+    if sim is None:
+        initial = load_raster(args.raster) if args.raster else demo_raster()
+        decay_rate = DEFAULT_DECAY_RATE if args.decay_rate is None else args.decay_rate
+        sim = GridSimulation(initial, decay_rate, args.diffusion or 0.0)
+
+    sim.run(args.weeks)
+    if args.state:
+        sim.save(args.state)
+
+    stats = sim.stats_frame(args.weeks)
+    stats.to_csv(args.output, index=False)
+    print(stats.tail(1).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import numpy as np
+
+def histogram_quantiles(counts, edges, qs):
+    """
+    Quantiles of a distribution known only through a fixed-bin histogram,
+    with linear interpolation inside the bin that holds each quantile.
+
+    Args:
+        counts (np.ndarray): Count per bin.
+        edges (np.ndarray): Bin edges (len(counts) + 1).
+        qs (list): Quantiles in [0, 1].
+
+    Returns:
+        list: One value per quantile, in the units of `edges`.
+    """
+    cum = np.cumsum(counts)
+    total = cum[-1]
+    out = []
+    for q in qs:
+        target = q * total
+        i = int(np.searchsorted(cum, target, side="left"))
+        before = cum[i - 1] if i > 0 else 0
+        frac = (target - before) / counts[i] if counts[i] else 0.0
+        out.append(edges[i] + frac * (edges[i + 1] - edges[i]))
+    return out
@@ -0,0 +1,275 @@
+import argparse
+import os
+import string
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from utils.image_processing import DEFAULT_TILE_ROWS, estimate_biomass, iter_rgb_tiles
+
+# Standard multi-well tray layouts: positions -> (rows, columns)
+TRAY_LAYOUTS = {24: (4, 6), 96: (8, 12), 384: (16, 24)}
+
+MIN_REGION_AREA = 50  # Green regions smaller than this (pixels) are noise, not plants
+
+def well_names(rows, cols):
+    """Well labels in row-major order: A1, A2, ..., B1, ... (AA, AB, ... past row Z)."""
+    letters = [string.ascii_uppercase[i] if i < 26 else
+               string.ascii_uppercase[i // 26 - 1] + string.ascii_uppercase[i % 26] for i in range(rows)]
+    return [f"{letter}{col + 1}" for letter in letters for col in range(cols)]
+
+def _tiles_and_size(image_source, tile_rows):
+    # RGB row windows plus the full (width, height), from a single decode
+    if isinstance(image_source, np.ndarray):
+        height, width = image_source.shape[:2]
+        tiles = (image_source[y:y + tile_rows, :, :3] for y in range(0, height, tile_rows))
+        return tiles, (width, height)
+
+    if isinstance(image_source, (str, os.PathLike)) and os.fspath(image_source).lower().endswith(".npy"):
+        height, width = np.load(image_source, mmap_mode="r").shape[:2]
+    else:
+        with Image.open(image_source) as img:  # Header only
+            width, height = img.size
+        if hasattr(image_source, "seek"):
+            image_source.seek(0)
+    return iter_rgb_tiles(image_source, tile_rows), (width, height)
+
+def _green_mask(tile):
+    # Same rule as calculate_green_index
+    return (tile[:, :, 1] > tile[:, :, 0]) & (tile[:, :, 1] > tile[:, :, 2])
+
+def segment_grid(image_source, rows, cols, bbox=None, tile_rows=DEFAULT_TILE_ROWS):
+    """
+    Splits a tray image into a rows x cols grid of wells and measures every
+    well in one pass over the image.
+
+    Each window's green mask is reduced per well with np.add.reduceat
+    (across the well columns, then across the image rows of each well row),
+    so the cost is one mask and two reductions per pixel whatever the
+    number of wells.
+
+    Args:
+        image_source: File path, file object or a uint8 (H, W, 3) array.
+        rows (int): Well rows.
+        cols (int): Well columns.
+        bbox (tuple): (left, top, right, bottom) of the tray in the image, in
+            pixels (default: the whole image).
+        tile_rows (int): Rows per window.
+
+    Returns:
+        pd.DataFrame: One row per well: 'well', 'row', 'col', 'pixels',
+        'green_pixels', 'green_ratio' (% of the well), 'centroid_x' /
+        'centroid_y' (image pixels, NaN for empty wells) and 'estimated_biomass_g'.
+    """
+    tiles, (width, height) = _tiles_and_size(image_source, tile_rows)
+    left, top, right, bottom = bbox or (0, 0, width, height)
+    left, top = max(0, int(left)), max(0, int(top))
+    right, bottom = min(width, int(right)), min(height, int(bottom))
+    if right - left < cols or bottom - top < rows:
+        raise ValueError(f"Tray area of {right - left}x{bottom - top} px is too small for {rows}x{cols} wells")
+
+    col_edges = np.linspace(left, right, cols + 1).round().astype(np.intp)
+    row_edges = np.linspace(top, bottom, rows + 1).round().astype(np.intp)
+    col_starts = col_edges[:-1] - left
+    xs = np.arange(left, right, dtype=np.int32)
+
+    green = np.zeros((rows, cols), dtype=np.int64)
+    sum_x = np.zeros((rows, cols), dtype=np.int64)
+    sum_y = np.zeros((rows, cols), dtype=np.int64)
+
+    y = 0
+    for tile in tiles:
+        y0, y1 = max(y, top), min(y + tile.shape[0], bottom)
+        y += tile.shape[0]
+        if y0 >= y1:
+            continue
+
+        mask = _green_mask(tile[y0 - (y - tile.shape[0]):y1 - (y - tile.shape[0]), left:right])
+        # Per image row and well column
+        counts = np.add.reduceat(mask, col_starts, axis=1, dtype=np.int64)
+        x_sums = np.add.reduceat(mask * xs, col_starts, axis=1, dtype=np.int64)
+        y_sums = counts * np.arange(y0, y1, dtype=np.int64)[:, None]
+
+        # Collapse the image rows of each well row
+        well_row = np.searchsorted(row_edges, np.arange(y0, y1), side="right") - 1
+        starts = np.flatnonzero(np.r_[True, well_row[1:] != well_row[:-1]])
+        target = well_row[starts]
+        green[target] += np.add.reduceat(counts, starts, axis=0)
+        sum_x[target] += np.add.reduceat(x_sums, starts, axis=0)
+        sum_y[target] += np.add.reduceat(y_sums, starts, axis=0)
+
+    pixels = np.diff(row_edges)[:, None] * np.diff(col_edges)[None, :]
+    green_ratio = green / pixels * 100
+    with np.errstate(divide="ignore", invalid="ignore"):
+        centroid_x = np.where(green > 0, sum_x / green, np.nan)
+        centroid_y = np.where(green > 0, sum_y / green, np.nan)
+
+    row_idx, col_idx = np.divmod(np.arange(rows * cols), cols)
+    return pd.DataFrame({
+        "well": well_names(rows, cols),
+        "row": row_idx + 1,
+        "col": col_idx + 1,
+        "pixels": pixels.ravel(),
+        "green_pixels": green.ravel(),
+        "green_ratio": green_ratio.ravel(),
+        "centroid_x": centroid_x.ravel(),
+        "centroid_y": centroid_y.ravel(),
+        "estimated_biomass_g": estimate_biomass(green_ratio.ravel())[0],
+    })
+
+def _row_runs(mask, row_offset):
+    # Horizontal runs of green pixels: (row, start, end) with `end` exclusive
+    padded = np.zeros((mask.shape[0], mask.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    steps = np.diff(padded, axis=1)
+    run_rows, starts = np.nonzero(steps == 1)
+    _, ends = np.nonzero(steps == -1)
+    return run_rows + row_offset, starts, ends
+
+def _run_edges(run_rows, starts, ends, width, connectivity):
+    """
+    Pairs of runs in adjacent rows that touch. Runs are sorted by row and
+    start, so the runs of the previous row touching run j form one slice,
+    found with two binary searches.
+    """
+    reach = 1 if connectivity == 8 else 0
+    stride = width + 2
+    start_keys = run_rows * stride + starts
+    end_keys = run_rows * stride + ends
+
+    prev_row = (run_rows - 1) * stride
+    lo = np.searchsorted(end_keys, prev_row + starts - reach, side="right")
+    hi = np.searchsorted(start_keys, prev_row + ends + reach, side="left")
+    counts = np.maximum(hi - lo, 0)
+
+    src = np.repeat(np.arange(run_rows.size), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    dst = np.repeat(lo, counts) + offsets
+    return src, dst
+
+def _propagate_labels(n, src, dst):
+    # Min-label hooking plus pointer jumping, each step vectorized over all edges
+    labels = np.arange(n)
+    while True:
+        roots_src, roots_dst = labels[src], labels[dst]
+        pending = roots_src != roots_dst
+        if not pending.any():
+            return labels
+        src, dst = src[pending], dst[pending]
+        roots_src, roots_dst = roots_src[pending], roots_dst[pending]
+        low = np.minimum(roots_src, roots_dst)
+        np.minimum.at(labels, roots_src, low)
+        np.minimum.at(labels, roots_dst, low)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+
+def label_regions(image_source, min_area=MIN_REGION_AREA, connectivity=8, tile_rows=DEFAULT_TILE_ROWS):
+    """
+    Finds individual plants as connected green regions, for trays without
+    a regular grid.
+
+    The mask is run-length encoded window by window (only the runs are
+    kept); runs that touch in adjacent rows are joined by vectorized label
+    propagation, and the region statistics are weighted sums over runs.
+
+    Args:
+        image_source: File path, file object or a uint8 (H, W, 3) array.
+        min_area (int): Smallest region (pixels) reported as a plant.
+        connectivity (int): 4 or 8.
+        tile_rows (int): Rows per window.
+
+    Returns:
+        pd.DataFrame: One row per plant in reading order: 'plant', 'green_pixels',
+        'green_ratio' (% of the image), 'centroid_x', 'centroid_y' and the
+        bounding box 'x0', 'y0', 'x1', 'y1' (exclusive).
+    """
+    if connectivity not in (4, 8):
+        raise ValueError("connectivity must be 4 or 8")
+    tiles, (width, height) = _tiles_and_size(image_source, tile_rows)
+
+    parts = []
+    y = 0
+    for tile in tiles:
+        parts.append(_row_runs(_green_mask(tile), y))
+        y += tile.shape[0]
+    run_rows, starts, ends = (np.concatenate(arrays) for arrays in zip(*parts))
+
+    src, dst = _run_edges(run_rows, starts, ends, width, connectivity)
+    _, region = np.unique(_propagate_labels(run_rows.size, src, dst), return_inverse=True)
+    n_regions = int(region.max()) + 1 if region.size else 0
+
+    lengths = ends - starts
+    area = np.bincount(region, weights=lengths, minlength=n_regions)
+    # Sum of x over a run [s, e) is (s + e - 1) * (e - s) / 2
+    sum_x = np.bincount(region, weights=(starts + ends - 1) * lengths / 2, minlength=n_regions)
+    sum_y = np.bincount(region, weights=run_rows * lengths, minlength=n_regions)
+    x0 = np.full(n_regions, width)
+    y0 = np.full(n_regions, height)
+    x1 = np.zeros(n_regions, dtype=np.intp)
+    y1 = np.zeros(n_regions, dtype=np.intp)
+    np.minimum.at(x0, region, starts)
+    np.minimum.at(y0, region, run_rows)
+    np.maximum.at(x1, region, ends)
+    np.maximum.at(y1, region, run_rows + 1)
+
+    keep = area >= min_area
+    plants = pd.DataFrame({
+        "green_pixels": area[keep].astype(np.int64),
+        "green_ratio": area[keep] / (width * height) * 100,
+        "centroid_x": sum_x[keep] / area[keep],
+        "centroid_y": sum_y[keep] / area[keep],
+        "x0": x0[keep], "y0": y0[keep], "x1": x1[keep], "y1": y1[keep],
+    })
+
+    # Reading order: bands one typical plant high, left to right within a band
+    band_height = max(float(np.median(plants["y1"] - plants["y0"])), 1.0) if len(plants) else 1.0
+    plants["band"] = (plants["centroid_y"] // band_height).astype(np.int64)
+    plants = plants.sort_values(["band", "centroid_x"], ignore_index=True).drop(columns="band")
+    plants.insert(0, "plant", np.arange(1, len(plants) + 1))
+    return plants
+
+def segment_tray(image_source, mode="grid", rows=8, cols=12, bbox=None, min_area=MIN_REGION_AREA,
+                 connectivity=8, tile_rows=DEFAULT_TILE_ROWS):
+    """
+    Per-plant measurements for a whole tray from a single decode.
+
+    Args:
+        image_source: File path, file object or a uint8 (H, W, 3) array.
+        mode (str): "grid" (fixed wells, see segment_grid) or "regions"
+            (connected green regions, see label_regions).
+        rows, cols (int): Well layout (grid mode).
+        bbox (tuple): Tray area in the image (grid mode).
+        min_area (int): Smallest plant in pixels (regions mode).
+        connectivity (int): 4 or 8 (regions mode).
+        tile_rows (int): Rows per window.
+
+    Returns:
+        pd.DataFrame: One row per well or plant.
+    """
+    if mode == "grid":
+        return segment_grid(image_source, rows, cols, bbox, tile_rows)
+    if mode == "regions":
+        return label_regions(image_source, min_area, connectivity, tile_rows)
+    raise ValueError(f"Unknown mode: {mode}. Expected 'grid' or 'regions'")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-plant green index for a tray image.")
+    parser.add_argument("image")
+    parser.add_argument("--mode", choices=["grid", "regions"], default="grid")
+    parser.add_argument("--layout", type=int, choices=sorted(TRAY_LAYOUTS), default=96, help="Tray positions (grid)")
+    parser.add_argument("--bbox", type=int, nargs=4, default=None, metavar=("LEFT", "TOP", "RIGHT", "BOTTOM"))
+    parser.add_argument("--min-area", type=int, default=MIN_REGION_AREA, help="Smallest plant in pixels (regions)")
+    parser.add_argument("-o", "--output", default="plants.csv")
+    args = parser.parse_args(argv)
+
+    rows, cols = TRAY_LAYOUTS[args.layout]
+    plants = segment_tray(args.image, args.mode, rows, cols, args.bbox, args.min_area)
+    plants.to_csv(args.output, index=False)
+    print(f"{len(plants)} {'wells' if args.mode == 'grid' else 'plants'} written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import functools
+
+import numpy as np
+
+from utils.image_processing import iter_rgb_tiles
+
+INDICES = ("green", "exg", "vari", "ngrdi")
+
+# Canopy thresholds per index (a pixel counts as canopy above these).
+# ExG is in chromatic coordinates: (2g - r - b) / (r + g + b).
+DEFAULT_THRESHOLDS = {"exg": 0.1, "vari": 0.0, "ngrdi": 0.0}
+
+# Smaller windows than the green-index default: the int32 working arrays
+# then stay cache-sized, which is faster and keeps the peak memory low
+INDEX_TILE_ROWS = 256
+
+# Thresholds are compared as integers: num / den > t  <=>  num * SCALE > round(t * SCALE) * den
+THRESHOLD_SCALE = 1000
+
+# Every ratio index is a function of two small integer terms of the pixel,
+# so a tile reduces to a 2-D histogram of those terms and the index values
+# only have to be computed once per possible pair, not once per pixel:
+#   ExG   = (2g - s) / (g + s)       with s = r + b       (g: 0..255, s: 0..510)
+#   VARI  = d / e                    with d = g - r, e = g + r - b  (d: -255..255, e: -255..510)
+#   NGRDI = (g - r) / (g + r)                              (g, r: 0..255)
+# Term ranges: name -> ((low_a, high_a), (low_b, high_b))
+_TERM_RANGES = {
+    "exg": ((0, 255), (0, 510)),
+    "vari": ((-255, 255), (-255, 510)),
+    "ngrdi": ((0, 255), (0, 255)),
+}
+
+def _ratio_parts(name, a, b):
+    # Numerator and denominator of the index from its two terms (int64 grids)
+    if name == "exg":
+        return 2 * a - b, a + b
+    if name == "vari":
+        return a, b
+    return a - b, a + b  # ngrdi: a = g, b = r
+
+@functools.lru_cache(maxsize=32)
+def _lookup_tables(name, threshold_scaled):
+    """
+    Value, defined and canopy tables over every (term a, term b) pair,
+    flattened in the same order as the tile histogram codes.
+    """
+    (low_a, high_a), (low_b, high_b) = _TERM_RANGES[name]
+    a, b = np.meshgrid(np.arange(low_a, high_a + 1, dtype=np.int64),
+                       np.arange(low_b, high_b + 1, dtype=np.int64), indexing="ij")
+    num, den = _ratio_parts(name, a, b)
+
+    defined = den != 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values = np.where(defined, num / np.where(defined, den, 1), 0.0)
+    if name == "vari":
+        # Near-zero denominators (dark, bluish pixels) explode; clip as is customary
+        np.clip(values, -1.0, 1.0, out=values)
+
+    # num / den > t  <=>  num * sign(den) * SCALE > t * |den|
+    canopy = defined & (num * np.sign(den) * THRESHOLD_SCALE > threshold_scaled * np.abs(den))
+    return values.ravel(), defined.ravel(), canopy.ravel()
+
+def _term_codes(name, r, g, b):
+    # Flat histogram code of each pixel's (term a, term b) pair, in int32
+    (low_a, _), (low_b, high_b) = _TERM_RANGES[name]
+    if name == "exg":
+        term_a, term_b = g, r + b
+    elif name == "vari":
+        term_a, term_b = g - r, g + r - b
+    else:
+        term_a, term_b = g, r
+
+    codes = term_a - low_a
+    codes *= high_b - low_b + 1
+    codes += term_b
+    codes -= low_b
+    return codes
+
+def _scaled_thresholds(thresholds):
+    merged = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+    return {name: int(round(value * THRESHOLD_SCALE)) for name, value in merged.items()}
+
+def tile_indices(tile, indices=INDICES, thresholds=None, return_masks=False):
+    """
+    Computes the requested indices for one RGB tile in a single fused pass.
+
+    The channels are widened once and every ratio index is reduced to an
+    integer histogram of two channel terms; no per-pixel floating point is
+    done. Canopy masks, when requested, are a table lookup per pixel.
+
+    Args:
+        tile (np.ndarray): uint8 array of shape (H, W, 3).
+        indices (iterable): Any of INDICES.
+        thresholds (dict): Index -> canopy threshold (defaults: DEFAULT_THRESHOLDS).
+        return_masks (bool): Also return the per-pixel boolean masks.
+
+    Returns:
+        dict: 'pixels', 'green_canopy' (for "green"), '<index>_hist' per
+        ratio index (term-pair counts, summed across tiles by
+        compute_indices) and, with return_masks, 'masks'.
+    """
+    scaled = _scaled_thresholds(thresholds)
+    sums = {"pixels": int(tile.shape[0] * tile.shape[1])}
+    masks = {}
+
+    if "green" in indices:
+        # Same rule as calculate_green_index, compared directly in uint8
+        green = (tile[:, :, 1] > tile[:, :, 0]) & (tile[:, :, 1] > tile[:, :, 2])
+        sums["green_canopy"] = int(np.count_nonzero(green))
+        masks["green"] = green
+
+    ratio_indices = [name for name in ("exg", "vari", "ngrdi") if name in indices]
+    if ratio_indices:
+        # Histogram codes reach ~391k, so the terms are built in int32
+        r = tile[:, :, 0].astype(np.int32)
+        g = tile[:, :, 1].astype(np.int32)
+        b = tile[:, :, 2].astype(np.int32)
+
+    for name in ratio_indices:
+        codes = _term_codes(name, r, g, b)
+        values, _, canopy = _lookup_tables(name, scaled[name])
+        sums[f"{name}_hist"] = np.bincount(codes.ravel(), minlength=values.size)
+        if return_masks:
+            masks[name] = canopy[codes]
+
+    if return_masks:
+        sums["masks"] = masks
+    return sums
+
+def compute_indices(image_source, indices=INDICES, thresholds=None, tile_rows=INDEX_TILE_ROWS,
+                    return_masks=False):
+    """
+    Computes several vegetation indices for one image while decoding and
+    scanning it only once (tile by tile, see iter_rgb_tiles).
+
+    Args:
+        image_source: File path, file object or a uint8 (H, W, 3) array.
+        indices (iterable): Any of INDICES ("green", "exg", "vari", "ngrdi").
+        thresholds (dict): Index -> canopy threshold (defaults: DEFAULT_THRESHOLDS).
+        tile_rows (int): Rows per window.
+        return_masks (bool): Also return full-size boolean canopy masks.
+
+    Returns:
+        dict: 'pixels'; 'green_ratio' (% of pixels) for "green"; for each
+        ratio index '<index>_mean' (over pixels where it is defined) and
+        '<index>_cover' (% of pixels above the threshold); with
+        return_masks, 'masks' (index -> (H, W) bool array).
+    """
+    unknown = set(indices) - set(INDICES)
+    if unknown:
+        raise ValueError(f"Unknown index(es): {', '.join(sorted(unknown))}. Expected any of: {', '.join(INDICES)}")
+    scaled = _scaled_thresholds(thresholds)
+
+    if isinstance(image_source, np.ndarray):
+        tiles = (image_source[y:y + tile_rows, :, :3] for y in range(0, image_source.shape[0], tile_rows))
+    else:
+        tiles = iter_rgb_tiles(image_source, tile_rows)
+
+    totals = {}
+    mask_parts = {}
+    for tile in tiles:
+        sums = tile_indices(tile, indices, thresholds, return_masks)
+        for name, mask in sums.pop("masks", {}).items():
+            mask_parts.setdefault(name, []).append(mask)
+        for key, value in sums.items():
+            totals[key] = totals[key] + value if key in totals else value
+
+    pixels = totals.get("pixels", 0)
+    result = {"pixels": pixels}
+    if "green" in indices:
+        result["green_ratio"] = totals["green_canopy"] / pixels * 100 if pixels else 0.0
+
+    for name in ("exg", "vari", "ngrdi"):
+        if name not in indices:
+            continue
+        hist = totals.get(f"{name}_hist")
+        if hist is None:
+            result[f"{name}_mean"], result[f"{name}_cover"] = float("nan"), 0.0
+            continue
+        values, defined, canopy = _lookup_tables(name, scaled[name])
+        n_defined = int(hist[defined].sum())
+        result[f"{name}_mean"] = float(hist @ values) / n_defined if n_defined else float("nan")
+        result[f"{name}_cover"] = int(hist[canopy].sum()) / pixels * 100 if pixels else 0.0
+
+    if return_masks:
+        result["masks"] = {name: np.concatenate(parts) for name, parts in mask_parts.items()}
+    return result
@@ -0,0 +1,214 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from utils.image_processing import DEFAULT_PIXEL_BUDGET, estimate_biomass
+
+# Containers decoded with PyAV (optional dependency); animated GIF/WebP/PNG
+# and multi-page TIFF stacks are read with Pillow
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".webm")
+ANIMATION_EXTENSIONS = (".gif", ".webp", ".png", ".tif", ".tiff")
+
+SIGNATURE_SIDE = 32  # Grayscale thumbnail compared for scene changes
+DEFAULT_SCENE_THRESHOLD = 12.0  # Mean absolute gray-level change (0-255) that counts as a new scene
+
+SERIES_COLUMNS = ["frame", "time_s", "trigger", "green_ratio", "estimated_biomass_g"]
+
+class _Frame:
+    """
+    One decoded frame. Conversion to RGB and the scene signature are done
+    on demand, so skipped frames cost only their decode.
+    """
+
+    def __init__(self, index, time_s, rgb, signature):
+        self.index = index
+        self.time_s = time_s
+        self._rgb = rgb
+        self._signature = signature
+
+    def rgb(self):
+        """uint8 array of shape (H, W, 3)."""
+        return self._rgb()
+
+    def signature(self):
+        """uint8 SIGNATURE_SIDE x SIGNATURE_SIDE grayscale thumbnail."""
+        return self._signature()
+
+def _pyav_frames(source):
+    try:
+        import av
+    except ImportError as exc:
+        raise ImportError("Reading video files needs PyAV (pip install av); "
+                          "animated GIFs and TIFF stacks work without it") from exc
+
+    with av.open(source) as container:
+        stream = container.streams.video[0]
+        stream.thread_type = "AUTO"  # Frame-parallel decoding
+        fps = float(stream.average_rate or 25)
+
+        for index, frame in enumerate(container.decode(stream)):
+            time_s = float(frame.time) if frame.time is not None else index / fps
+            yield _Frame(
+                index, time_s,
+                lambda frame=frame: frame.to_ndarray(format="rgb24"),
+                lambda frame=frame: frame.reformat(width=SIGNATURE_SIDE, height=SIGNATURE_SIDE,
+                                                   format="gray").to_ndarray(),
+            )
+
+def _pillow_frames(source):
+    with Image.open(source) as img:
+        time_s = 0.0
+        for index in range(getattr(img, "n_frames", 1)):
+            img.seek(index)
+            yield _Frame(
+                index, time_s,
+                lambda: np.asarray(img.convert("RGB")),
+                lambda: np.asarray(img.convert("L").resize((SIGNATURE_SIDE, SIGNATURE_SIDE),
+                                                           Image.Resampling.BOX)),
+            )
+            # Frame durations are in milliseconds (TIFF stacks have none)
+            time_s += img.info.get("duration", 0) / 1000
+
+def iter_frames(source, filename=None):
+    """
+    Decodes a time-lapse one frame at a time.
+
+    Video containers (MP4, MOV, AVI, MKV, WebM) are read with PyAV when it
+    is installed; animated GIF / WebP / PNG and multi-page TIFF stacks are
+    read with Pillow. Only the current frame is held in memory.
+
+    Args:
+        source: Path or file object.
+        filename (str): Name used to detect the format when `source` is a
+            file object (e.g. a Streamlit upload).
+
+    Yields:
+        _Frame: with 'index', 'time_s', rgb() and signature().
+
+    Raises:
+        ValueError: If the name has neither a video nor an animation extension.
+    """
+    name = (filename or (os.fspath(source) if isinstance(source, (str, os.PathLike)) else "")).lower()
+    if name.endswith(VIDEO_EXTENSIONS):
+        return _pyav_frames(source)
+    if name and not name.endswith(ANIMATION_EXTENSIONS):
+        raise ValueError(f"unsupported format: {name}")
+    return _pillow_frames(source)
+
+def sample_frames(frames, interval_s=None, scene_threshold=None):
+    """
+    Keeps the first frame, then every frame at least `interval_s` after the
+    last kept one and/or every frame whose grayscale signature differs from
+    the last kept one by more than `scene_threshold`. With neither set,
+    every frame is kept.
+
+    Args:
+        frames (iterable): Frames from iter_frames.
+        interval_s (float): Sampling interval in seconds of video time.
+        scene_threshold (float): Mean absolute gray-level change (0-255).
+
+    Yields:
+        tuple: (frame, trigger) with trigger "first", "interval", "scene" or "all".
+    """
+    last_time = None
+    last_signature = None
+    diff = np.empty((SIGNATURE_SIDE, SIGNATURE_SIDE), dtype=np.int16)
+
+    for frame in frames:
+        signature = frame.signature() if scene_threshold is not None else None
+        if last_time is None:
+            trigger = "first"
+        elif interval_s is None and scene_threshold is None:
+            trigger = "all"
+        elif interval_s is not None and frame.time_s - last_time >= interval_s:
+            trigger = "interval"
+        elif scene_threshold is not None:
+            np.subtract(signature, last_signature, out=diff, dtype=np.int16)
+            np.abs(diff, out=diff)
+            trigger = "scene" if diff.mean() > scene_threshold else None
+        else:
+            trigger = None
+
+        if trigger is None:
+            continue
+        last_time, last_signature = frame.time_s, signature
+        yield frame, trigger
+
+class GreenCounter:
+    """
+    Green-pixel ratio of successive frames (same rule as
+    calculate_green_index) with the mask buffers allocated once and reused
+    while the frame size stays the same.
+
+    Frames above `max_pixels` are subsampled by a fixed stride (nearest
+    pixel, a view without copying), as in the adaptive image path.
+    """
+
+    def __init__(self, max_pixels=DEFAULT_PIXEL_BUDGET):
+        self.max_pixels = max_pixels
+        self._shape = None
+        self._green = self._blue = None
+        self._stride = 1
+
+    def ratio(self, rgb):
+        """Percentage of green pixels (0-100) of one uint8 (H, W, 3) frame."""
+        if rgb.shape[:2] != self._shape:
+            height, width = rgb.shape[:2]
+            self._shape = (height, width)
+            self._stride = max(1, int(np.ceil(np.sqrt(height * width / self.max_pixels)))) if self.max_pixels else 1
+            sampled = (-(-height // self._stride), -(-width // self._stride))
+            self._green = np.empty(sampled, dtype=bool)
+            self._blue = np.empty(sampled, dtype=bool)
+
+        view = rgb[::self._stride, ::self._stride]
+        if view.size == 0:
+            return 0.0
+        np.greater(view[:, :, 1], view[:, :, 0], out=self._green)
+        np.greater(view[:, :, 1], view[:, :, 2], out=self._blue)
+        np.logical_and(self._green, self._blue, out=self._green)
+        return np.count_nonzero(self._green) / self._green.size * 100
+
+def canopy_time_series(source, filename=None, interval_s=None, scene_threshold=None,
+                       max_pixels=DEFAULT_PIXEL_BUDGET):
+    """
+    Canopy cover over a time-lapse, computed while it streams through the
+    decoder: frames are sampled (see sample_frames), analysed and dropped,
+    so memory stays flat for any video length and nothing is written to disk.
+
+    Args:
+        source: Path or file object (see iter_frames).
+        filename (str): Name used to detect the format of a file object.
+        interval_s (float): Keep one frame per interval (seconds of video time).
+        scene_threshold (float): Also keep frames after a scene change.
+        max_pixels (int): Pixel budget per frame (None = every pixel).
+
+    Returns:
+        pd.DataFrame: SERIES_COLUMNS, one row per kept frame.
+    """
+    counter = GreenCounter(max_pixels)
+    rows = []
+    for frame, trigger in sample_frames(iter_frames(source, filename), interval_s, scene_threshold):
+        green_ratio = counter.ratio(frame.rgb())
+        rows.append((frame.index, frame.time_s, trigger, green_ratio, estimate_biomass(green_ratio)[0]))
+    return pd.DataFrame(rows, columns=SERIES_COLUMNS)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Canopy-cover time series from a time-lapse video.")
+    parser.add_argument("video", help="Video (PyAV) or animated GIF / TIFF stack")
+    parser.add_argument("--interval", type=float, default=None, help="Keep one frame every N seconds")
+    parser.add_argument("--scene-threshold", type=float, default=None,
+                        help=f"Also keep frames after a scene change (e.g. {DEFAULT_SCENE_THRESHOLD})")
+    parser.add_argument("--max-pixels", type=int, default=DEFAULT_PIXEL_BUDGET, help="0 = analyse every pixel")
+    parser.add_argument("-o", "--output", default="canopy_series.csv")
+    args = parser.parse_args(argv)
+
+    series = canopy_time_series(args.video, interval_s=args.interval, scene_threshold=args.scene_threshold,
+                                max_pixels=args.max_pixels or None)
+    series.to_csv(args.output, index=False)
+    print(f"{len(series)} frames analysed, written to {args.output}")
+
+if __name__ == "__main__":
+    main()